@@ -0,0 +1,217 @@
+from __future__ import annotations
+import base64, hashlib, json, os, re, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from asn1crypto import cms, x509
+
+from .result_cache import DEFAULT_DIR as CACHE_DIR
+
+# Resolución de emisores por AIA (caIssuers) para poblar el trust:
+#   - memo por URL en el proceso: cada URL distinta se baja una sola vez
+#     (las peticiones concurrentes a la misma URL esperan a la primera)
+#   - caché HTTP en disco (<cache>/aia): cuerpo + ETag/Last-Modified; pasado
+#     max_age se revalida con If-None-Match / If-Modified-Since (304 = reusar)
+#   - una requests.Session con pool de conexiones y un ThreadPool acotado
+# Así refrescar el trust sobre miles de PDFs cuesta una descarga por emisor.
+
+DEFAULT_DIR = os.path.join(CACHE_DIR, "aia")
+DEFAULT_MAX_AGE_HOURS = 24
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 20
+
+_PEM_RE = re.compile(rb"-----BEGIN CERTIFICATE-----(.*?)-----END CERTIFICATE-----", re.S)
+
+def aia_issuer_urls(cert: x509.Certificate) -> List[str]:
+    try:
+        aia = cert.authority_information_access_value
+        aia = aia.native if aia is not None else []
+    except Exception:
+        return []
+    urls = []
+    for d in aia:
+        if d.get('access_method') == 'ca_issuers':
+            loc = d.get('access_location')
+            if isinstance(loc, str) and loc.lower().startswith(("http://", "https://")):
+                urls.append(loc)
+    return urls
+
+def parse_certs(data: bytes) -> List[x509.Certificate]:
+    """DER, PEM (todos los bloques) o PKCS#7 certs-only (.p7c), que es lo que sirven los caIssuers."""
+    if not data:
+        return []
+    blocks = _PEM_RE.findall(data)
+    if blocks:
+        out = []
+        for b in blocks:
+            try: out.append(x509.Certificate.load(base64.b64decode(b.strip().replace(b'\r', b'').replace(b'\n', b''))))
+            except Exception: continue
+        return out
+    try:
+        cert = x509.Certificate.load(data)
+        cert.subject  # fuerza el parseo
+        return [cert]
+    except Exception:
+        pass
+    try:
+        ci = cms.ContentInfo.load(data)
+        if ci['content_type'].native == 'signed_data':
+            return [c.chosen for c in ci['content']['certificates'] if c.name == 'certificate']
+    except Exception:
+        pass
+    return []
+
+def embedded_certs(emb_sig: Any) -> List[x509.Certificate]:
+    """Firmante + certificados embebidos en el CMS de una firma de pyHanko."""
+    out = []
+    for c in [getattr(emb_sig, "signer_cert", None), *(getattr(emb_sig, "other_embedded_certs", None) or [])]:
+        if isinstance(c, x509.Certificate):
+            out.append(c)
+    return out
+
+def is_self_issued(cert: x509.Certificate) -> bool:
+    try:
+        return cert.issuer == cert.subject
+    except Exception:
+        return False
+
+class HttpCache:
+    """Un .bin (cuerpo) + .json (url, etag, last_modified, fetched) por URL."""
+
+    def __init__(self, cache_dir: str = DEFAULT_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _base(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        base = self._base(url)
+        try:
+            with open(base + ".json", "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            with open(base + ".bin", "rb") as fh:
+                meta["body"] = fh.read()
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]) -> None:
+        base = self._base(url)
+        meta = {"url": url, "etag": etag, "last_modified": last_modified, "fetched": time.time()}
+        try:
+            for ext, mode, payload in ((".bin", "wb", body), (".json", "w", json.dumps(meta))):
+                tmp = f"{base}{ext}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as fh:
+                    fh.write(payload)
+                os.replace(tmp, base + ext)
+        except OSError:
+            pass
+
+    def touch(self, url: str) -> None:
+        meta = self.get(url)
+        if meta is not None:
+            self.put(url, meta.pop("body"), meta.get("etag"), meta.get("last_modified"))
+
+class AiaResolver:
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_DIR, workers: int = DEFAULT_WORKERS,
+                 timeout: int = DEFAULT_TIMEOUT, max_age_hours: float = DEFAULT_MAX_AGE_HOURS, session: Any = None):
+        self.timeout = timeout
+        self.max_age = float(max_age_hours) * 3600
+        self.workers = max(1, int(workers))
+        self.http = HttpCache(cache_dir) if cache_dir else None
+        self.stats = {"urls": 0, "downloads": 0, "revalidated": 0, "disk_hits": 0, "errors": 0}
+        self._memo: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._session = session
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _sess(self) -> Any:
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+                s.mount("http://", adapter); s.mount("https://", adapter)
+                self._session = s
+            return self._session
+
+    def _download(self, url: str) -> List[x509.Certificate]:
+        cached = self.http.get(url) if self.http else None
+        if cached is not None and time.time() - float(cached.get("fetched") or 0) < self.max_age:
+            self._count("disk_hits")
+            return parse_certs(cached["body"])
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            r = self._sess().get(url, timeout=self.timeout, allow_redirects=True, headers=headers)
+            if r.status_code == 304 and cached is not None:
+                self._count("revalidated")
+                self.http.touch(url)
+                return parse_certs(cached["body"])
+            r.raise_for_status()
+        except Exception:
+            self._count("errors")
+            # sin red: lo que haya en disco, aunque esté vencido
+            return parse_certs(cached["body"]) if cached is not None else []
+        self._count("downloads")
+        if self.http:
+            self.http.put(url, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return parse_certs(r.content)
+
+    def fetch_async(self, url: str) -> Future:
+        with self._lock:
+            fut = self._memo.get(url)
+            if fut is None:
+                self.stats["urls"] += 1
+                fut = self._memo[url] = self._pool.submit(self._download, url)
+            return fut
+
+    def fetch(self, url: str) -> List[x509.Certificate]:
+        return self.fetch_async(url).result()
+
+    def issuers(self, cert: x509.Certificate) -> List[x509.Certificate]:
+        out: List[x509.Certificate] = []
+        for url in aia_issuer_urls(cert):
+            out.extend(self.fetch(url))
+        return out
+
+    def resolve(self, certs: Iterable[x509.Certificate]) -> List[x509.Certificate]:
+        """
+        Sube por AIA desde `certs` nivel por nivel (todas las URLs de un nivel en
+        paralelo) y devuelve los emisores encontrados, sin repetir, en orden.
+        """
+        certs = list(certs)
+        seen = {c.sha256 for c in certs}
+        level = [c for c in certs if not is_self_issued(c)]
+        found: List[x509.Certificate] = []
+        while level:
+            futs = [self.fetch_async(u) for c in level for u in aia_issuer_urls(c)]
+            level = []
+            for fut in futs:
+                for up in fut.result():
+                    if up.sha256 in seen:
+                        continue
+                    seen.add(up.sha256); found.append(up)
+                    if not is_self_issued(up):
+                        level.append(up)
+        return found
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+        if self._session is not None:
+            try: self._session.close()
+            except Exception: pass
+
+    def __enter__(self) -> "AiaResolver":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+import mmap
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+# Un PDF abierto una sola vez por archivo y compartido entre etapas (texto,
+# OCR de apariencias, adivinanza de nombres, lector pypdf, digest de firmas):
+#   - PyMuPDF abre la ruta (lee de disco a demanda, no carga el archivo)
+#   - `buffer` es un mmap de solo lectura para quien necesita bytes (pypdf,
+#     barrido de xref, digest del /ByteRange): sin copia en el heap, así que
+#     bundles de cientos de MB no se duplican por worker
+#   - texto por página, palabras con coordenadas y widgets se calculan a
+#     pedido y quedan cacheados
+# Todo es perezoso: si una etapa sale de la caché de resultados no se abre nada.
+
+class DocSession:
+    def __init__(self, path: str, data: Optional[bytes] = None):
+        self.path = path
+        self._data = data  # bytes ya en memoria (opcional); si no, mmap del archivo
+        self._fh: Any = None
+        self._mm: Any = None
+        self._doc: Any = None
+        self._pages: Dict[int, Any] = {}
+        self._texts: Dict[int, str] = {}
+        self._widgets: Dict[int, List[Any]] = {}
+        self._words: Dict[int, List[Tuple[Any, ...]]] = {}
+
+    @property
+    def buffer(self) -> Any:
+        """Contenido del archivo como buffer de solo lectura (mmap; b"" si está vacío)."""
+        if self._data is not None:
+            return self._data
+        if self._mm is None:
+            self._fh = open(self.path, "rb")
+            try:
+                self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # archivo vacío
+                self._mm = b""
+        return self._mm
+
+    @property
+    def doc(self) -> Any:
+        if self._doc is None:
+            import fitz
+            self._doc = fitz.open(stream=self._data, filetype="pdf") if self._data is not None else fitz.open(self.path)
+        return self._doc
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    def page(self, i: int) -> Any:
+        p = self._pages.get(i)
+        if p is None:
+            p = self._pages[i] = self.doc.load_page(i)
+        return p
+
+    def pages(self) -> Iterator[Any]:
+        for i in range(self.page_count):
+            yield self.page(i)
+
+    def page_text(self, i: int) -> str:
+        """get_text("text") de la página i, sin recortar (cada etapa aplica su strip)."""
+        t = self._texts.get(i)
+        if t is None:
+            try:
+                t = self.page(i).get_text("text") or ""
+            except Exception:
+                t = ""
+            self._texts[i] = t
+        return t
+
+    def page_texts(self) -> List[str]:
+        return [self.page_text(i) for i in range(self.page_count)]
+
+    def page_words(self, i: int) -> List[Tuple[Any, ...]]:
+        """get_text("words") de la página i: (x0, y0, x1, y1, palabra, bloque, línea, nº)."""
+        w = self._words.get(i)
+        if w is None:
+            try:
+                w = self.page(i).get_text("words") or []
+            except Exception:
+                w = []
+            self._words[i] = w
+        return w
+
+    def widgets(self, i: int) -> List[Any]:
+        """Widgets de la página i (la página queda viva en la sesión mientras se usan)."""
+        w = self._widgets.get(i)
+        if w is None:
+            try:
+                w = list(self.page(i).widgets() or [])
+            except Exception:
+                w = []
+            self._widgets[i] = w
+        return w
+
+    def close(self) -> None:
+        self._widgets.clear(); self._pages.clear(); self._texts.clear(); self._words.clear()
+        if self._doc is not None:
+            try: self._doc.close()
+            except Exception: pass
+            self._doc = None
+        if self._mm is not None:
+            try: self._mm.close()
+            except Exception: pass  # b"" o buffers aún exportados: los libera el GC
+            self._mm = None
+        if self._fh is not None:
+            self._fh.close(); self._fh = None
+
+    def __enter__(self) -> "DocSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+@contextmanager
+def borrow(src: Union[str, DocSession]) -> Iterator[DocSession]:
+    """La sesión recibida (sin cerrarla) o una propia para la ruta, cerrada al salir."""
+    if isinstance(src, DocSession):
+        yield src
+    else:
+        with DocSession(src) as s:
+            yield s
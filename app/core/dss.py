@@ -0,0 +1,83 @@
+from __future__ import annotations
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional
+
+# Material LTV embebido en el PDF (/DSS del catálogo):
+#   /Certs /CRLs /OCSPs           → listas globales del documento
+#   /VRI/<hash>/Cert /CRL /OCSP    → lo mismo por firma (suele repetir referencias)
+# Se lee una vez por documento y se deduplica por digest; sirve tanto con el
+# lector de pyHanko como con el de pypdf (ambos exponen .get / .get_object).
+
+@dataclass
+class DssMaterial:
+    certs: List[bytes] = field(default_factory=list)
+    crls: List[bytes] = field(default_factory=list)
+    ocsps: List[bytes] = field(default_factory=list)
+    vri: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.certs or self.crls or self.ocsps)
+
+    @property
+    def has_revinfo(self) -> bool:
+        return bool(self.crls or self.ocsps)
+
+def _resolve(o: Any) -> Any:
+    try:
+        return o.get_object()
+    except Exception:
+        return o
+
+def _stream_bytes(o: Any) -> Optional[bytes]:
+    o = _resolve(o)
+    for attr in ("get_data", "data"):
+        try:
+            v = getattr(o, attr)
+            v = v() if callable(v) else v
+            if v:
+                return bytes(v)
+        except Exception:
+            continue
+    return None
+
+def _as_list(v: Any) -> List[Any]:
+    v = _resolve(v)
+    if v is None:
+        return []
+    return list(v) if isinstance(v, (list, tuple)) else [v]
+
+def _collect(refs: Iterable[Any], into: List[bytes], seen: set) -> None:
+    for ref in refs:
+        data = _stream_bytes(ref)
+        if not data:
+            continue
+        h = hashlib.sha256(data).digest()
+        if h not in seen:
+            seen.add(h); into.append(data)
+
+def read_dss(reader: Any) -> DssMaterial:
+    """Certs/CRLs/OCSPs del /DSS (globales + VRI); vacío si el PDF no trae DSS."""
+    out = DssMaterial()
+    try:
+        root = reader.root if hasattr(reader, "root") else reader.trailer["/Root"]
+        dss = _resolve(_resolve(root).get("/DSS"))
+    except Exception:
+        return out
+    if dss is None:
+        return out
+    seen: set = set()
+    try:
+        _collect(_as_list(dss.get("/Certs")), out.certs, seen)
+        _collect(_as_list(dss.get("/CRLs")), out.crls, seen)
+        _collect(_as_list(dss.get("/OCSPs")), out.ocsps, seen)
+        vri = _resolve(dss.get("/VRI"))
+        for _k, entry in (vri.items() if vri is not None else []):
+            e = _resolve(entry)
+            out.vri += 1
+            _collect(_as_list(e.get("/Cert")), out.certs, seen)
+            _collect(_as_list(e.get("/CRL")), out.crls, seen)
+            _collect(_as_list(e.get("/OCSP")), out.ocsps, seen)
+    except Exception:
+        pass
+    return out
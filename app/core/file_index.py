@@ -0,0 +1,81 @@
+from __future__ import annotations
+import os, sqlite3, time
+from typing import Optional
+
+from .utils import file_sha256
+
+# Índice persistente (ruta, inodo, tamaño, mtime_ns) → sha256.
+# Solo se vuelve a leer el archivo completo cuando cambia su metadata de stat;
+# en carpetas compartidas grandes esto evita releer GBs de PDFs sin cambios.
+
+DEFAULT_NAME = "file_index.sqlite"
+
+# Un archivo modificado hace menos de esto puede volver a cambiar dentro del
+# mismo tick de mtime: se hashea pero no se confía en su entrada del índice.
+_RACY_SECONDS = 2.0
+
+class FileIndex:
+    def __init__(self, cache_dir: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(cache_dir, DEFAULT_NAME), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime_ns INTEGER, sha256 TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def lookup(self, path: str, st: Optional[os.stat_result] = None) -> Optional[str]:
+        """sha256 indexado si el stat actual coincide; None si hay que recalcular."""
+        st = st or os.stat(path)
+        row = self._conn.execute(
+            "SELECT inode, size, mtime_ns, sha256 FROM files WHERE path=?", (self._key(path),)
+        ).fetchone()
+        if row and (row[0], row[1], row[2]) == (st.st_ino, st.st_size, st.st_mtime_ns):
+            return row[3]
+        return None
+
+    def sha256(self, path: str) -> str:
+        st = os.stat(path)
+        sha = self.lookup(path, st)
+        if sha is not None:
+            return sha
+        sha = file_sha256(path)
+        if time.time() - st.st_mtime_ns / 1e9 >= _RACY_SECONDS:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, inode, size, mtime_ns, sha256) VALUES (?,?,?,?,?)",
+                    (self._key(path), st.st_ino, st.st_size, st.st_mtime_ns, sha),
+                )
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
+        return sha
+
+    def prune(self) -> int:
+        """Elimina entradas de archivos que ya no existen; devuelve cuántas."""
+        gone = [(p,) for (p,) in self._conn.execute("SELECT path FROM files").fetchall() if not os.path.exists(p)]
+        self._conn.executemany("DELETE FROM files WHERE path=?", gone)
+        self._conn.commit()
+        return len(gone)
+
+    def close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "FileIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def indexed_sha256(path: str, index: Optional[FileIndex] = None) -> str:
+    """file_sha256 con atajo por índice cuando se provee uno."""
+    return index.sha256(path) if index is not None else file_sha256(path)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import hashlib, json, os, threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Caché de texto OCR en disco (ocr.cache / ocr.cache_dir del config).
+# Un .txt por imagen/página, nombrado por el sha1 de su clave:
+#   - image_key: digest de los píxeles renderizados + idioma + motor
+#   - page_key : sha256 del PDF + página + dpi + idioma + motor
+# El tamaño total se acota con ocr.cache_max_mb (desaloja por mtime, LRU).
+
+DEFAULT_DIR = ".ocr_cache"
+DEFAULT_MAX_MB = 256
+
+def _load_cfg() -> Dict[str, Any]:
+    try:
+        with open(os.path.join("config", "config.json"), "r", encoding="utf-8-sig") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _sha1(*parts: Any) -> str:
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, (bytes, bytearray, memoryview)):
+            h.update(p)
+        else:
+            h.update(str(p).encode("utf-8", "surrogateescape"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def image_key(samples: Any, width: int, height: int, lang: str, engine: str) -> str:
+    return _sha1("img", width, height, samples, lang, engine)
+
+def page_key(pdf_sha256: str, page_index: int, dpi: Any, lang: str, engine: str) -> str:
+    return _sha1("page", pdf_sha256, page_index, dpi, lang, engine)
+
+class OcrCache:
+    def __init__(self, cache_dir: str = DEFAULT_DIR, max_mb: float = DEFAULT_MAX_MB, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.enabled = bool(enabled)
+        self._total: Optional[int] = None
+        self._lock = threading.Lock()
+        if self.enabled:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError:
+                self.enabled = False
+
+    @staticmethod
+    def from_config(cfg: Optional[Dict[str, Any]] = None) -> "OcrCache":
+        ocr = ((cfg if cfg is not None else _load_cfg()).get("ocr") or {})
+        return OcrCache(
+            cache_dir=ocr.get("cache_dir") or DEFAULT_DIR,
+            max_mb=ocr.get("cache_max_mb", DEFAULT_MAX_MB),
+            enabled=ocr.get("cache", True),
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        p = self._path(key)
+        try:
+            with open(p, "r", encoding="utf-8") as fh:
+                text = fh.read()
+        except OSError:
+            return None
+        try:
+            os.utime(p)  # marca de uso para el desalojo LRU
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        if not self.enabled or text is None:
+            return
+        p = self._path(key)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(text)
+            os.replace(tmp, p)
+        except OSError:
+            try: os.unlink(tmp)
+            except OSError: pass
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            else:
+                self._total += len(text.encode("utf-8"))
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def cached(self, key: str, fn: Callable[[], str]) -> str:
+        text = self.get(key)
+        if text is None:
+            text = fn() or ""
+            self.put(key, text)
+        return text
+
+    def _entries(self) -> Iterable[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(self.cache_dir) if e.name.endswith(".txt") and e.is_file()]
+        except OSError:
+            return []
+
+    def _scan_total(self) -> int:
+        return sum(e.stat().st_size for e in self._entries())
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        target = int(self.max_bytes * 0.9)
+        for e in entries:
+            if total <= target:
+                break
+            try:
+                size = e.stat().st_size
+                os.unlink(e.path)
+                total -= size
+            except OSError:
+                continue
+        self._total = total
+
+_default: Optional[OcrCache] = None
+_default_lock = threading.Lock()
+
+def default_cache() -> OcrCache:
+    """Instancia por proceso construida desde config/config.json."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = OcrCache.from_config()
+        return _default
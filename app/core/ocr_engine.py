@@ -1,7 +1,22 @@
-# ... (imports de tu archivo)
-
+# app/core/ocr_engine.py
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Callable
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image, ImageOps
+
+try:
+    import tesserocr  # API C de Tesseract: motor persistente, sin proceso por imagen
+except Exception:
+    tesserocr = None
+
+from .ocr_cache import default_cache, image_key
 
 @dataclass
 class OcrConfig:
@@ -50,3 +65,445 @@ class OcrConfig:
             min_chars_for_native=min_chars,
             raw=cfg
         )
+
+    @property
+    def max_workers(self) -> int:
+        """ocr.max_workers del config: hilos de Tesseract en paralelo por documento."""
+        try:
+            n = int(((self.raw or {}).get("ocr") or {}).get("max_workers", 1))
+        except Exception:
+            n = 1
+        return max(1, n)
+
+def configure_tesseract(tesseract_bin: Optional[str]) -> None:
+    """Configura ruta de Tesseract si se especifica."""
+    if tesseract_bin and os.path.exists(tesseract_bin):
+        pytesseract.pytesseract.tesseract_cmd = tesseract_bin
+
+# ------------ Resultado OCR ------------
+
+@dataclass
+class ExtractResult:
+    text: str
+    is_scanned_hint: bool
+    page_text_lengths: List[int]
+    ocr_text_lengths: List[int]
+
+# ------------ Utilidades internas ------------
+
+# EasyOCR usa "es"/"en"; Tesseract "spa"/"eng"
+_TESS_LANGS = {"es": "spa", "en": "eng"}
+
+def _tess_lang(langs: Optional[List[str]]) -> str:
+    if not langs:
+        return "spa+eng"
+    return "+".join(_TESS_LANGS.get(x, x) for x in langs)
+
+def _pdf_has_native_text(pdf_path: str) -> bool:
+    try:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                if page.get_text().strip():
+                    return True
+    except Exception:
+        pass
+    return False
+
+# Un PyTessBaseAPI por hilo e idioma: se carga el modelo una sola vez
+_tls = threading.local()
+
+def _tesserocr_api(lang: str) -> "tesserocr.PyTessBaseAPI":
+    apis = getattr(_tls, "apis", None)
+    if apis is None:
+        apis = _tls.apis = {}
+    api = apis.get(lang)
+    if api is None:
+        api = apis[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+    return api
+
+# ------------ Registro de motores OCR (uno por proceso) ------------
+# Cargar easyocr.Reader cuesta segundos (modelos en disco); el registro lo
+# construye una sola vez por (motor, idiomas) y lo reutiliza en todo el lote.
+# En pools de procesos, init_ocr_worker sirve de initializer para precargar.
+
+_ENGINES: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+_ENGINES_LOCK = threading.Lock()
+_CALL_LOCKS: Dict[Tuple[str, Tuple[str, ...]], threading.Lock] = {}
+
+def _load_engine(name: str, langs: Tuple[str, ...]) -> Any:
+    if name == "easyocr":
+        import easyocr
+        return easyocr.Reader(list(langs), gpu=False, verbose=False)
+    if name == "tesseract":
+        pytesseract.get_tesseract_version()  # falla aquí (una vez) si no hay binario
+        return pytesseract
+    raise ValueError(f"motor OCR desconocido: {name}")
+
+def get_engine(name: str, langs: Optional[Iterable[str]] = None) -> Any:
+    """Motor `name` para `langs`, cargado perezosamente y cacheado por proceso."""
+    key = (name, tuple(langs or ("es", "en")))
+    eng = _ENGINES.get(key)
+    if eng is None:
+        with _ENGINES_LOCK:
+            eng = _ENGINES.get(key)
+            if eng is None:
+                try:
+                    eng = _load_engine(name, key[1])
+                except Exception as e:
+                    eng = e  # se recuerda el fallo: no se reintenta por imagen
+                _ENGINES[key] = eng
+                _CALL_LOCKS[key] = threading.Lock()
+    if isinstance(eng, Exception):
+        raise RuntimeError(f"motor OCR '{name}' no disponible: {eng}")
+    return eng
+
+# ------------ Pixmap → buffers sin PNG intermedio ------------
+
+_PIX_MODES = {1: "L", 3: "RGB", 4: "RGBA"}
+
+def pixmap_to_array(pix: "fitz.Pixmap") -> "np.ndarray":
+    """Vista NumPy (H, W, n) sobre pix.samples_mv: sin copia; vive mientras viva `pix`."""
+    import numpy as np
+    arr = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    return arr.reshape(pix.height, pix.stride)[:, : pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+def pixmap_to_pil(pix: "fitz.Pixmap") -> Image.Image:
+    """Imagen PIL construida directo desde el buffer del pixmap (sin codificar PNG)."""
+    mode = _PIX_MODES.get(pix.n, "RGB")
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+def ocr_pixmap(pix: "fitz.Pixmap", name: str = "tesseract", langs: Optional[List[str]] = None) -> str:
+    """OCR de un pixmap de PyMuPDF: EasyOCR recibe la vista NumPy, Tesseract la imagen PIL."""
+    if name == "easyocr":
+        return _easyocr_read(pixmap_to_array(pix), langs)
+    return ocr_with(name, pixmap_to_pil(pix), langs)
+
+def _easyocr_read(arr: Any, langs: Optional[List[str]] = None) -> str:
+    langs = list(langs or ["es", "en"])
+    reader = get_engine("easyocr", langs)
+    with _CALL_LOCKS[("easyocr", tuple(langs))]:  # el Reader no es seguro entre hilos
+        lines = reader.readtext(arr, detail=0, paragraph=True)
+    return "\n".join(lines)
+
+def ocr_with(name: str, img: Image.Image, langs: Optional[List[str]] = None) -> str:
+    """OCR de una imagen PIL con el motor registrado `name`."""
+    langs = list(langs or ["es", "en"])
+    if name == "easyocr":
+        import numpy as np
+        return _easyocr_read(np.asarray(img.convert("RGB")), langs)
+    get_engine(name, langs)
+    return _ocr_image_pil(img, langs)
+
+def ocr_image_any(img: Image.Image, langs: Optional[List[str]] = None,
+                  prefer: Iterable[str] = ("tesseract", "easyocr")) -> Tuple[str, str]:
+    """Prueba los motores en orden; devuelve (texto, motor usado)."""
+    last: Optional[Exception] = None
+    for name in prefer:
+        try:
+            return ocr_with(name, img, langs), name
+        except Exception as e:
+            last = e
+    raise last or RuntimeError("sin motores OCR")
+
+def init_ocr_worker(engines: Iterable[str] = ("tesseract",), langs: Optional[List[str]] = None,
+                    tesseract_bin: Optional[str] = None) -> None:
+    """Initializer para ProcessPoolExecutor: precarga los motores en cada worker."""
+    configure_tesseract(tesseract_bin)
+    for name in engines:
+        try:
+            get_engine(name, langs)
+        except Exception:
+            pass
+
+def engine_name() -> str:
+    return "tesserocr" if tesserocr is not None else "pytesseract"
+
+def _ocr_image_pil(img: Image.Image, langs: List[str]) -> str:
+    lang = _tess_lang(langs)
+    if tesserocr is not None:
+        try:
+            api = _tesserocr_api(lang)
+            api.SetImage(img)
+            return api.GetUTF8Text()
+        except Exception:
+            pass
+    return pytesseract.image_to_string(img, lang=lang)
+
+def _ocr_image_cached(img: Image.Image, langs: List[str]) -> str:
+    """_ocr_image_pil consultando antes la caché en disco (clave: píxeles + idioma)."""
+    cache = default_cache()
+    if not cache.enabled:
+        return _ocr_image_pil(img, langs)
+    key = image_key(img.tobytes(), img.width, img.height, _tess_lang(langs), "tesseract")
+    return cache.cached(key, lambda: _ocr_image_pil(img, langs))
+
+def _render_page(page: "fitz.Page", dpi: int = 200) -> Image.Image:
+    pix = page.get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+# ------------ Planificador OCR adaptativo (fast.* del config) ------------
+# Primera pasada barata (ocr.scale); sólo si el puntaje queda bajo los umbrales
+# se escala: re-render a scale_hi / scale_max, mosaico (tile_grid), cuadrantes
+# de rotación y barrido fino (rot_sweep). Se corta al llegar a
+# fast.stop_when_score_reaches o al agotar fast.max_easyocr_calls_per_page.
+
+_WORD_RE = re.compile(r"[0-9A-Za-zÁÉÍÓÚÜÑáéíóúüñ]{2,}")
+_OK_PUNCT = set(".,;:-/()%$#°'\"")
+
+def score_text(text: str) -> float:
+    """Caracteres en palabras (2+ alfanuméricos) menos 2 por cada símbolo basura."""
+    t = text or ""
+    good = sum(len(w) for w in _WORD_RE.findall(t))
+    junk = sum(1 for ch in t if not (ch.isalnum() or ch.isspace() or ch in _OK_PUNCT))
+    return float(good - 2 * junk)
+
+@dataclass
+class AdaptivePolicy:
+    enabled: bool = False
+    scale: float = 2.0
+    scale_hi: float = 3.0
+    scale_max: float = 3.5
+    score_retry1: float = 110.0
+    score_retry2: float = 145.0
+    tiling: bool = True
+    tile_grid: Tuple[int, int] = (2, 2)
+    tile_below: float = 120.0
+    clahe: bool = False
+    rot_quadrants: bool = True
+    rot_quads_below: float = 115.0
+    rot_sweep: Tuple[float, float] = (0.0, 0.0)
+    rot_sweep_below: float = 115.0
+    stop_at: float = 260.0
+    max_calls: int = 14
+
+    @staticmethod
+    def from_config(cfg: Optional[Dict[str, Any]]) -> "AdaptivePolicy":
+        """
+        Activo sólo con `ocr.adaptive: true` (opt-in: cada página puede costar
+        hasta max_calls pasadas de OCR); los umbrales salen de `fast` y `ocr`.
+        """
+        cfg = cfg or {}
+        ocr = cfg.get("ocr") or {}
+        if ocr.get("adaptive") is not True:
+            return AdaptivePolicy(enabled=False)
+        fast = cfg.get("fast") if isinstance(cfg.get("fast"), dict) else {}
+        grid = list(ocr.get("tile_grid") or [2, 2]) + [2, 2]
+        sweep = list(ocr.get("rot_sweep") or [0, 0]) + [0, 0]
+        retry1 = float(ocr.get("score_retry1", fast.get("small_text_retry_below", 110)))
+        return AdaptivePolicy(
+            enabled=True,
+            scale=float(ocr.get("scale", 2.0)),
+            scale_hi=float(ocr.get("scale_hi", 3.0)),
+            scale_max=float(ocr.get("scale_max", ocr.get("scale_hi", 3.0))),
+            score_retry1=retry1,
+            score_retry2=float(ocr.get("score_retry2", retry1)),
+            tiling=bool(ocr.get("tiling", True)),
+            tile_grid=(max(1, int(grid[0])), max(1, int(grid[1]))),
+            tile_below=float(fast.get("tile_if_score_below", 120)),
+            clahe=bool(ocr.get("clahe", False)),
+            rot_quadrants=bool(ocr.get("rot_quadrants", True)),
+            rot_quads_below=float(fast.get("rot_quads_if_below", 115)),
+            rot_sweep=(float(sweep[0]), float(sweep[1])),
+            rot_sweep_below=float(fast.get("rot_sweep_if_below", 115)),
+            stop_at=float(fast.get("stop_when_score_reaches", 260)),
+            max_calls=max(1, int(fast.get("max_easyocr_calls_per_page", 14))),
+        )
+
+def _equalize(img: Image.Image) -> Image.Image:
+    # Aproximación a CLAHE sin OpenCV: ecualización global en escala de grises
+    return ImageOps.equalize(ImageOps.grayscale(img))
+
+def _tiles(img: Image.Image, grid: Tuple[int, int], overlap: float = 0.05) -> List[Image.Image]:
+    rows, cols = grid
+    w, h = img.size
+    tw, th = w / cols, h / rows
+    ox, oy = int(tw * overlap), int(th * overlap)
+    out = []
+    for r in range(rows):
+        for c in range(cols):
+            box = (max(0, int(c * tw) - ox), max(0, int(r * th) - oy),
+                   min(w, int((c + 1) * tw) + ox), min(h, int((r + 1) * th) + oy))
+            out.append(img.crop(box))
+    return out
+
+def ocr_image_adaptive(img: Image.Image, render: Optional[Callable[[float], Image.Image]],
+                       ocr_fn: Callable[[Image.Image], str], policy: AdaptivePolicy) -> Tuple[str, Dict[str, Any]]:
+    """
+    Aplica la política a una imagen ya renderizada a policy.scale. `render(scale)`
+    re-renderiza la página a otra escala (None si no es posible, p. ej. imágenes).
+    Devuelve (mejor texto, {"calls", "score", "passes": [(pasada, puntaje)]}).
+    """
+    calls = 0
+    best_text, best_score, best_img = "", float("-inf"), img
+    passes: List[Tuple[str, float]] = []
+
+    def attempt(name: str, images: List[Image.Image], base: Image.Image) -> None:
+        nonlocal calls, best_text, best_score, best_img
+        if calls + len(images) > policy.max_calls:
+            return
+        texts = []
+        for im in images:
+            texts.append(ocr_fn(im) or "")
+            calls += 1
+        text = "\n".join(t.strip() for t in texts if t.strip())
+        sc = score_text(text)
+        passes.append((name, sc))
+        if sc > best_score:
+            best_text, best_score, best_img = text, sc, base
+
+    blank = False
+
+    def done() -> bool:
+        return blank or best_score >= policy.stop_at or calls >= policy.max_calls
+
+    attempt("base", [img], img)
+    retries = [(policy.score_retry1, policy.scale_hi), (policy.score_retry2, policy.scale_max)]
+    for threshold, scale in retries:
+        if done() or render is None or best_score >= threshold or scale <= policy.scale:
+            break
+        hi = render(scale)
+        if policy.clahe:
+            hi = _equalize(hi)
+        attempt(f"scale{scale:g}", [hi], hi)
+        # página en blanco (o casi): si ni a más escala aparece texto, no se escala más
+        blank = best_score <= 0
+    if not done() and policy.tiling and best_score < policy.tile_below and policy.tile_grid != (1, 1):
+        attempt("tiles", _tiles(best_img, policy.tile_grid), best_img)
+    if not done() and policy.rot_quadrants and best_score < policy.rot_quads_below:
+        src = best_img
+        for angle in (90, 180, 270):
+            if done():
+                break
+            rot = src.rotate(angle, expand=True)
+            attempt(f"rot{angle}", [rot], rot)
+    lo, hi_angle = policy.rot_sweep
+    if not done() and best_score < policy.rot_sweep_below and (lo or hi_angle):
+        src = best_img
+        for angle in sorted({lo, lo / 2, hi_angle / 2, hi_angle} - {0.0}):
+            if done():
+                break
+            rot = src.rotate(angle, expand=True, fillcolor="white")
+            attempt(f"sweep{angle:g}", [rot], rot)
+    return best_text, {"calls": calls, "score": best_score, "passes": passes}
+
+def _render_scaled(doc: "fitz.Document", i: int, scale: float, lock: Optional[threading.Lock] = None) -> Image.Image:
+    # load_page también toca el documento: va dentro del lock junto con el render
+    if lock is None:
+        pix = doc.load_page(i).get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    with lock:
+        return _render_scaled(doc, i, scale)
+
+def ocr_pdf_pages(doc: "fitz.Document", page_ids: List[int], cfg: OcrConfig, dpi: int = 200) -> List[str]:
+    """
+    OCR de las páginas `page_ids` de `doc`, en el mismo orden.
+    El render se hace en este hilo (un fitz.Document no es thread-safe) y cada
+    imagen se entrega a un pool de hilos que lanza Tesseract; como el trabajo
+    real ocurre en el subproceso de Tesseract, los hilos no compiten por el GIL.
+    Se mantienen a lo sumo 2*max_workers imágenes en vuelo.
+    Con `ocr.adaptive: true` se usa el planificador adaptativo; sus re-render a
+    mayor escala ocurren en los hilos, y todo acceso al documento (carga de
+    página + render, también el del hilo principal) va serializado por un lock.
+    """
+    policy = AdaptivePolicy.from_config(cfg.raw)
+    if policy.enabled:
+        lock = threading.Lock()
+        render = lambda i: _render_scaled(doc, i, policy.scale, lock)
+        ocr_fn = lambda im: _ocr_image_cached(im, cfg.langs)
+        job = lambda img, i: ocr_image_adaptive(img, lambda s: _render_scaled(doc, i, s, lock), ocr_fn, policy)[0]
+    else:
+        render = lambda i: _render_page(doc[i], dpi)
+        job = lambda img, i: _ocr_image_cached(img, cfg.langs)
+
+    workers = cfg.max_workers
+    if workers <= 1 or len(page_ids) <= 1:
+        return [job(render(i), i) or "" for i in page_ids]
+
+    out: List[str] = [""] * len(page_ids)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for k, i in enumerate(page_ids):
+            pending.append((k, pool.submit(job, render(i), i)))
+            while len(pending) >= 2 * workers:
+                k0, fut = pending.popleft()
+                out[k0] = fut.result() or ""
+        while pending:
+            k0, fut = pending.popleft()
+            out[k0] = fut.result() or ""
+    return out
+
+def ocr_pages(doc: "fitz.Document", page_ids: List[int], cfg: Optional[OcrConfig] = None,
+              dpi: int = 200) -> Dict[int, str]:
+    """
+    OCR en proceso (render PyMuPDF + motor Tesseract persistente), sin PDF
+    intermedio: {índice de página: texto}. Lo usa pdf_text como camino principal.
+    """
+    cfg = cfg or OcrConfig.from_config({})
+    configure_tesseract(cfg.tesseract_bin)
+    return dict(zip(page_ids, ocr_pdf_pages(doc, list(page_ids), cfg, dpi)))
+
+# ------------ API pública usada por cli.py / gui.py ------------
+
+def extract_text_from_pdf_or_image(path: str, cfg: OcrConfig) -> ExtractResult:
+    """
+    Lee texto nativo de PDF con PyMuPDF y, si no hay suficiente texto, hace OCR con Tesseract
+    (páginas en paralelo según ocr.max_workers). Para imágenes, solo OCR.
+    """
+    text = ""
+    is_scanned_hint = False
+    page_lens: List[int] = []
+    ocr_lens: List[int] = []
+
+    lower = path.lower()
+    if lower.endswith(".pdf"):
+        # 1) Texto nativo
+        native_text = []
+        try:
+            with fitz.open(path) as doc:
+                for page in doc:
+                    t = page.get_text()
+                    native_text.append(t or "")
+                    page_lens.append(len(t or ""))
+        except Exception:
+            native_text = []
+
+        text_native_joined = "\n".join(native_text)
+        has_native = len(text_native_joined) >= cfg.min_chars_for_native
+
+        # 2) OCR si no hay suficiente texto nativo y OCR está habilitado
+        if cfg.enabled and not has_native:
+            is_scanned_hint = True
+            try:
+                with fitz.open(path) as doc:
+                    ocr_text_pages = ocr_pdf_pages(doc, list(range(doc.page_count)), cfg)
+                ocr_lens.extend(len(t) for t in ocr_text_pages)
+                text = "\n".join(ocr_text_pages)
+            except Exception:
+                # si el OCR falla, al menos devolvemos lo nativo
+                ocr_lens.clear()
+                text = text_native_joined
+        else:
+            text = text_native_joined
+
+    else:
+        # Imagen: OCR directo si enabled, si no, vacío
+        if cfg.enabled:
+            try:
+                img = Image.open(path).convert("RGB")
+                policy = AdaptivePolicy.from_config(cfg.raw)
+                if policy.enabled:
+                    text = ocr_image_adaptive(img, None, lambda im: _ocr_image_cached(im, cfg.langs), policy)[0]
+                else:
+                    text = _ocr_image_cached(img, cfg.langs)
+                ocr_lens.append(len(text or ""))
+            except Exception:
+                text = ""
+        else:
+            text = ""
+
+    return ExtractResult(
+        text=text or "",
+        is_scanned_hint=is_scanned_hint,
+        page_text_lengths=page_lens,
+        ocr_text_lengths=ocr_lens,
+    )
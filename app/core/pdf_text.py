@@ -1,30 +1,21 @@
 ﻿from __future__ import annotations
-from typing import List, Tuple, Dict, Any
+from dataclasses import dataclass, field
+from typing import List, Tuple, Dict, Any, Optional
 import os, json, tempfile, subprocess
 import fitz  # PyMuPDF
 import sys
 
+from .doc_session import DocSession, borrow
+from .ocr_cache import OcrCache, page_key
+from .utils import file_sha256
+
 def _load_cfg() -> Dict[str, Any]:
     try:
-        with open(os.path.join("config", "config.json"), "r", encoding="utf-8") as f:
+        with open(os.path.join("config", "config.json"), "r", encoding="utf-8-sig") as f:
             return json.load(f)
     except Exception:
         return {}
 
-def _run_ocrmypdf(src: str, dst: str, cfg: Dict[str, Any]) -> bool:
-    ocr = (cfg.get("ocr") or {}).get("ocrmypdf") or {}
-    if not ocr.get("enable"):
-        return False
-    jobs = str(ocr.get("jobs", 2))
-    timeout = int(ocr.get("timeout_sec", 240))
-    flags = list(ocr.get("flags", []))
-    cmd = ["python", "-m", "ocrmypdf", "-j", jobs, *flags, src, dst]
-    try:
-        subprocess.run(cmd, check=True, timeout=timeout)
-        return os.path.exists(dst) and os.path.getsize(dst) > 0
-    except Exception:
-        return False
-
 def _doc_plain_texts(doc: fitz.Document) -> List[str]:
     pages: List[str] = []
     for p in doc:
@@ -32,10 +23,129 @@ def _doc_plain_texts(doc: fitz.Document) -> List[str]:
         pages.append(t)
     return pages
 
+def _ocrmypdf_pages(pdf_path: str, page_ids: List[int], cfg: Dict[str, Any], n_pages: int = 0) -> Optional[List[str]]:
+    """
+    Texto de las páginas `page_ids` (base 0, mismo orden) vía OCRmyPDF, pasando
+    por la caché OCR en disco (clave: sha256 del PDF + página + idioma + flags).
+    Si todas ya están en caché no se lanza OCRmyPDF; si son un subconjunto del
+    documento se le pasa --pages. None si OCRmyPDF no está habilitado o falla.
+    """
+    ocr_root = (cfg.get("ocr") or {})
+    ocr = (ocr_root.get("ocrmypdf") or {})
+    if not ocr.get("enable"):
+        return None
+    cache = OcrCache.from_config(cfg)
+    keys: List[str] = []
+    if cache.enabled:
+        try:
+            sha = file_sha256(pdf_path)
+            lang = ",".join(ocr_root.get("langs") or [])
+            engine = "ocrmypdf:" + " ".join(ocr.get("flags", [])) + (" force" if ocr_root.get("force") else "")
+            keys = [page_key(sha, i, "ocrmypdf", lang, engine) for i in page_ids]
+        except Exception:
+            keys = []
+        hits = [cache.get(k) for k in keys]
+        if keys and all(h is not None for h in hits):
+            return hits  # type: ignore[return-value]
+
+    with tempfile.TemporaryDirectory() as td:
+        ocr_pdf = os.path.join(td, "ocr.pdf")
+        extra = []
+        if n_pages and len(page_ids) < n_pages:
+            extra = ["--pages", ",".join(str(i + 1) for i in page_ids)]
+        if not _run_ocrmypdf(pdf_path, ocr_pdf, cfg, extra):
+            return None
+        with fitz.open(ocr_pdf) as d2:
+            all_pages = _doc_plain_texts(d2)
+    pages = [all_pages[i] if i < len(all_pages) else "" for i in page_ids]
+    if len(keys) == len(pages):
+        for k, t in zip(keys, pages):
+            cache.put(k, t)
+    return pages
+
 def _join_pages(pages: List[str]) -> str:
     return "\n\n".join(pages).strip()
 
-def extract_text_with_meta(pdf_path: str, min_chars_for_native: int = 40) -> Dict[str, Any]:
+@dataclass
+class TextExtraction:
+    """
+    Resultado único de extracción: texto por página (nativo u OCR, el que
+    haya ganado) + meta (método, páginas OCR, estadísticas). Se calcula una
+    sola vez por archivo y lo reutilizan extract_text / extract_text_with_meta.
+    """
+    pages: List[str] = field(default_factory=list)
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def text(self) -> str:
+        return _join_pages(self.pages)
+
+    @property
+    def method(self) -> str:
+        return self.meta.get("method", "native")
+
+    @property
+    def used_ocr(self) -> bool:
+        return bool(self.meta.get("used_ocr"))
+
+def _fill_meta(meta: Dict[str, Any], pages: List[str], used_ocr: bool) -> None:
+    meta["chars_total"] = sum(len(x) for x in pages)
+    meta["per_page"] = [{"page": i, "chars": len(t), "empty": len(t.strip()) == 0, "used_ocr": used_ocr}
+                        for i, t in enumerate(pages, 1)]
+    if used_ocr:
+        meta["ocr_pages"] = list(range(1, len(pages) + 1))
+    meta["sample"] = (pages[0] or "")[:280] + "..." if pages else ""
+
+def _ocr_selected_pages(pdf_path: str, page_ids: List[int], cfg: Dict[str, Any], n_pages: int,
+                        session: Optional[DocSession] = None) -> Tuple[List[str], str]:
+    """
+    OCR sólo de `page_ids`. Camino principal en proceso (render PyMuPDF +
+    Tesseract persistente, sin PDF intermedio); OCRmyPDF como subproceso queda
+    sólo de respaldo si ocr.ocrmypdf.enable y el motor en proceso no está disponible.
+    """
+    try:
+        from .ocr_engine import OcrConfig, ocr_pages
+        with borrow(session or pdf_path) as s:
+            got = ocr_pages(s.doc, page_ids, OcrConfig.from_config(cfg))
+        return [got.get(i, "") or "" for i in page_ids], "tesseract"
+    except Exception:
+        pass
+    pages = _ocrmypdf_pages(pdf_path, page_ids, cfg, n_pages)
+    if pages is not None:
+        return pages, "ocrmypdf"
+    return [""] * len(page_ids), ""
+
+def _extract_per_page(pdf_path: str, native_pages: List[str], meta: Dict[str, Any], cfg: Dict[str, Any],
+                      min_chars: int, session: Optional[DocSession] = None) -> TextExtraction:
+    """
+    Modo ocr.mode = "page": sólo pasan por OCR las páginas cuyo texto nativo
+    queda bajo el umbral; su texto OCR se intercala en la lista nativa (si
+    aporta más que el nativo). En documentos mixtos (anexos escaneados al
+    final) evita rasterizar y reconocer las páginas que ya traen texto.
+    """
+    meta["mode"] = "page"
+    pages = list(native_pages)
+    low = [i for i, t in enumerate(native_pages) if len(t) < min_chars]
+    used: List[int] = []
+    if low:
+        texts, engine = _ocr_selected_pages(pdf_path, low, cfg, len(native_pages), session)
+        for i, t in zip(low, texts):
+            t = (t or "").strip()
+            if len(t) > len(native_pages[i]):
+                pages[i] = t
+                used.append(i)
+        if used:
+            meta["used_ocr"] = True
+            meta["method"] = engine
+    meta["chars_total"] = sum(len(x) for x in pages)
+    meta["per_page"] = [{"page": i + 1, "chars": len(t), "empty": len(t.strip()) == 0, "used_ocr": i in used}
+                        for i, t in enumerate(pages)]
+    meta["ocr_pages"] = [i + 1 for i in used]
+    meta["sample"] = (pages[0] or "")[:280] + "..." if pages else ""
+    return TextExtraction(pages, meta)
+
+def extract(pdf_path: str, min_chars_for_native: int = 40, session: Optional[DocSession] = None) -> TextExtraction:
+    """`session`: DocSession ya abierta del mismo archivo (reusa documento y texto por página)."""
     cfg = _load_cfg()
     ocr_cfg = (cfg.get("ocr") or {})
     force_ocr = bool(ocr_cfg.get("force", False))
@@ -50,78 +160,47 @@ def extract_text_with_meta(pdf_path: str, min_chars_for_native: int = 40) -> Dic
         "sample": ""
     }
 
-    with fitz.open(pdf_path) as doc:
-        meta["pages"] = doc.page_count
-        native_pages = _doc_plain_texts(doc)
+    with borrow(session or pdf_path) as s:
+        meta["pages"] = s.page_count
+        native_pages = [t.strip() for t in s.page_texts()]
+
+        # Modo por página: decide nativo/OCR página a página (ver _extract_per_page)
+        if str(ocr_cfg.get("mode", "document")).lower() == "page" and not force_ocr:
+            return _extract_per_page(pdf_path, native_pages, meta, cfg, min_chars_for_native, s)
+        return _extract_document(pdf_path, native_pages, meta, cfg, min_chars_for_native, force_ocr, s)
+
+def _extract_document(pdf_path: str, native_pages: List[str], meta: Dict[str, Any], cfg: Dict[str, Any],
+                      min_chars_for_native: int, force_ocr: bool, session: DocSession) -> TextExtraction:
     native_total = sum(len(x) for x in native_pages)
 
     # Sólo devolvemos nativo de inmediato si NO estamos forzando OCR
     if native_total >= min_chars_for_native and not force_ocr:
-        meta["chars_total"] = native_total
-        for i, t in enumerate(native_pages, 1):
-            meta["per_page"].append({"page": i, "chars": len(t), "empty": len(t.strip()) == 0, "used_ocr": False})
-        meta["sample"] = (native_pages[0] or "")[:280] + "..." if native_pages else ""
-        return meta
-
-    # Intentar OCRmyPDF primero
-    with tempfile.TemporaryDirectory() as td:
-        ocr_pdf = os.path.join(td, "ocr.pdf")
-        if _run_ocrmypdf(pdf_path, ocr_pdf, cfg):
-            with fitz.open(ocr_pdf) as d2:
-                ocr_pages = _doc_plain_texts(d2)
-            total2 = sum(len(x) for x in ocr_pages)
-            # Elegimos el mejor (más texto)
-            if total2 >= native_total:
-                meta["used_ocr"] = True
-                meta["method"] = "ocrmypdf"
-                meta["chars_total"] = total2
-                for i, t in enumerate(ocr_pages, 1):
-                    meta["per_page"].append({"page": i, "chars": len(t), "empty": len(t.strip()) == 0, "used_ocr": True})
-                meta["ocr_pages"] = list(range(1, len(ocr_pages) + 1))
-                meta["sample"] = (ocr_pages[0] or "")[:280] + "..." if ocr_pages else ""
-                return meta
-
-    # Fallback: EasyOCR (tu motor existente)
-    try:
-        from .ocr_engine import ocr_pages as _easyocr_pages
-        with fitz.open(pdf_path) as doc:
-            page_ids = list(range(len(doc)))
-            ocr_map = _easyocr_pages(doc, page_ids)
-        pages = [(ocr_map.get(i, "") or "") for i in range(len(page_ids))]
-        total_e = sum(len(x) for x in pages)
-        # Elegimos el mejor entre native y easyocr
-        if total_e >= native_total:
-            meta["used_ocr"] = True
-            meta["method"] = "easyocr"
-            meta["chars_total"] = total_e
-            meta["per_page"] = [{"page": i+1, "chars": len(t), "empty": len(t.strip()) == 0, "used_ocr": True}
-                                for i, t in enumerate(pages)]
-            meta["ocr_pages"] = list(range(1, len(pages) + 1))
-            meta["sample"] = (pages[0] or "")[:280] + "..." if pages else ""
-            return meta
-    except Exception:
-        pass
+        _fill_meta(meta, native_pages, False)
+        return TextExtraction(native_pages, meta)
+
+    # OCR de todo el documento (en proceso; OCRmyPDF sólo de respaldo)
+    ocr_pages, engine = _ocr_selected_pages(pdf_path, list(range(meta["pages"])), cfg, meta["pages"], session)
+    # Elegimos el mejor (más texto)
+    if engine and sum(len(x) for x in ocr_pages) >= native_total:
+        meta["used_ocr"] = True
+        meta["method"] = engine
+        _fill_meta(meta, ocr_pages, True)
+        return TextExtraction(ocr_pages, meta)
 
     # Si OCR no mejoró, nos quedamos con nativo
-    meta["chars_total"] = native_total
-    for i, t in enumerate(native_pages, 1):
-        meta["per_page"].append({"page": i, "chars": len(t), "empty": len(t.strip()) == 0, "used_ocr": False})
-    meta["sample"] = (native_pages[0] or "")[:280] + "..." if native_pages else ""
-    return meta
-
-def extract_text(pdf_path: str, min_chars_for_native: int = 40) -> Tuple[str, List[str]]:
-    meta = extract_text_with_meta(pdf_path, min_chars_for_native=min_chars_for_native)
-    try:
-        with fitz.open(pdf_path) as doc:
-            pages = _doc_plain_texts(doc)
-    except Exception:
-        pages = []
-    if not pages and meta.get("per_page"):
-        pages = [""] * len(meta["per_page"])
-    text_total = _join_pages(pages)
-    return text_total, pages
+    _fill_meta(meta, native_pages, False)
+    return TextExtraction(native_pages, meta)
+
+def extract_text_with_meta(pdf_path: str, min_chars_for_native: int = 40,
+                           session: Optional[DocSession] = None) -> Dict[str, Any]:
+    return extract(pdf_path, min_chars_for_native=min_chars_for_native, session=session).meta
+
+def extract_text(pdf_path: str, min_chars_for_native: int = 40,
+                 session: Optional[DocSession] = None) -> Tuple[str, List[str]]:
+    res = extract(pdf_path, min_chars_for_native=min_chars_for_native, session=session)
+    return res.text, res.pages
 
-def _run_ocrmypdf(src: str, dst: str, cfg: Dict[str, Any]) -> bool:
+def _run_ocrmypdf(src: str, dst: str, cfg: Dict[str, Any], extra_flags: Optional[List[str]] = None) -> bool:
     ocr_root = (cfg.get("ocr") or {})
     ocr = (ocr_root.get("ocrmypdf") or {})
     if not ocr.get("enable"):
@@ -129,7 +208,7 @@ def _run_ocrmypdf(src: str, dst: str, cfg: Dict[str, Any]) -> bool:
 
     jobs = str(ocr.get("jobs", 2))
     timeout = int(ocr.get("timeout_sec", 240))
-    flags = list(ocr.get("flags", []))
+    flags = list(ocr.get("flags", [])) + list(extra_flags or [])
 
     # Si se fuerza OCR en config, añadimos --force-ocr
     if ocr_root.get("force") and "--force-ocr" not in flags:
@@ -0,0 +1,224 @@
+from __future__ import annotations
+import json, os, shutil, tempfile
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Pipeline por etapas para lotes grandes:
+#   descubrir → hash → texto/OCR → firmas → entidades → sink
+# Cada etapa es un map ordenado con ventana acotada (back-pressure): nunca hay
+# más de `window` elementos en vuelo por etapa, así la memoria no depende del
+# tamaño del lote y los resultados llegan a los sinks a medida que salen.
+
+def bounded_map(fn: Callable[[Any], Any], items: Iterable[Any], workers: int = 1, window: Optional[int] = None,
+                executor: Optional[Executor] = None) -> Iterator[Any]:
+    """
+    Como map(fn, items) pero con `workers` en paralelo y a lo sumo `window`
+    tareas pendientes (default 2*workers); conserva el orden de entrada.
+    `executor` permite usar un pool ya creado (p. ej. de procesos).
+    """
+    if executor is None and workers <= 1:
+        for it in items:
+            yield fn(it)
+        return
+    window = max(1, window or 2 * max(1, workers))
+    own = executor is None
+    pool = executor or ThreadPoolExecutor(max_workers=workers)
+    pending: deque = deque()
+    try:
+        for it in items:
+            pending.append(pool.submit(fn, it))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+        if own:
+            pool.shutdown(wait=True)
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    window: Optional[int] = None
+    executor: Optional[Executor] = None
+
+def run_stages(items: Iterable[Any], stages: Sequence[Stage]) -> Iterator[Any]:
+    """Encadena las etapas; cada una tira de la anterior a su propio ritmo."""
+    stream: Iterable[Any] = items
+    for st in stages:
+        stream = bounded_map(st.fn, stream, st.workers, st.window, st.executor)
+    return iter(stream)
+
+# ------------ Sinks en streaming ------------
+
+class StreamingJsonWriter:
+    """
+    Escribe un objeto JSON {"cabecera"..., "lista": [...], "mapa": {...}} a medida
+    que llegan los elementos, con el mismo texto que json.dump(obj, indent=2).
+    La primera clave de `streams` va directo al archivo; las siguientes se
+    acumulan en temporales en disco y se copian al cerrar (memoria constante).
+    """
+
+    def __init__(self, path: str, head: Dict[str, Any], streams: Sequence[Tuple[str, str]],
+                 default: Optional[Callable[[Any], Any]] = None, ensure_ascii: bool = False):
+        self._dump = lambda v: json.dumps(v, ensure_ascii=ensure_ascii, indent=2, default=default)
+        self._key = lambda k: json.dumps(k, ensure_ascii=ensure_ascii)
+        self._fh: IO[str] = open(path, "w", encoding="utf-8")
+        self._members = 0
+        self._fh.write("{")
+        for k, v in head.items():
+            self._member(self._fh, k)
+            self._fh.write(self._dump(v).replace("\n", "\n  "))
+        self._streams: Dict[str, Dict[str, Any]] = {}
+        for i, (name, kind) in enumerate(streams):
+            fh = self._fh if i == 0 else tempfile.TemporaryFile("w+", encoding="utf-8")
+            self._streams[name] = {"kind": kind, "fh": fh, "n": 0}
+            if i == 0:
+                self._open_stream(name)
+
+    def _member(self, fh: IO[str], key: str) -> None:
+        fh.write(("\n  " if self._members == 0 else ",\n  ") + self._key(key) + ": ")
+        self._members += 1
+
+    def _open_stream(self, name: str) -> None:
+        self._member(self._fh, name)
+        self._fh.write("[" if self._streams[name]["kind"] == "list" else "{")
+
+    def _entry(self, name: str, text: str) -> None:
+        st = self._streams[name]
+        st["fh"].write(("\n    " if st["n"] == 0 else ",\n    ") + text.replace("\n", "\n    "))
+        st["n"] += 1
+        if st["fh"] is self._fh:
+            self._fh.flush()
+
+    def append(self, name: str, item: Any) -> None:
+        self._entry(name, self._dump(item))
+
+    def put(self, name: str, key: str, value: Any) -> None:
+        self._entry(name, self._key(key) + ": " + self._dump(value))
+
+    def _close_stream(self, st: Dict[str, Any]) -> None:
+        close = "]" if st["kind"] == "list" else "}"
+        self._fh.write(("\n  " + close) if st["n"] else close)
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        for i, (name, st) in enumerate(self._streams.items()):
+            if i > 0:
+                self._open_stream(name)
+                st["fh"].seek(0)
+                shutil.copyfileobj(st["fh"], self._fh)
+                st["fh"].close()
+            self._close_stream(st)
+        self._fh.write("\n}" if self._members else "}")
+        self._fh.close()
+
+    def __enter__(self) -> "StreamingJsonWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class LineWriter:
+    """Equivalente en streaming a fh.write(sep.join(bloques)): escribe cada bloque al llegar."""
+
+    def __init__(self, path: str, encoding: str = "utf-8", errors: str = "strict", sep: str = "\n"):
+        self._fh = open(path, "w", encoding=encoding, errors=errors)
+        self._sep = sep
+        self._first = True
+
+    def write_block(self, lines: List[str]) -> None:
+        for line in lines:
+            self._fh.write(line if self._first else self._sep + line)
+            self._first = False
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> "LineWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# ------------ JSONL: un registro por línea, reanudable ------------
+
+class JsonlWriter:
+    """Sink append-only: cada registro se escribe y se vuelca al disco al producirse."""
+
+    def __init__(self, path: str, append: bool = False, default: Optional[Callable[[Any], Any]] = None):
+        self._fh = open(path, "a" if append else "w", encoding="utf-8")
+        self._default = default
+
+    def write(self, rec: Any) -> None:
+        self._fh.write(json.dumps(rec, ensure_ascii=False, default=self._default) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def repair_jsonl(path: str) -> int:
+    """Recorta una última línea incompleta (corte a mitad de escritura); devuelve bytes eliminados."""
+    try:
+        with open(path, "rb+") as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            pos = size
+            while pos > 0:
+                step = min(65536, pos)
+                fh.seek(pos - step)
+                chunk = fh.read(step)
+                nl = chunk.rfind(b"\n")
+                if nl >= 0:
+                    pos = pos - step + nl + 1
+                    break
+                pos -= step
+            fh.truncate(pos)
+            return size - pos
+    except FileNotFoundError:
+        return 0
+
+def iter_jsonl(path: str) -> Iterator[Any]:
+    """Lee registro a registro (sin cargar el archivo); ignora líneas corruptas."""
+    try:
+        fh = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+# ------------ Metadatos del lote (para reanudar solo lo que corresponde) ------------
+
+LOT_NAME = "lot.json"
+
+def write_lot(out_dir: str, src: str) -> None:
+    with open(os.path.join(out_dir, LOT_NAME), "w", encoding="utf-8") as fh:
+        json.dump({"src": os.path.abspath(src)}, fh, ensure_ascii=False)
+
+def lot_src(out_dir: str) -> Optional[str]:
+    """Carpeta de origen registrada del lote; None si no hay lot.json legible."""
+    try:
+        with open(os.path.join(out_dir, LOT_NAME), "r", encoding="utf-8") as fh:
+            return json.load(fh).get("src")
+    except (OSError, ValueError, AttributeError):
+        return None
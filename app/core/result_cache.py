@@ -0,0 +1,139 @@
+from __future__ import annotations
+import hashlib, os, pickle, sqlite3, time
+from typing import Any, Callable, Iterable, Optional
+
+# Caché persistente de resultados por archivo, direccionada por contenido:
+#   clave = sha256 del archivo + tipo de resultado + huella (config/trust).
+# Si el PDF no cambió y la configuración tampoco, el resultado sale de SQLite
+# en milisegundos en lugar de rehacer OCR / validación / extracción.
+
+DEFAULT_DIR = ".result_cache"
+DEFAULT_MAX_MB = 512
+
+_MISS = object()
+
+def _hash_file_bytes(h, path: str) -> None:
+    try:
+        with open(path, "rb") as fh:
+            h.update(fh.read())
+    except Exception:
+        h.update(b"<none>")
+
+def config_fingerprint(cfg_path: str = os.path.join("config", "config.json")) -> str:
+    h = hashlib.sha256()
+    _hash_file_bytes(h, cfg_path)
+    return h.hexdigest()[:16]
+
+def dir_fingerprint(path: Optional[str]) -> str:
+    """Huella barata de una carpeta (nombres, tamaños, mtime_ns); '' si no existe."""
+    if not path or not os.path.isdir(path):
+        return ""
+    h = hashlib.sha256()
+    for fn in sorted(os.listdir(path)):
+        try:
+            st = os.stat(os.path.join(path, fn))
+        except OSError:
+            continue
+        h.update(f"{fn}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return h.hexdigest()[:16]
+
+def fingerprint(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8", "surrogateescape")); h.update(b"\x00")
+    return h.hexdigest()[:16]
+
+class ResultCache:
+    """
+    Tabla única (sha256, kind, fp) → pickle del resultado, con desalojo LRU
+    cuando el total supera max_bytes. Segura para varios procesos (WAL).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "results.sqlite"), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " sha256 TEXT NOT NULL, kind TEXT NOT NULL, fp TEXT NOT NULL,"
+            " value BLOB NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL,"
+            " PRIMARY KEY (sha256, kind, fp))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_atime ON results(atime)")
+        self._conn.commit()
+        self._total = self._sum_size()
+
+    def _sum_size(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        return int(row[0] or 0)
+
+    def get(self, sha256: str, kind: str, fp: str = "", default: Any = None) -> Any:
+        row = self._conn.execute(
+            "SELECT value FROM results WHERE sha256=? AND kind=? AND fp=?", (sha256, kind, fp)
+        ).fetchone()
+        if row is None:
+            return default
+        try:
+            value = pickle.loads(row[0])
+        except Exception:
+            return default
+        try:
+            self._conn.execute(
+                "UPDATE results SET atime=? WHERE sha256=? AND kind=? AND fp=?", (time.time(), sha256, kind, fp)
+            )
+            self._conn.commit()
+        except sqlite3.Error:
+            pass
+        return value
+
+    def put(self, sha256: str, kind: str, value: Any, fp: str = "") -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (sha256, kind, fp, value, size, atime) VALUES (?,?,?,?,?,?)",
+                (sha256, kind, fp, sqlite3.Binary(blob), len(blob), time.time()),
+            )
+            self._conn.commit()
+        except sqlite3.Error:
+            return
+        self._total += len(blob)
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, sha256: str, kind: str, fn: Callable[[], Any], fp: str = "") -> Any:
+        value = self.get(sha256, kind, fp, default=_MISS)
+        if value is _MISS:
+            value = fn()
+            self.put(sha256, kind, value, fp)
+        return value
+
+    def evict(self) -> None:
+        """Borra los menos usados hasta quedar en ~90% de max_bytes."""
+        self._total = self._sum_size()
+        target = int(self.max_bytes * 0.9)
+        if self._total <= self.max_bytes:
+            return
+        rows: Iterable = self._conn.execute("SELECT sha256, kind, fp, size FROM results ORDER BY atime ASC").fetchall()
+        doomed = []
+        for sha, kind, fp, size in rows:
+            if self._total <= target:
+                break
+            doomed.append((sha, kind, fp))
+            self._total -= int(size)
+        self._conn.executemany("DELETE FROM results WHERE sha256=? AND kind=? AND fp=?", doomed)
+        self._conn.commit()
+
+    def close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "ResultCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,342 @@
+from __future__ import annotations
+import asyncio, datetime as dt, hashlib, os, sqlite3, threading, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from asn1crypto import crl as a_crl, ocsp as a_ocsp, x509
+
+from .result_cache import DEFAULT_DIR as CACHE_DIR
+
+# Caché persistente de información de revocación (CRL / OCSP):
+#   CRL  → clave = sha1(issuer)[@sha1(url)] (+ ':delta' para CRLs delta); la URL
+#          es la del IssuingDistributionPoint, así las CRL particionadas de un
+#          mismo emisor no se pisan y cada cert solo ve las de sus cRLDistributionPoints
+#   OCSP → clave = sha1(issuer):serial     (mismo hash que CertID de OCSP)
+# Cada entrada vence en su nextUpdate (o ttl_hours si no trae). En línea, los
+# fetchers de pyHanko consultan primero la caché y solo van a la red si no hay
+# nada vigente; --offline no usa red: valida con lo que haya en la caché.
+
+DEFAULT_NAME = "revinfo.sqlite"
+DEFAULT_TTL_HOURS = 24
+SCHEMA_VERSION = 2  # 2: CRL con punto de distribución en la clave
+
+def _hex_sha1(b: bytes) -> str:
+    return hashlib.sha1(b).hexdigest()
+
+def _ts(v: Optional[dt.datetime]) -> Optional[float]:
+    if v is None:
+        return None
+    if v.tzinfo is None:
+        v = v.replace(tzinfo=dt.timezone.utc)
+    return v.timestamp()
+
+def _crl_key(issuer: x509.Name, url: Optional[str] = None, delta: bool = False) -> str:
+    return _hex_sha1(issuer.dump()) + (f"@{_hex_sha1(url.encode())}" if url else "") + (":delta" if delta else "")
+
+def _dp_urls(points: Any) -> List[str]:
+    urls = []
+    for dp in points or []:
+        try:
+            if dp.url: urls.append(dp.url)
+        except ValueError:  # nombre relativo al emisor: sin URL
+            continue
+    return urls
+
+def crl_keys_for_cert(cert: x509.Certificate, delta: bool = False) -> List[str]:
+    """CRL completas del emisor (sin IDP) más las particiones de los puntos de distribución del cert."""
+    points = list(cert.crl_distribution_points or []) + (list(cert.delta_crl_distribution_points or []) if delta else [])
+    return [_crl_key(cert.issuer, None, delta)] + [_crl_key(cert.issuer, u, delta) for u in dict.fromkeys(_dp_urls(points))]
+
+def _idp_url(c: a_crl.CertificateList) -> Optional[str]:
+    idp = c.issuing_distribution_point_value
+    if idp is None:
+        return None
+    name = idp["distribution_point"]
+    if name.name != "full_name":
+        return None
+    for gn in name.chosen:
+        if gn.name == "uniform_resource_identifier":
+            return gn.native
+    return None
+
+def ocsp_key_for_cert(cert: x509.Certificate) -> str:
+    return f"{_hex_sha1(cert.issuer.dump())}:{cert.serial_number:x}"
+
+def _crl_meta(c: a_crl.CertificateList) -> Tuple[str, Optional[float], Optional[float]]:
+    tbs = c["tbs_cert_list"]
+    key = _crl_key(c.issuer, _idp_url(c), c.delta_crl_indicator_value is not None)
+    return key, _ts(tbs["this_update"].native), _ts(tbs["next_update"].native)
+
+def _ocsp_meta(r: a_ocsp.OCSPResponse) -> Optional[Tuple[str, Optional[float], Optional[float]]]:
+    try:
+        single = r.basic_ocsp_response["tbs_response_data"]["responses"][0]
+    except Exception:
+        return None  # sin respuestas (p. ej. unauthorized): no se guarda
+    cid = single["cert_id"]
+    # el CertID trae el hash del nombre del emisor con su algoritmo; sha1 es lo habitual
+    algo = cid["hash_algorithm"]["algorithm"].native
+    name_hash = cid["issuer_name_hash"].native.hex()
+    if algo != "sha1":
+        name_hash = f"{algo}-{name_hash}"
+    key = f"{name_hash}:{cid['serial_number'].native:x}"
+    return key, _ts(single["this_update"].native), _ts(single["next_update"].native)
+
+def _load_crl(data: Union[bytes, a_crl.CertificateList]) -> a_crl.CertificateList:
+    return data if isinstance(data, a_crl.CertificateList) else a_crl.CertificateList.load(data)
+
+def _load_ocsp(data: Union[bytes, a_ocsp.OCSPResponse]) -> a_ocsp.OCSPResponse:
+    return data if isinstance(data, a_ocsp.OCSPResponse) else a_ocsp.OCSPResponse.load(data)
+
+class RevocationCache:
+    """
+    Tabla (kind, key, digest) → DER + vigencia. Segura para varios procesos (WAL);
+    dentro de un proceso la comparten los hilos del loop de pyHanko.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl_hours: float = DEFAULT_TTL_HOURS):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.ttl = float(ttl_hours) * 3600
+        self._lock = threading.Lock()
+        self._seen: set = set()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, DEFAULT_NAME), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS revinfo ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, digest TEXT NOT NULL, der BLOB NOT NULL,"
+            " this_update REAL, expires REAL NOT NULL, fetched REAL NOT NULL,"
+            " PRIMARY KEY (kind, key, digest))"
+        )
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # claves de CRL sin punto de distribución: no se sabe a qué partición cubrían
+            self._conn.execute("DELETE FROM revinfo WHERE kind='crl'")
+            self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def _put(self, kind: str, key: str, der: bytes, this_update: Optional[float], next_update: Optional[float]) -> bool:
+        digest = hashlib.sha256(der).hexdigest()
+        if digest in self._seen:
+            return False
+        now = time.time()
+        expires = next_update if next_update is not None else now + self.ttl
+        with self._lock:
+            try:
+                if this_update is not None:
+                    # una CRL/OCSP más nueva de la misma clave (emisor + partición) reemplaza a las anteriores
+                    self._conn.execute("DELETE FROM revinfo WHERE kind=? AND key=? AND this_update < ?", (kind, key, this_update))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO revinfo (kind, key, digest, der, this_update, expires, fetched) VALUES (?,?,?,?,?,?,?)",
+                    (kind, key, digest, sqlite3.Binary(der), this_update, expires, now),
+                )
+                self._conn.commit()
+            except sqlite3.Error:
+                return False
+            self._seen.add(digest)
+        return True
+
+    def put_crl(self, data: Union[bytes, a_crl.CertificateList]) -> bool:
+        try:
+            c = _load_crl(data)
+            key, this_u, next_u = _crl_meta(c)
+        except Exception:
+            return False
+        return self._put("crl", key, c.dump(), this_u, next_u)
+
+    def put_ocsp(self, data: Union[bytes, a_ocsp.OCSPResponse]) -> bool:
+        try:
+            r = _load_ocsp(data)
+            meta = _ocsp_meta(r)
+        except Exception:
+            return False
+        return meta is not None and self._put("ocsp", meta[0], r.dump(), meta[1], meta[2])
+
+    def _fresh(self, kind: str, key: Optional[str] = None, now: Optional[float] = None) -> List[bytes]:
+        now = time.time() if now is None else now
+        sql = "SELECT der FROM revinfo WHERE kind=? AND expires > ?"
+        args: Tuple[Any, ...] = (kind, now)
+        if key is not None:
+            sql += " AND key=?"; args += (key,)
+        with self._lock:
+            return [bytes(r[0]) for r in self._conn.execute(sql, args).fetchall()]
+
+    def crls(self, now: Optional[float] = None) -> List[bytes]:
+        return self._fresh("crl", now=now)
+
+    def ocsps(self, now: Optional[float] = None) -> List[bytes]:
+        return self._fresh("ocsp", now=now)
+
+    def crls_for(self, cert: x509.Certificate) -> List[a_crl.CertificateList]:
+        keys = crl_keys_for_cert(cert) + crl_keys_for_cert(cert, delta=True)
+        ders = [d for k in keys for d in self._fresh("crl", k)]
+        return [a_crl.CertificateList.load(d) for d in ders]
+
+    def ocsp_for(self, cert: x509.Certificate) -> Optional[a_ocsp.OCSPResponse]:
+        ders = self._fresh("ocsp", ocsp_key_for_cert(cert))
+        return a_ocsp.OCSPResponse.load(ders[-1]) if ders else None
+
+    def harvest(self, vc: Any) -> int:
+        """Guarda lo que un ValidationContext haya obtenido (red o DSS); devuelve cuántas entradas nuevas."""
+        n = 0
+        try:
+            n += sum(self.put_crl(c) for c in vc.crls)
+            n += sum(self.put_ocsp(r) for r in vc.ocsps)
+        except Exception:
+            pass
+        return n
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Borra las entradas vencidas; devuelve cuántas."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM revinfo WHERE expires <= ?", (time.time() if now is None else now,))
+            self._conn.commit()
+            self._seen.clear()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) FROM revinfo WHERE expires > ? GROUP BY kind", (now,)).fetchall()
+        return {k: int(n) for k, n in rows}
+
+    def close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "RevocationCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# ------------ Fetchers de pyHanko con la caché delante ------------
+
+def caching_fetcher_backend(cache: RevocationCache, timeout: int = 10) -> Any:
+    """FetcherBackend para ValidationContext(fetcher_backend=...): caché primero, red solo si falta."""
+    from pyhanko_certvalidator.fetchers.api import CRLFetcher, FetcherBackend, Fetchers, OCSPFetcher
+    from pyhanko_certvalidator.fetchers.requests_fetchers import RequestsFetcherBackend
+
+    class _CRL(CRLFetcher):
+        def __init__(self, inner):
+            self._inner = inner
+            self._hits: Dict[str, List[a_crl.CertificateList]] = {}
+
+        async def fetch(self, cert, *, use_deltas=None):
+            hit = cache.crls_for(cert)
+            if hit:
+                self._hits[cert.issuer_serial] = hit
+                return hit
+            res = await self._inner.fetch(cert, use_deltas=use_deltas)
+            for c in res:
+                cache.put_crl(c)
+            return res
+
+        def fetched_crls(self):
+            return list(self._inner.fetched_crls()) + [c for v in self._hits.values() for c in v]
+
+        def fetched_crls_for_cert(self, cert):
+            if cert.issuer_serial in self._hits:
+                return self._hits[cert.issuer_serial]
+            return self._inner.fetched_crls_for_cert(cert)
+
+    class _OCSP(OCSPFetcher):
+        def __init__(self, inner):
+            self._inner = inner
+            self._hits: Dict[str, a_ocsp.OCSPResponse] = {}
+
+        async def fetch(self, cert, authority):
+            hit = cache.ocsp_for(cert)
+            if hit is not None:
+                self._hits[cert.issuer_serial] = hit
+                return hit
+            res = await self._inner.fetch(cert, authority)
+            cache.put_ocsp(res)
+            return res
+
+        def fetched_responses(self):
+            return list(self._inner.fetched_responses()) + list(self._hits.values())
+
+        def fetched_responses_for_cert(self, cert):
+            if cert.issuer_serial in self._hits:
+                return [self._hits[cert.issuer_serial]]
+            return self._inner.fetched_responses_for_cert(cert)
+
+    class _Backend(FetcherBackend):
+        def __init__(self):
+            self._inner = RequestsFetcherBackend(per_request_timeout=timeout)
+
+        def get_fetchers(self) -> Fetchers:
+            f = self._inner.get_fetchers()
+            return Fetchers(ocsp_fetcher=_OCSP(f.ocsp_fetcher), crl_fetcher=_CRL(f.crl_fetcher), cert_fetcher=f.cert_fetcher)
+
+        async def close(self):
+            await self._inner.close()
+
+    return _Backend()
+
+def validation_kwargs(cache: Optional[RevocationCache], offline: bool = False, timeout: int = 10) -> Dict[str, Any]:
+    """
+    Parámetros de revocación para ValidationContext:
+      - offline: sin red; CRL/OCSP vigentes de la caché precargados
+      - en línea: fetchers con la caché delante (y lo nuevo queda guardado)
+    """
+    if offline:
+        return {"allow_fetching": False,
+                "crls": cache.crls() if cache is not None else [],
+                "ocsps": cache.ocsps() if cache is not None else []}
+    if cache is None:
+        return {"allow_fetching": True}
+    return {"allow_fetching": True, "fetcher_backend": caching_fetcher_backend(cache, timeout)}
+
+# ------------ Prefetch ------------
+
+def certs_from_pdfs(pdfs: Iterable[str]) -> List[x509.Certificate]:
+    """Certificados de firmante y embebidos en el CMS de cada firma (sin duplicados)."""
+    from pyhanko.pdf_utils.reader import PdfFileReader
+    seen, out = set(), []
+    for pdf in pdfs:
+        try:
+            with open(pdf, "rb") as fh:
+                for emb in PdfFileReader(fh, strict=False).embedded_signatures:
+                    for c in [emb.signer_cert, *emb.other_embedded_certs]:
+                        if c is not None and c.sha256 not in seen:
+                            seen.add(c.sha256); out.append(c)
+        except Exception as e:
+            print(f"[prefetch] WARN {os.path.basename(pdf)}: {e}")
+    return out
+
+def prefetch(certs: Iterable[x509.Certificate], cache: RevocationCache, timeout: int = 10) -> Dict[str, int]:
+    """
+    Descarga CRL y OCSP de cada certificado (si no hay algo vigente en la caché).
+    El emisor se busca entre los mismos certificados; los autofirmados se omiten.
+    """
+    from pyhanko_certvalidator.authority import AuthorityWithCert
+    certs = list(certs)
+    by_subject: Dict[bytes, x509.Certificate] = {}
+    for c in certs:
+        by_subject.setdefault(c.subject.dump(), c)
+    fetchers = caching_fetcher_backend(cache, timeout).get_fetchers()
+    stats = {"certs": 0, "crl": 0, "ocsp": 0, "errors": 0}
+
+    async def _one(cert: x509.Certificate) -> None:
+        try:
+            if await fetchers.crl_fetcher.fetch(cert):
+                stats["crl"] += 1
+        except Exception:
+            stats["errors"] += 1
+        issuer = by_subject.get(cert.issuer.dump())
+        if issuer is None or not cert.ocsp_urls:
+            return
+        try:
+            await fetchers.ocsp_fetcher.fetch(cert, AuthorityWithCert(issuer))
+            stats["ocsp"] += 1
+        except Exception:
+            stats["errors"] += 1
+
+    async def _all() -> None:
+        todo = [c for c in certs if c.self_signed == "no"]
+        stats["certs"] = len(todo)
+        await asyncio.gather(*(_one(c) for c in todo))
+
+    asyncio.run(_all())
+    return stats
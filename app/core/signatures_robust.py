@@ -1,7 +1,11 @@
 from __future__ import annotations
 import datetime as _dt
+import hashlib
+import io
 import re
-from typing import List, Dict, Any, Optional, Set, Tuple
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Set, Tuple, Union
 
 from pypdf import PdfReader
 from pypdf.generic import (
@@ -9,6 +13,8 @@ from pypdf.generic import (
     NameObject, DecodedStreamObject, StreamObject,
 )
 
+from .doc_session import DocSession, borrow
+
 HEX_RE = re.compile(r"^[0-9A-Fa-f\s><]+$")
 
 def _name_of(v) -> Optional[str]:
@@ -118,153 +124,263 @@ def _dn_string(name_obj) -> Optional[str]:
     except Exception:
         return None
 
-def _parse_pkcs7_info(pkcs7_bytes: bytes) -> Dict[str, Optional[str]]:
-    info = {
+# --- CMS: solo los campos que se muestran, memoizado por digest del blob ---
+# El mismo /Contents llega por AcroForm, DocMDP, el barrido de xref y las
+# herramientas; se parsea una vez. Se evita .native sobre árboles enteros:
+# solo se bajan los caminos ASN.1 que se usan (asn1crypto parsea perezoso).
+_PKCS7_MEMO: "OrderedDict[bytes, Dict[str, Optional[str]]]" = OrderedDict()
+_PKCS7_MEMO_MAX = 512
+_ESS_OIDS = ("1.2.840.113549.1.9.16.2.12", "1.2.840.113549.1.9.16.2.47")
+
+def _serial_hex(v: Any) -> Optional[str]:
+    return format(v, "X") if isinstance(v, int) else (str(v) if v is not None else None)
+
+def _ess_issuer_serial(attr_value: Any) -> Tuple[Optional[str], Optional[str]]:
+    """(issuer DN, serial) del primer ESSCertID/ESSCertIDv2 de signing_certificate(_v2)."""
+    dn = serial_hex = None
+    try:
+        iss = attr_value["certs"][0]["issuer_serial"]
+        if iss.native is None:
+            return None, None
+    except Exception:
+        return None, None
+    try:
+        gn = iss["issuer"][0]
+        if gn.name == "directory_name":
+            dn = _dn_string(gn.chosen)
+    except Exception:
+        pass
+    try:
+        serial_hex = _serial_hex(iss["serial_number"].native)
+    except Exception:
+        pass
+    return dn, serial_hex
+
+def _pkcs7_info_uncached(pkcs7_bytes: bytes) -> Dict[str, Optional[str]]:
+    info: Dict[str, Optional[str]] = {
         "signer_cn": None,
         "issuer_cn": None,
         "signing_time": None,
         "sid_issuer_dn": None,
         "sid_serial_hex": None,
     }
-    if not pkcs7_bytes:
-        return info
-    pkcs7_bytes = pkcs7_bytes.strip(b"\x00")
     try:
         from asn1crypto import cms, x509
         content = cms.ContentInfo.load(pkcs7_bytes)
         if content["content_type"].native != "signed_data":
             return info
         sd = content["content"]
-
-        certs = []
-        if sd["certificates"] is not None:
-            for c in sd["certificates"]:
-                if isinstance(c.chosen, x509.Certificate):
-                    certs.append(c.chosen)
+        certs = sd["certificates"]
 
         for si in sd["signer_infos"]:
-            # signing_time
             try:
                 for attr in si["signed_attrs"]:
-                    # por nombre
-                    if attr["type"].native == "signing_time":
-                        t = attr["values"][0].native
-                        if isinstance(t, _dt.datetime):
-                            info["signing_time"] = t.isoformat()
-                        else:
-                            info["signing_time"] = str(t)
-                    # intento de ESSCertID/ESSCertIDv2
-                    if attr["type"].native in ("signing_certificate", "signing_certificate_v2") or \
-                       getattr(attr["type"], "dotted", "") in ("1.2.840.113549.1.9.16.2.12", "1.2.840.113549.1.9.16.2.47"):
-                        try:
-                            data = attr["values"][0]
-                            dn = None; serial_hex = None
-                            try:
-                                nat = data.native
-                                # v1
-                                if "certs" in nat and nat["certs"]:
-                                    c0 = nat["certs"][0]
-                                    iss = c0.get("issuer_serial", {}).get("issuer")
-                                    serial = c0.get("issuer_serial", {}).get("serial_number")
-                                    if iss:
-                                        dn = ", ".join(["{}={}".format(k, v) for k, v in iss[0].items()])
-                                    if serial is not None:
-                                        serial_hex = format(int(serial), "X") if isinstance(serial, int) else str(serial)
-                            except Exception:
-                                pass
-                            if dn and not info["sid_issuer_dn"]:
-                                info["sid_issuer_dn"] = dn
-                            if serial_hex and not info["sid_serial_hex"]:
-                                info["sid_serial_hex"] = serial_hex
-                        except Exception:
-                            pass
+                    t = attr["type"]
+                    if t.native == "signing_time":
+                        v = attr["values"][0].native
+                        info["signing_time"] = v.isoformat() if isinstance(v, _dt.datetime) else str(v)
+                    elif t.native in ("signing_certificate", "signing_certificate_v2") or t.dotted in _ESS_OIDS:
+                        dn, serial_hex = _ess_issuer_serial(attr["values"][0])
+                        info["sid_issuer_dn"] = info["sid_issuer_dn"] or dn
+                        info["sid_serial_hex"] = info["sid_serial_hex"] or serial_hex
             except Exception:
                 pass
 
             signer_cert = None
             sid = si["sid"]
-
             if sid.name == "issuer_and_serial_number":
                 iasn = sid.chosen
                 try:
                     info["sid_issuer_dn"] = info["sid_issuer_dn"] or _dn_string(iasn["issuer"])
-                    cn_from_sid = _cn_from_asn1_name(iasn["issuer"])
-                    if cn_from_sid and not info["issuer_cn"]:
-                        info["issuer_cn"] = cn_from_sid
+                    info["issuer_cn"] = info["issuer_cn"] or _cn_from_asn1_name(iasn["issuer"])
                 except Exception:
                     pass
+                serial = None
                 try:
                     serial = iasn["serial_number"].native
-                    info["sid_serial_hex"] = info["sid_serial_hex"] or (format(serial, "X") if isinstance(serial, int) else str(serial))
+                    info["sid_serial_hex"] = info["sid_serial_hex"] or _serial_hex(serial)
                 except Exception:
                     pass
-                for c in certs:
+                # serial primero (entero barato); el Name se compara solo si coincide
+                for c in (certs or []):
                     try:
-                        if (c.issuer == iasn["issuer"].chosen
-                            and c.serial_number == iasn["serial_number"].native):
+                        c = c.chosen
+                        if isinstance(c, x509.Certificate) and c.serial_number == serial and c.issuer == iasn["issuer"]:
                             signer_cert = c
                             break
                     except Exception:
                         continue
-
             elif sid.name == "subject_key_identifier":
                 skid = sid.native
-                for c in certs:
-                    if c.key_identifier == skid:
-                        signer_cert = c
-                        break
+                for c in (certs or []):
+                    try:
+                        c = c.chosen
+                        if isinstance(c, x509.Certificate) and c.key_identifier == skid:
+                            signer_cert = c
+                            break
+                    except Exception:
+                        continue
 
-            if signer_cert:
+            if signer_cert is not None:
                 try:
-                    subj_cn = _cn_from_asn1_name(signer_cert.subject)
-                    issuer_cn = _cn_from_asn1_name(signer_cert.issuer)
-                    if subj_cn:
-                        info["signer_cn"] = subj_cn
-                    if issuer_cn and not info["issuer_cn"]:
-                        info["issuer_cn"] = issuer_cn
+                    info["signer_cn"] = _cn_from_asn1_name(signer_cert.subject) or info["signer_cn"]
+                    info["issuer_cn"] = info["issuer_cn"] or _cn_from_asn1_name(signer_cert.issuer)
                 except Exception:
                     pass
 
             if info["issuer_cn"] or info["sid_issuer_dn"] or info["signer_cn"]:
                 break
-
     except Exception:
         pass
     return info
 
-def _append_unique(out: List[Dict[str, Any]], rec: Dict[str, Any]) -> None:
-    for r in out:
-        if r.get("xref") == rec.get("xref") and r.get("subfilter") == rec.get("subfilter"):
-            return
+def parse_pkcs7_info(pkcs7_bytes: Optional[bytes]) -> Dict[str, Optional[str]]:
+    """signer_cn, issuer_cn, signing_time, sid_issuer_dn, sid_serial_hex del CMS (copia del memo)."""
+    if not pkcs7_bytes:
+        return _pkcs7_info_uncached(b"")
+    blob = bytes(pkcs7_bytes).strip(b"\x00")
+    key = hashlib.sha1(blob).digest()
+    info = _PKCS7_MEMO.get(key)
+    if info is None:
+        info = _PKCS7_MEMO[key] = _pkcs7_info_uncached(blob)
+        if len(_PKCS7_MEMO) > _PKCS7_MEMO_MAX:
+            _PKCS7_MEMO.popitem(last=False)
+    else:
+        _PKCS7_MEMO.move_to_end(key)
+    return dict(info)
+
+def _append_unique(out: List[Dict[str, Any]], rec: Dict[str, Any], keys: Set[Tuple[Any, Any]]) -> None:
+    k = (rec.get("xref"), rec.get("subfilter"))
+    if k in keys:
+        return
+    keys.add(k)
     out.append(rec)
 
+def _obj_number(o) -> Optional[int]:
+    ref = getattr(o, "indirect_reference", None)
+    return getattr(ref, "idnum", None) if ref is not None else getattr(o, "idnum", None)
+
+def _is_sig_dict(x) -> bool:
+    if not isinstance(x, DictionaryObject) or isinstance(x, StreamObject):
+        return False
+    keys = set(map(str, x.keys()))
+    return ("/Type" in keys and _name_of(x.get("/Type")) == "/Sig") \
+           or ("/ByteRange" in keys and "/Contents" in keys)
+
+# --- Pasada indexada por la tabla xref ---
+# En lugar de recorrer todo el grafo (páginas, fuentes, imágenes...) se buscan
+# las marcas de firma en los bytes crudos y se resuelven solo los objetos que
+# las contienen: objetos sueltos por offset (bisect) y objetos comprimidos solo
+# si su /ObjStm descomprimido trae alguna marca. Los streams nunca se parsean.
+_SIG_MARK_RE = re.compile(rb"/ByteRange|/Type\s*/Sig\b")
+
+def _xref_sig_candidates(reader: PdfReader, data: bytes) -> List[DictionaryObject]:
+    found: List[DictionaryObject] = []
+
+    def _take(idnum: int) -> None:
+        try:
+            o = reader.get_object(idnum)
+        except Exception:
+            return
+        if _is_sig_dict(o):
+            found.append(o)
+
+    entries = sorted((off, idnum) for table in reader.xref.values() for idnum, off in table.items()
+                     if isinstance(off, int) and off >= 0)
+    starts = [off for off, _ in entries]
+    hit: Set[int] = set()
+    for m in _SIG_MARK_RE.finditer(data):
+        i = bisect_right(starts, m.start()) - 1
+        if i < 0 or i in hit:
+            continue
+        off = starts[i]
+        # la marca debe caer en el diccionario del objeto, no en datos de stream ni fuera de él
+        if data.find(b"stream", off, m.start()) >= 0 or data.find(b"endobj", off, m.start()) >= 0:
+            continue
+        hit.add(i)
+    for i in sorted(hit):
+        _take(entries[i][1])
+
+    by_stream: Dict[int, List[int]] = {}
+    for idnum, loc in (getattr(reader, "xref_objStm", None) or {}).items():
+        try:
+            by_stream.setdefault(int(loc[0]), []).append(int(idnum))
+        except Exception:
+            continue
+    for stm, members in sorted(by_stream.items()):
+        try:
+            raw = reader.get_object(stm).get_data()
+        except Exception:
+            continue
+        if _SIG_MARK_RE.search(raw):
+            for idnum in sorted(members):
+                _take(idnum)
+    return found
+
 # --- Appearance text via PyMuPDF (best-effort) ---
-def _appearance_texts(pdf_path: str) -> List[str]:
+# Las palabras de la página se extraen una vez (get_text("words")) y todos los
+# rectángulos de widgets se resuelven juntos con una intersección de cajas
+# vectorizada (NumPy si está; si no, el mismo criterio en Python). Formularios
+# con cientos de widgets ya no cuestan widgets × extracción de texto.
+_WIDGET_PAD = 6  # un pequeño padding para captar textos cercanos
+_MIN_OVERLAP = 0.5  # fracción del área de la palabra que debe caer en el rect
+
+def _words_text(words: List[Tuple[Any, ...]], idx: Iterable[int]) -> str:
+    """Palabras seleccionadas (en orden de lectura) → líneas separadas por \\n."""
+    lines: List[str] = []
+    cur: List[str] = []
+    key = None
+    for i in idx:
+        w = words[i]
+        k = (w[5], w[6])
+        if cur and k != key:
+            lines.append(" ".join(cur)); cur = []
+        cur.append(w[4]); key = k
+    if cur:
+        lines.append(" ".join(cur))
+    return "\n".join(lines).strip()
+
+def _texts_in_rects(words: List[Tuple[Any, ...]], rects: List[Tuple[float, float, float, float]]) -> List[str]:
+    if not words or not rects:
+        return ["" for _ in rects]
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is None:
+        out = []
+        for rx0, ry0, rx1, ry1 in rects:
+            sel = []
+            for i, w in enumerate(words):
+                ow = min(w[2], rx1) - max(w[0], rx0); oh = min(w[3], ry1) - max(w[1], ry0)
+                area = max((w[2] - w[0]) * (w[3] - w[1]), 1e-9)
+                if ow > 0 and oh > 0 and ow * oh >= _MIN_OVERLAP * area:
+                    sel.append(i)
+            out.append(_words_text(words, sel))
+        return out
+    W = np.array([w[:4] for w in words], dtype=float)          # (N, 4)
+    R = np.array(rects, dtype=float)[:, None, :]                # (M, 1, 4)
+    ow = np.minimum(W[:, 2], R[..., 2]) - np.maximum(W[:, 0], R[..., 0])
+    oh = np.minimum(W[:, 3], R[..., 3]) - np.maximum(W[:, 1], R[..., 1])
+    area = np.maximum((W[:, 2] - W[:, 0]) * (W[:, 3] - W[:, 1]), 1e-9)
+    hit = (ow > 0) & (oh > 0) & (ow * oh >= _MIN_OVERLAP * area)  # (M, N)
+    return [_words_text(words, np.flatnonzero(row).tolist()) for row in hit]
+
+def _appearance_texts(src: Union[str, DocSession]) -> List[str]:
     texts: List[str] = []
     try:
-        import fitz
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                try:
-                    widgets = page.widgets()
-                except Exception:
-                    widgets = None
+        with borrow(src) as sess:
+            for pno in range(sess.page_count):
+                widgets = sess.widgets(pno)
                 if not widgets:
                     continue
+                rects = []
                 for w in widgets:
-                    try:
-                        rect = getattr(w, "rect", None)
-                        if rect is None:
-                            continue
-                        # un peque?o padding para captar textos cercanos
-                        pad = 6
-                        R = fitz.Rect(rect.x0 - pad, rect.y0 - pad, rect.x1 + pad, rect.y1 + pad)
-                        t = page.get_textbox(R) or ""
-                        t = t.strip()
-                        if t:
-                            texts.append(t)
-                    except Exception:
-                        continue
+                    rect = getattr(w, "rect", None)
+                    if rect is not None:
+                        rects.append((rect.x0 - _WIDGET_PAD, rect.y0 - _WIDGET_PAD,
+                                      rect.x1 + _WIDGET_PAD, rect.y1 + _WIDGET_PAD))
+                texts.extend(t for t in _texts_in_rects(sess.page_words(pno), rects) if t)
     except Exception:
         pass
     return texts
@@ -284,12 +400,11 @@ def _guess_name_from_text(s: str) -> Optional[str]:
             return g.strip()
     return None
 
-def _fulltext_name_guess(pdf_path: str) -> Optional[str]:
+def _fulltext_name_guess(src: Union[str, DocSession]) -> Optional[str]:
     try:
-        import fitz
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                t = (page.get_text("text") or "").strip()
+        with borrow(src) as sess:
+            for pno in range(sess.page_count):
+                t = sess.page_text(pno).strip()
                 if not t:
                     continue
                 g = _guess_name_from_text(t)
@@ -299,16 +414,244 @@ def _fulltext_name_guess(pdf_path: str) -> Optional[str]:
         pass
     return None
 
-def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
+# --- Localizador rápido por bytes (modo "fast") ---
+# Para triage: sin PdfReader ni objetos. Se mapea el archivo (mmap, memoria
+# plana) y se buscan los /ByteRange [a b c d]; por especificación el hueco
+# [a+b, c) es exactamente el /Contents <hex> de esa firma, así que no hace falta
+# ubicar el diccionario. Cada actualización incremental agrega sus propias
+# firmas; un mismo /ByteRange reescrito en otra revisión se cuenta una vez.
+_BYTERANGE_RE = re.compile(rb"/ByteRange\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\]")
+_FAST_KEYS_RE = {
+    "subfilter": re.compile(rb"/SubFilter\s*/([^\s/<>\[\]()]+)"),
+    "mdate": re.compile(rb"/M\s*\((D:[^)]*)\)"),
+    "reason": re.compile(rb"/Reason\s*\(((?:[^()\\]|\\.)*)\)"),
+    "location": re.compile(rb"/Location\s*\(((?:[^()\\]|\\.)*)\)"),
+    "name_hint": re.compile(rb"/Name\s*\(((?:[^()\\]|\\.)*)\)"),
+}
+_FAST_WINDOW = 4096
+
+def _fast_decode_hex(gap: bytes) -> Optional[bytes]:
+    g = gap.strip()
+    if not (g.startswith(b"<") and g.endswith(b">")):
+        return None
+    try:
+        h = g[1:-1].translate(None, b" \t\r\n\x0c")
+        if len(h) % 2:
+            h += b"0"
+        return bytes.fromhex(h.decode("ascii"))
+    except Exception:
+        return None
+
+def _fast_literal(v: bytes) -> str:
+    v = re.sub(rb"\\([()\\])", rb"\1", v)
+    if v.startswith(b"\xfe\xff"):
+        return v[2:].decode("utf-16-be", errors="ignore")
+    return v.decode("latin-1", errors="ignore")
+
+def _fast_dict_fields(mm: Any, start: int, end: int) -> Dict[str, Optional[str]]:
+    """Campos del diccionario alrededor del /Contents: ventana antes de a+b y después de c."""
+    pre = mm[max(0, start - _FAST_WINDOW):start]
+    k = pre.rfind(b" obj")
+    pre = pre[k:] if k >= 0 else pre
+    post = mm[end:end + _FAST_WINDOW]
+    k = post.find(b"endobj")
+    post = post[:k] if k >= 0 else post
+    out: Dict[str, Optional[str]] = {}
+    for key, rx in _FAST_KEYS_RE.items():
+        m = rx.search(pre) or rx.search(post)
+        if not m:
+            out[key] = None
+        elif key == "subfilter":
+            out[key] = "/" + m.group(1).decode("latin-1")
+        else:
+            out[key] = _fast_literal(m.group(1))
+    return out
+
+# --- Digest de /ByteRange en una sola pasada (mmap) ---
+# Todas las firmas de un PDF cubren tramos que arrancan en 0 y se solapan casi
+# por completo: se recorre el archivo mapeado una vez, en orden, y cada trozo
+# (memoryview, sin copia) alimenta a todos los hashers que lo cubren.
+_DIGEST_CHUNK = 8 << 20
+
+def _new_hash(alg: str) -> Optional[Any]:
+    try:
+        return hashlib.new(alg.lower().replace("-", "_"))
+    except (ValueError, TypeError):
+        return None
+
+def _spans(byte_range: Sequence[int]) -> List[Tuple[int, int]]:
+    br = [int(x) for x in byte_range]
+    return [(br[i], br[i] + br[i + 1]) for i in range(0, len(br) - 1, 2)]
+
+def _sweep_digests(mm: Any, byte_ranges: Sequence[Sequence[int]], algorithms: Iterable[str]) -> List[Dict[str, Any]]:
+    size = len(mm)
+    algorithms = list(dict.fromkeys(algorithms))
+    jobs = []
+    for br in byte_ranges:
+        try:
+            sp = _spans(br)
+        except (TypeError, ValueError):
+            sp = []
+        ordered = bool(sp) and all(0 <= lo <= hi <= size for lo, hi in sp) and \
+            all(sp[i][1] <= sp[i + 1][0] for i in range(len(sp) - 1))
+        hs = {a: h for a in algorithms for h in [_new_hash(a)] if h is not None} if ordered else {}
+        jobs.append((sp, hs))
+    cuts = sorted({x for sp, hs in jobs if hs for lo_hi in sp for x in lo_hi})
+    with memoryview(mm) as view:
+        for lo, hi in zip(cuts, cuts[1:]):
+            active = [h for sp, hs in jobs if hs and any(a <= lo and hi <= b for a, b in sp) for h in hs.values()]
+            for off in range(lo, hi, _DIGEST_CHUNK):
+                chunk = view[off:min(hi, off + _DIGEST_CHUNK)]
+                for h in active:
+                    h.update(chunk)
+                chunk.release()
+    out: List[Dict[str, Any]] = []
+    for sp, hs in jobs:
+        d: Dict[str, Any] = {a: h.digest() for a, h in hs.items()}
+        if hs:
+            d["total_len"] = sum(hi - lo for lo, hi in sp)
+        out.append(d)
+    return out
+
+def byterange_digests(src: Union[str, DocSession], byte_ranges: Sequence[Sequence[int]],
+                      algorithms: Iterable[str] = ("sha256",)) -> List[Dict[str, Any]]:
+    """
+    Un dict {algoritmo: digest, "total_len": n} por /ByteRange, todos en un
+    recorrido secuencial del archivo. Rangos inválidos (fuera del archivo,
+    desordenados) o algoritmos desconocidos quedan sin digest. Con una
+    DocSession se reusa su mmap en lugar de mapear el archivo otra vez.
+    """
+    import mmap
+    if isinstance(src, DocSession):
+        try:
+            return _sweep_digests(src.buffer, byte_ranges, algorithms)
+        except (OSError, ValueError):
+            return [{} for _ in byte_ranges]
+    pdf_path = src
+    try:
+        with open(pdf_path, "rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _sweep_digests(mm, byte_ranges, algorithms)
+    except (OSError, ValueError):
+        return [{} for _ in byte_ranges]
+
+def cms_expected_digest(pkcs7_bytes: Optional[bytes]) -> Optional[Tuple[str, bytes]]:
+    """
+    (algoritmo, digest esperado del /ByteRange) según el CMS: el messageDigest
+    firmado o, en un sello de tiempo de documento, el messageImprint del TSTInfo.
+    """
+    if not pkcs7_bytes:
+        return None
+    try:
+        from asn1crypto import cms
+        sd = cms.ContentInfo.load(pkcs7_bytes.strip(b"\x00"))["content"]
+        eci = sd["encap_content_info"]
+        if eci["content_type"].native == "tst_info":
+            mi = eci["content"].parsed["message_imprint"]
+            return mi["hash_algorithm"]["algorithm"].native, mi["hashed_message"].native
+        si = sd["signer_infos"][0]
+        for attr in si["signed_attrs"]:
+            if attr["type"].native == "message_digest":
+                return si["digest_algorithm"]["algorithm"].native, attr["values"][0].native
+    except Exception:
+        pass
+    return None
+
+def extract_signatures_fast(pdf_path: str, parse_cms: bool = True, keep_der: bool = False,
+                            integrity: bool = False) -> List[Dict[str, Any]]:
+    """
+    Enumeración rápida (sin parsear el PDF): un registro por /ByteRange con el
+    mismo esquema que extract_signatures más byte_range / covers_eof. Sin
+    apariencias ni adivinanzas por texto; `parse_cms=False` omite el CMS,
+    `keep_der=True` agrega el /Contents decodificado en "pkcs7" e
+    `integrity=True` agrega digest_algorithm / integrity_ok (una pasada de hash).
+    """
+    import mmap
+    out: List[Dict[str, Any]] = []
+    try:
+        fh = open(pdf_path, "rb")
+    except OSError:
+        return out
+    with fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # archivo vacío
+            return out
+        with mm:
+            size = len(mm)
+            seen: Set[Tuple[int, int, int, int]] = set()
+            for m in _BYTERANGE_RE.finditer(mm):
+                a, b, c, d = (int(x) for x in m.groups())
+                if (a, b, c, d) in seen or not (a <= a + b < c <= c + d <= size):
+                    continue
+                seen.add((a, b, c, d))
+                raw = _fast_decode_hex(mm[a + b:c])
+                f = _fast_dict_fields(mm, a + b, c)
+                info = parse_pkcs7_info(raw) if (parse_cms and raw) else {}
+                mdate_iso = _pdf_date_to_iso(f["mdate"]) if f["mdate"] else None
+                signer_cn, issuer_cn = info.get("signer_cn"), info.get("issuer_cn")
+                sid_issuer_dn, sid_serial_hex = info.get("sid_issuer_dn"), info.get("sid_serial_hex")
+                display = signer_cn or f["name_hint"] or issuer_cn
+                if not display and (sid_serial_hex or sid_issuer_dn):
+                    display = "{}@{}".format(sid_serial_hex or "serial", issuer_cn or sid_issuer_dn or "issuer")
+                subfilter = f["subfilter"]
+                rec = {
+                    "xref": None,
+                    "status": "timestamp" if (subfilter and "timestamp" in subfilter.lower()) else "signed",
+                    "subfilter": subfilter,
+                    "reason": f["reason"],
+                    "location": f["location"],
+                    "signing_time": info.get("signing_time") or mdate_iso or f["mdate"],
+                    "signing_time_iso": info.get("signing_time") or mdate_iso,
+                    "signer_cn": signer_cn,
+                    "issuer_cn": issuer_cn,
+                    "sid_issuer_dn": sid_issuer_dn,
+                    "sid_serial_hex": sid_serial_hex,
+                    "name_hint": f["name_hint"],
+                    "contact_info": None,
+                    "appearance_text": None,
+                    "signer_guess": None,
+                    "signer_display": display,
+                    "byte_range": [a, b, c, d],
+                    "contents_len": len(raw) if raw else 0,
+                    "covers_eof": c + d == size,
+                }
+                if keep_der:
+                    rec["pkcs7"] = raw
+                if integrity:
+                    rec["_expected"] = cms_expected_digest(raw)
+                out.append(rec)
+            if integrity:
+                algs = [r["_expected"][0] for r in out if r["_expected"]]
+                digests = _sweep_digests(mm, [r["byte_range"] for r in out], algs)
+                for r, d in zip(out, digests):
+                    exp = r.pop("_expected")
+                    r["digest_algorithm"] = exp[0] if exp else None
+                    r["integrity_ok"] = (d.get(exp[0]) == exp[1]) if (exp and exp[0] in d) else None
+    return out
+
+def extract_signatures(pdf_path: str, deep: bool = False, session: Optional[DocSession] = None) -> List[Dict[str, Any]]:
+    """
+    Firmas por AcroForm, DocMDP y una pasada indexada por xref. `deep=True`
+    agrega el recorrido recursivo del grafo como último recurso (solo si lo
+    anterior no encontró nada; útil con xref muy dañadas). Con `session` se
+    reusan su mmap, documento PyMuPDF, widgets y texto por página.
+    """
+    with borrow(session or pdf_path) as sess:
+        return _extract_signatures(sess, deep)
+
+def _extract_signatures(sess: DocSession, deep: bool) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
     try:
-        reader = PdfReader(pdf_path)
+        data = sess.buffer  # mmap: pypdf lee por seek/read, el barrido de xref busca sin copiar
+        reader = PdfReader(io.BytesIO(data) if isinstance(data, bytes) else data)
     except Exception:
         return out
 
     seen: Set[Tuple[int, int]] = set()
-    ap_texts = _appearance_texts(pdf_path)  # may be empty
-    global_guess = _fulltext_name_guess(pdf_path)  # puede ser None
+    keys: Set[Tuple[Any, Any]] = set()
+    ap_texts = _appearance_texts(sess)  # may be empty
+    global_guess = _fulltext_name_guess(sess)  # puede ser None
 
     def _emit_from_dict(sobj: DictionaryObject, status_hint: str):
         subfilter = _name_of(sobj.get("/SubFilter"))
@@ -326,7 +669,7 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
         raw = _get_bytes(pkcs7)
         info = None
         if raw:
-            info = _parse_pkcs7_info(raw)
+            info = parse_pkcs7_info(raw)
             signer_cn = info.get("signer_cn")
             issuer_cn = info.get("issuer_cn")
             signing_time = info.get("signing_time") or mdate_iso or mdate_raw
@@ -344,7 +687,7 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
             signer_display = "{}@{}".format(sid_serial_hex or "serial", issuer_cn or sid_issuer_dn or "issuer")
 
         rec = {
-            "xref": getattr(sobj, "idnum", None),
+            "xref": _obj_number(sobj),
             "status": "timestamp" if (subfilter and isinstance(subfilter, str) and "timestamp" in subfilter.lower()) else status_hint,
             "subfilter": subfilter,
             "reason": reason,
@@ -361,7 +704,7 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
             "signer_guess": signer_guess,
             "signer_display": signer_display,
         }
-        _append_unique(out, rec)
+        _append_unique(out, rec, keys)
 
     # 1) AcroForm
     try:
@@ -395,7 +738,17 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
     except Exception:
         pass
 
-    # 3) Deep scan
+    # 3) Pasada indexada por xref
+    try:
+        for o in _xref_sig_candidates(reader, data):
+            try:
+                _emit_from_dict(o, "signed")
+            except Exception:
+                continue
+    except Exception:
+        pass
+
+    # 3b) Deep scan (opcional, último recurso)
     def _walk(obj, reader: PdfReader, seen: Set[Tuple[int, int]]) -> List[DictionaryObject]:
         found: List[DictionaryObject] = []
         def _recurse(x):
@@ -409,10 +762,7 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
                 except Exception:
                     return
             if isinstance(x, DictionaryObject):
-                keys = set(map(str, x.keys()))
-                is_sig = ("/Type" in keys and _name_of(x.get("/Type")) == "/Sig") \
-                         or ("/ByteRange" in keys and "/Contents" in keys)
-                if is_sig:
+                if _is_sig_dict(x):
                     found.append(x)
                 for _, v in x.items():
                     _recurse(v)
@@ -425,15 +775,16 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
             pass
         return found
 
-    try:
-        candidates = _walk(reader, reader, seen)
-        for o in candidates:
-            try:
-                _emit_from_dict(o, "signed")
-            except Exception:
-                continue
-    except Exception:
-        pass
+    if deep and not out:
+        try:
+            candidates = _walk(reader, reader, seen)
+            for o in candidates:
+                try:
+                    _emit_from_dict(o, "signed")
+                except Exception:
+                    continue
+        except Exception:
+            pass
 
     # 4) DSS flag
     try:
@@ -456,7 +807,7 @@ def extract_signatures(pdf_path: str) -> List[Dict[str, Any]]:
                 "appearance_text": None,
                 "signer_guess": None,
                 "signer_display": None,
-            })
+            }, keys)
     except Exception:
         pass
 
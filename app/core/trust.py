@@ -1,22 +1,321 @@
-import os
-from typing import List
-from asn1crypto import x509
+from __future__ import annotations
+import hashlib, json, os, pickle, re, threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-def load_trust_roots(trust_dir: str) -> List[x509.Certificate]:
-    roots = []
-    if not trust_dir or not os.path.isdir(trust_dir):
-        return roots
-    for fn in os.listdir(trust_dir):
-        if not fn.lower().endswith((".pem",".crt",".cer")):
-            continue
+from asn1crypto import pem, x509
+
+from .result_cache import DEFAULT_DIR as CACHE_DIR, dir_fingerprint
+
+# Almacén de confianza compilado:
+#   carpeta trust (PEM/DER, uno o varios certs por archivo)
+#     → bundle = DER de cada cert + índices por subject y SKI
+# El bundle se guarda en la caché (trust_bundle_<ruta>.pickle) y se invalida con
+# dir_fingerprint (nombres, tamaños, mtime_ns): mientras la carpeta no cambie no
+# se vuelve a leer ni desarmar ningún archivo. Además hay un ValidationContext
+# compartido por proceso, construido una sola vez por (carpeta, huella).
+
+BUNDLE_VERSION = 1
+INDEX_NAME = "index.json"
+INDEX_VERSION = 2  # 2: todas las posiciones de cada archivo ({file, pos})
+
+@dataclass
+class TrustBundle:
+    trust_dir: str
+    fp: str
+    ders: List[bytes] = field(default_factory=list)
+    by_subject: Dict[str, List[int]] = field(default_factory=dict)   # sha1(subject.dump()) → índices
+    by_ski: Dict[str, List[int]] = field(default_factory=dict)       # key_identifier hex → índices
+    errors: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ders)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # los certs ya parseados no viajan al pickle (caché en disco, initargs de workers)
+        st = dict(self.__dict__); st.pop("_parsed", None)
+        return st
+
+    def certs(self) -> List[x509.Certificate]:
+        """Raíces parseadas una vez por proceso (los VC por documento las reusan)."""
+        parsed = getattr(self, "_parsed", None)
+        if parsed is None:
+            parsed = self._parsed = [x509.Certificate.load(d) for d in self.ders]
+        return list(parsed)
+
+    def find_by_subject(self, name: x509.Name) -> List[x509.Certificate]:
+        return [x509.Certificate.load(self.ders[i]) for i in self.by_subject.get(_name_key(name), [])]
+
+    def find_by_ski(self, ski: bytes) -> List[x509.Certificate]:
+        return [x509.Certificate.load(self.ders[i]) for i in self.by_ski.get(ski.hex(), [])]
+
+def _name_key(name: x509.Name) -> str:
+    return hashlib.sha1(name.dump()).hexdigest()
+
+def _read_ders(path: str) -> List[bytes]:
+    with open(path, "rb") as fh:
+        return _read_ders_bytes(fh.read())
+
+def _read_ders_bytes(data: bytes) -> List[bytes]:
+    if pem.detect(data):
+        return [der for _t, _h, der in pem.unarmor(data, multiple=True) if _t == "CERTIFICATE"]
+    return [data]
+
+def compile_bundle(trust_dir: str, fp: Optional[str] = None) -> TrustBundle:
+    """Lee la carpeta una vez y arma el bundle (sin caché)."""
+    b = TrustBundle(trust_dir=os.path.abspath(trust_dir), fp=fp if fp is not None else dir_fingerprint(trust_dir))
+    seen = set()
+    for fn in sorted(os.listdir(trust_dir)):
         p = os.path.join(trust_dir, fn)
+        if not os.path.isfile(p) or fn.startswith(".") or fn == INDEX_NAME:
+            continue
+        try:
+            for der in _read_ders(p):
+                cert = x509.Certificate.load(der)
+                subject = cert.subject  # fuerza el parseo: un archivo inválido falla acá
+                digest = hashlib.sha256(der).digest()
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                i = len(b.ders)
+                b.ders.append(der)
+                b.by_subject.setdefault(_name_key(subject), []).append(i)
+                ski = cert.key_identifier
+                if ski:
+                    b.by_ski.setdefault(ski.hex(), []).append(i)
+        except Exception as e:
+            b.errors.append(f"{fn}: {e}")
+    return b
+
+def _bundle_path(trust_dir: str, cache_dir: str) -> str:
+    tag = hashlib.sha1(os.path.normcase(os.path.abspath(trust_dir)).encode("utf-8", "surrogateescape")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"trust_bundle_{tag}.pickle")
+
+def _read_bundle(path: str, fp: str) -> Optional[TrustBundle]:
+    try:
+        with open(path, "rb") as fh:
+            ver, b = pickle.load(fh)
+    except Exception:
+        return None
+    return b if ver == BUNDLE_VERSION and isinstance(b, TrustBundle) and b.fp == fp else None
+
+def _write_bundle(path: str, b: TrustBundle) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as fh:
+            pickle.dump((BUNDLE_VERSION, b), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        try: os.unlink(tmp)
+        except OSError: pass
+
+_BUNDLES: Dict[Tuple[str, str], TrustBundle] = {}
+_VCS: Dict[Tuple[str, str, bool], Any] = {}
+_lock = threading.Lock()
+
+def load_trust_bundle(trust_dir: Optional[str], cache_dir: Optional[str] = CACHE_DIR) -> Optional[TrustBundle]:
+    """Bundle de la carpeta: memoria del proceso → pickle en caché → compilar. None si no hay carpeta."""
+    if not trust_dir or not os.path.isdir(trust_dir):
+        return None
+    fp = dir_fingerprint(trust_dir)
+    key = (os.path.abspath(trust_dir), fp)
+    with _lock:
+        b = _BUNDLES.get(key)
+        if b is not None:
+            return b
+        path = _bundle_path(trust_dir, cache_dir) if cache_dir else None
+        b = _read_bundle(path, fp) if path else None
+        if b is None:
+            b = compile_bundle(trust_dir, fp)
+            for err in b.errors:
+                print(f"ADVERTENCIA: no se pudo cargar cert {err}")
+            if path:
+                _write_bundle(path, b)
+        _BUNDLES[key] = b
+        return b
+
+def load_trust_roots(trust_dir: str) -> List[x509.Certificate]:
+    b = load_trust_bundle(trust_dir)
+    return b.certs() if b is not None else []
+
+def validation_context_from_bundle(b: Optional[TrustBundle], extra_certs: Iterable[x509.Certificate] = (),
+                                   **kwargs: Any) -> Optional[Any]:
+    """ValidationContext con las raíces del bundle (mismos parámetros que usaba el escáner)."""
+    if b is None or not b.ders:
+        return None
+    from pyhanko_certvalidator import ValidationContext
+    roots = b.certs()
+    opts = dict(allow_fetching=True, revocation_mode="soft-fail")
+    opts.update(kwargs)
+    return ValidationContext(trust_roots=roots, other_certs=roots + list(extra_certs), **opts)
+
+def shared_validation_context(trust_dir: Optional[str] = None, bundle: Optional[TrustBundle] = None,
+                              cache_dir: Optional[str] = CACHE_DIR, revinfo: Optional[Any] = None,
+                              offline: bool = False) -> Optional[Any]:
+    """
+    Un único ValidationContext por proceso y por (carpeta, huella, modo, caché). Los
+    workers reciben el bundle ya compilado (bytes DER, barato de serializar) y
+    arman el suyo una vez en el initializer, sin tocar el disco.
+    `revinfo` (RevocationCache) pone la caché de CRL/OCSP delante de la red;
+    con `offline` no se hace ninguna consulta de red.
+    """
+    b = bundle if bundle is not None else load_trust_bundle(trust_dir, cache_dir)
+    if b is None:
+        return None
+    # la caché de revocación también distingue: un VC sin caché no sirve a quien la pasa (ni al revés)
+    key = (b.trust_dir, b.fp, bool(offline), id(revinfo) if revinfo is not None else None)
+    with _lock:
+        if key not in _VCS:
+            from .revinfo import validation_kwargs
+            _VCS[key] = validation_context_from_bundle(b, **validation_kwargs(revinfo, offline))
+        return _VCS[key]
+
+def document_validation_context(dss: Any, bundle: Optional[TrustBundle], revinfo: Optional[Any] = None,
+                                offline: bool = False) -> Optional[Any]:
+    """
+    VC propio de un documento con /DSS (DssMaterial): sus certificados se suman a
+    other_certs y, si trae CRL/OCSP (LTV), se valida solo con eso más lo que la
+    caché tenga para los emisores de esa cadena (crls_for / ocsp_for), sin red.
+    Lo del DSS queda además en la caché de revocación para otros PDFs.
+    None si el documento no trae DSS: se usa el VC compartido.
+    """
+    if not dss or bundle is None or not bundle.ders:
+        return None
+    from .revinfo import validation_kwargs
+    if revinfo is not None:
+        for c in dss.crls: revinfo.put_crl(c)
+        for r in dss.ocsps: revinfo.put_ocsp(r)
+    extra = []
+    for der in dss.certs:
+        try: extra.append(x509.Certificate.load(der))
+        except Exception: pass
+    if dss.has_revinfo or offline:
+        crls: List[Any] = list(dss.crls)
+        ocsps: List[Any] = list(dss.ocsps)
+        if revinfo is not None:
+            for c in extra:
+                try:
+                    crls.extend(revinfo.crls_for(c))
+                    r = revinfo.ocsp_for(c)
+                    if r is not None: ocsps.append(r)
+                except Exception:
+                    continue
+        kw = {"allow_fetching": False, "crls": crls, "ocsps": ocsps}
+    else:
+        kw = validation_kwargs(revinfo, offline)
+    return validation_context_from_bundle(bundle, extra, **kw)
+
+# ------------ Escritura: almacén indexado por huella ------------
+# index.json junto a los certificados: sha256 → {file, subject, ski, ca, cn}.
+# Insertar es una búsqueda en el índice (sin releer archivos) y el nombre de
+# archivo lleva la huella, así dos CN iguales no se pisan y un mismo cert no
+# se guarda dos veces aunque venga de corridas o herramientas distintas.
+
+class TrustStore:
+    def __init__(self, trust_dir: str):
+        self.trust_dir = trust_dir
+        os.makedirs(trust_dir, exist_ok=True)
+        self._path = os.path.join(trust_dir, INDEX_NAME)
+        self._dirty = False
+        self.index: Dict[str, Dict[str, Any]] = {}
         try:
-            data = open(p,"rb").read()
-            if b"-----BEGIN CERTIFICATE-----" in data:
-                cert = x509.Certificate.from_pem(data)
-            else:
-                cert = x509.Certificate.load(data)
-            roots.append(cert)
-        except Exception:
-            pass
-    return roots
+            with open(self._path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            if raw.get("version") != INDEX_VERSION:
+                raise ValueError("índice de otra versión")
+            self.index = raw.get("certs", {})
+        except (OSError, ValueError, AttributeError):
+            self.rebuild()
+        else:
+            # tolera borrados a mano: entradas sin archivo no cuentan
+            gone = [fp for fp, e in self.index.items() if not os.path.exists(os.path.join(trust_dir, e["file"]))]
+            for fp in gone:
+                del self.index[fp]
+            self._dirty = bool(gone)
+
+    @staticmethod
+    def _entry(cert: x509.Certificate, fn: str, pos: int = 0) -> Dict[str, Any]:
+        ski = cert.key_identifier
+        return {"file": fn, "pos": pos, "subject": _name_key(cert.subject), "ski": ski.hex() if ski else None,
+                "ca": bool(cert.ca), "cn": cert.subject.native.get("common_name")}
+
+    def rebuild(self) -> int:
+        """Reindexa los archivos existentes (PEM/DER); devuelve cuántos duplicados se encontraron."""
+        self.index, dups = {}, 0
+        for fn in sorted(os.listdir(self.trust_dir)):
+            p = os.path.join(self.trust_dir, fn)
+            if fn == INDEX_NAME or fn.startswith(".") or not os.path.isfile(p):
+                continue
+            try:
+                ders = _read_ders(p)
+            except OSError:
+                continue
+            for pos, der in enumerate(ders):  # PEM con varios certs: todos al índice
+                try:
+                    cert = x509.Certificate.load(der)
+                    fp = hashlib.sha256(der).hexdigest()
+                    if fp in self.index:
+                        dups += 1; continue
+                    self.index[fp] = self._entry(cert, fn, pos)
+                except Exception:
+                    continue
+        self._dirty = True
+        return dups
+
+    def __contains__(self, fp: str) -> bool:
+        return fp in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, cert: Any, hint: str = "") -> Tuple[str, bool]:
+        """Guarda el cert si su huella no está; devuelve (ruta, nuevo)."""
+        if not isinstance(cert, x509.Certificate):
+            cert = x509.Certificate.load(cert)
+        der = cert.dump()
+        fp = hashlib.sha256(der).hexdigest()
+        e = self.index.get(fp)
+        if e is not None:
+            return os.path.join(self.trust_dir, e["file"]), False
+        base = re.sub(r"[^A-Za-z0-9._-]+", "_", hint or cert.subject.human_friendly)[:150]
+        fn = f"{base}__{fp[:12]}.cer"
+        path = os.path.join(self.trust_dir, fn)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(der)
+        os.replace(tmp, path)
+        self.index[fp] = self._entry(cert, fn)
+        self._dirty = True
+        return path, True
+
+    def get(self, fp: str) -> Optional[x509.Certificate]:
+        e = self.index.get(fp)
+        if e is None:
+            return None
+        with open(os.path.join(self.trust_dir, e["file"]), "rb") as fh:
+            ders = _read_ders_bytes(fh.read())
+        pos = e.get("pos", 0)
+        return x509.Certificate.load(ders[pos]) if pos < len(ders) else None
+
+    def find_by_subject(self, name: x509.Name) -> List[x509.Certificate]:
+        key = _name_key(name)
+        return [c for c in (self.get(fp) for fp, e in self.index.items() if e.get("subject") == key) if c is not None]
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"version": INDEX_VERSION, "certs": self.index}, fh, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self._path)
+        self._dirty = False
+
+    def close(self) -> None:
+        self.save()
+
+    def __enter__(self) -> "TrustStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
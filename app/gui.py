@@ -2,18 +2,18 @@ import os, queue, webbrowser
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 from .cli import load_config
-from .core.ocr_engine import OcrConfig, configure_tesseract
-from .core.pdf_text import extract_text_from_pdf_or_image
+from .core.ocr_engine import OcrConfig, configure_tesseract, extract_text_from_pdf_or_image
 from .core.signatures_robust import verify_pdf_signatures_deep
 from .core.energy import extract_energy_values
 from .core.patterns import extract_basic_patterns
 from .core.director import find_director_mentions
 from .core.reporter import write_reports
-from .core.utils import file_sha256
+from .core.file_index import FileIndex
+from .core.result_cache import DEFAULT_DIR as CACHE_DIR
 
 def process_folder(folder: str, progress_cb=None, no_ocr=False):
     cfg = load_config()
-    ocr_cfg = OcrConfig(**cfg.get('ocr',{}))
+    ocr_cfg = OcrConfig.from_config(cfg)  # conserva cfg completo (ocr.max_workers, etc.)
     if no_ocr: ocr_cfg.enabled = False
     try: configure_tesseract(ocr_cfg.tesseract_bin)
     except Exception: pass
@@ -25,11 +25,12 @@ def process_folder(folder: str, progress_cb=None, no_ocr=False):
                 files.append(os.path.join(root, fn))
     files.sort()
 
+    index = FileIndex(CACHE_DIR)  # sha256 solo se recalcula si cambia size/mtime
     results = []
     total = len(files) or 1
     for i, fpath in enumerate(files, 1):
         if progress_cb: progress_cb(i, total, fpath)
-        rec = {'file_name': os.path.basename(fpath), 'file_path': fpath, 'sha256': file_sha256(fpath)}
+        rec = {'file_name': os.path.basename(fpath), 'file_path': fpath, 'sha256': index.sha256(fpath)}
         try:
             ex = extract_text_from_pdf_or_image(fpath, ocr_cfg)
             text = ex.text or ''
@@ -61,6 +62,7 @@ def process_folder(folder: str, progress_cb=None, no_ocr=False):
 
         results.append(rec)
 
+    index.close()
     write_reports(results, outdir='outputs')
     return os.path.abspath(os.path.join('outputs','reporte_bonito.html'))
 
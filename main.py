@@ -3,8 +3,9 @@ from __future__ import annotations
 import argparse, sys, json, os, re, datetime as dt
 from pathlib import Path
 import runpy
-from typing import Optional, List
-from urllib.parse import urlparse
+from typing import Iterator, Optional
+
+from app.core.pipeline import iter_jsonl, lot_src
 
 # ---------- Utilidades ----------
 def now_stamp() -> str:
@@ -34,70 +35,28 @@ def tools_path() -> Path:
 # Referencias de tus utilitarios:
 # - extract_certs.py: extrae cadena desde PDF. :contentReference[oaicite:2]{index=2}
 # - fetch_issuers_from_aia.py: descarga emisores desde AIA/caIssuers. :contentReference[oaicite:3]{index=3}
-def refresh_trust_from_src(src: Path, trust_dir: Path) -> None:
+def refresh_trust_from_src(src: Path, trust_dir: Path, cache_dir: Optional[Path] = None, workers: int = 8) -> None:
     from pyhanko.pdf_utils.reader import PdfFileReader  # local import
     from asn1crypto import x509
-    import requests, base64
+    from app.core.aia import DEFAULT_DIR as AIA_DIR, AiaResolver, embedded_certs
+    from app.core.trust import TrustStore
 
-    ensure_dir(trust_dir)
-    seen = set()
+    # índice por huella sha256 (trust/index.json): sin duplicados entre corridas
+    store = TrustStore(str(ensure_dir(trust_dir)))
+    added = 0
 
     def save_cert(cert: x509.Certificate, hint: str) -> None:
-        subj = cert.subject.human_friendly
-        fn   = re.sub(r'[^A-Za-z0-9._-]+','_', (hint or subj))[:200] + ".cer"
-        path = trust_dir / fn
-        der  = cert.dump()
-        if der in seen: 
-            return
-        path.write_bytes(der)
-        seen.add(der)
-
-    def get_aia_urls(cert: x509.Certificate) -> List[str]:
-        try:
-            aia = cert['tbs_certificate']['extensions'].get_extension_for_oid('authority_information_access').native
-        except Exception:
-            return []
-        out=[]
-        for d in aia:
-            if d.get('access_method') == 'ca_issuers' and 'access_location' in d:
-                loc = d['access_location']
-                if isinstance(loc, dict) and loc.get('type') == 'uniform_resource_identifier':
-                    out.append(loc['value'])
-        return out
-
-    def download_cert(url: str) -> Optional[x509.Certificate]:
-        try:
-            r = requests.get(url, timeout=20, allow_redirects=True)
-            r.raise_for_status()
-            data = r.content
-            try:
-                return x509.Certificate.load(data)
-            except Exception:
-                # intentar PEM simple
-                m = re.findall(rb"-----BEGIN CERTIFICATE-----(.*?)-----END CERTIFICATE-----", data, re.S)
-                if m:
-                    der = base64.b64decode(m[0].strip().replace(b'\r', b'').replace(b'\n', b''))
-                    return x509.Certificate.load(der)
-        except Exception:
-            return None
-        return None
+        nonlocal added
+        added += store.add(cert, hint)[1]
 
-    def walk_chain_from(cert: x509.Certificate):
-        # guarda CA si aplica
+    def label(cert: x509.Certificate) -> str:
         try:
-            bc = cert.basic_constraints
-            if bc and bool(bc.ca):
-                save_cert(cert, "CA__" + cert.subject.native.get('common_name', 'UNKNOWN'))
+            is_ca = bool(cert.ca)
         except Exception:
-            pass
-        # AIA → subir a emisores
-        for url in get_aia_urls(cert):
-            c_up = download_cert(url)
-            if not c_up: 
-                continue
-            save_cert(c_up, "CA__" + c_up.subject.native.get('common_name','UNKNOWN'))
-
-    # Recorrer todos los PDFs y cadenas embebidas
+            is_ca = False
+        return ("CA__" if is_ca else "EE__") + (cert.subject.native.get('common_name') or 'UNKNOWN')
+
+    # Recorrer todos los PDFs y cadenas embebidas (cada cert una sola vez)
     pdfs = []
     if src.is_file() and src.suffix.lower()==".pdf":
         pdfs=[src]
@@ -106,42 +65,88 @@ def refresh_trust_from_src(src: Path, trust_dir: Path) -> None:
             for fn in fns:
                 if fn.lower().endswith(".pdf"):
                     pdfs.append(Path(r)/fn)
+    certs, fps = [], set()
     for pdf in sorted(pdfs):
         try:
             with open(pdf, "rb") as fh:
-                r = PdfFileReader(fh)
+                r = PdfFileReader(fh, strict=False)
                 for es in r.embedded_signatures:
-                    chain = getattr(es, "certs", None) or []
-                    for c in chain:
-                        if isinstance(c, x509.Certificate):
-                            # End-entity opcional
-                            save_cert(c, "EE__" + c.subject.native.get('common_name','UNKNOWN'))
-                            # Subir a emisores
-                            walk_chain_from(c)
+                    for c in embedded_certs(es):
+                        if c.sha256 in fps:
+                            continue
+                        fps.add(c.sha256); certs.append(c)
+                        save_cert(c, label(c))
         except Exception as e:
             print(f"[refresh-trust] WARN {pdf.name}: {e}")
 
+    # Subir a emisores por AIA: una descarga por URL distinta, en paralelo por nivel
+    aia_dir = str(cache_dir / "aia") if cache_dir else AIA_DIR
+    with AiaResolver(aia_dir, workers=workers) as res:
+        for up in res.resolve(certs):
+            save_cert(up, label(up))
+        st = res.stats
+    store.save()
+    print(f"[refresh-trust] PDFs: {len(pdfs)} | certificados: {len(certs)} | URLs AIA: {st['urls']} "
+          f"(descargas {st['downloads']}, caché {st['disk_hits'] + st['revalidated']}, errores {st['errors']}) | "
+          f"nuevos en TRUST: {added} (total {len(store)})")
+
 # ---------- Scan (llama a tu tools/validate_signs_api.py) ----------
-def run_scan(src: Path, trust: Optional[Path], out_base: Path) -> Path:
+def run_scan(src: Path, trust: Optional[Path], out_base: Path, workers: int = 1,
+             cache_dir: Optional[Path] = None, no_cache: bool = False, save_appearances: bool = False,
+             resume: bool = False, offline: bool = False) -> Path:
     script = tools_path() / "validate_signs_api.py"
     if not script.exists():
         raise FileNotFoundError(f"No se encuentra {script}")
     ensure_dir(out_base)
 
+    # --resume: retoma el lote más reciente de esta misma SRC (su results.jsonl) en lugar de abrir uno nuevo
+    resume_dir = None
+    if resume:
+        lots = [p for p in out_base.iterdir() if p.is_dir() and lot_src(str(p)) == os.path.abspath(str(src))]
+        resume_dir = max(lots, key=lambda p: p.stat().st_mtime) if lots else None
+        if resume_dir is None:
+            print("[resume] no hay lote previo de esta SRC; se inicia uno nuevo")
+
     argv_backup = sys.argv[:]
     try:
         # Simula CLI nativa del validador (manteniendo tu interfaz)
         sys.argv = [str(script), str(src)]
         if trust: sys.argv += ["--trust", str(trust)]
-        sys.argv += ["--out", str(out_base)]
+        sys.argv += ["--out", str(out_base), "--jsonl"]
+        if resume_dir: sys.argv += ["--resume", str(resume_dir)]
+        if workers != 1: sys.argv += ["--workers", str(workers)]
+        if cache_dir: sys.argv += ["--cache-dir", str(cache_dir)]
+        if no_cache: sys.argv += ["--no-cache"]
+        if save_appearances: sys.argv += ["--save-appearances"]
+        if offline: sys.argv += ["--offline"]
         runpy.run_path(str(script), run_name="__main__")
     finally:
         sys.argv = argv_backup
 
     # ubica la subcarpeta de timestamp más reciente
-    out_dir = latest_subdir(out_base) or out_base
+    out_dir = resume_dir or latest_subdir(out_base) or out_base
     return out_dir
 
+# ---------- Prefetch de revocación (CRL/OCSP) ----------
+def prefetch_revinfo(src: Path, trust: Optional[Path], cache_dir: Optional[Path], timeout: int = 10) -> str:
+    """Llena la caché de revocación con las CRL/OCSP de los certificados de los PDFs (para scan --offline)."""
+    from app.core.result_cache import DEFAULT_DIR as CACHE_DIR
+    from app.core.revinfo import RevocationCache, certs_from_pdfs, prefetch
+    from app.core.trust import load_trust_bundle
+
+    pdfs = [src] if src.is_file() else sorted(p for p in src.iterdir() if p.suffix.lower() == ".pdf")
+    certs = certs_from_pdfs(str(p) for p in pdfs)
+    bundle = load_trust_bundle(str(trust)) if trust else None
+    if bundle is not None:
+        certs += bundle.certs()  # intermedias del trust: emisores para OCSP y sus propias CRL
+    with RevocationCache(str(cache_dir or CACHE_DIR)) as cache:
+        pruned = cache.prune()
+        st = prefetch(certs, cache, timeout=timeout)
+        fresh = cache.stats()
+    return (f"PDFs: {len(pdfs)} | Certificados: {st['certs']} | CRL: {st['crl']} | OCSP: {st['ocsp']} | "
+            f"Errores: {st['errors']} | Vencidas borradas: {pruned} | "
+            f"Vigentes en caché: {fresh.get('crl', 0)} CRL, {fresh.get('ocsp', 0)} OCSP")
+
 # ---------- Report ----------
 def load_json_if(path: Path) -> Optional[dict]:
     if path.exists():
@@ -151,13 +156,24 @@ def load_json_if(path: Path) -> Optional[dict]:
             return None
     return None
 
-def summarize_lote(lote_dir: Path) -> str:
+def _iter_lote_results(lote_dir: Path) -> Iterator[dict]:
+    # Preferimos results.jsonl: se lee registro a registro, sin cargar el lote entero
+    jl = lote_dir / "results.jsonl"
+    if jl.exists():
+        for rec in iter_jsonl(str(jl)):
+            item = rec.get("trusted") or rec.get("untrusted")
+            if item: yield item
+        return
     j_un = load_json_if(lote_dir / "sig_untrusted.json") or {}
     j_tr = load_json_if(lote_dir / "sig_trusted.json") or {}
     base = j_tr if j_tr else j_un
-    results = base.get("results", [])
-    lines = [f"Lote: {lote_dir.name} | Archivos: {len(results)}"]
-    for item in results:
+    yield from base.get("results", [])
+
+def summarize_lote(lote_dir: Path) -> str:
+    lines = [""]
+    n = 0
+    for item in _iter_lote_results(lote_dir):
+        n += 1
         f = item.get("file", "?")
         sigs = item.get("signatures", [])
         if not sigs:
@@ -169,6 +185,7 @@ def summarize_lote(lote_dir: Path) -> str:
         st = sigs[0] if sigs else {}
         # signing_time la llena tu validador (en algunos paths puede ir como datetime serializada) :contentReference[oaicite:4]{index=4}
         lines.append(f" - {Path(f).name}: firmas={len(sigs)} | integridadOK={ok} | confiables={tr} | fecha={st.get('signing_time','N/D')}")
+    lines[0] = f"Lote: {lote_dir.name} | Archivos: {n}"
     rep = lote_dir / "reporte_lote.txt"
     lines.append(f"Reporte TXT: {rep}")
     return "\n".join(lines)
@@ -183,6 +200,18 @@ def main():
     p_scan.add_argument("--trust", default=None, help="Carpeta de certificados de confianza (opcional)")
     p_scan.add_argument("--out", required=True, help="Carpeta base de reportes")
     p_scan.add_argument("--refresh-trust", action="store_true", help="Intentar poblar/actualizar TRUST a partir de PDFs antes de escanear")
+    p_scan.add_argument("--workers", type=int, default=1, help="Procesos en paralelo por PDF (1 = secuencial, 0 = todos los núcleos)")
+    p_scan.add_argument("--cache-dir", default=None, help="Carpeta de la caché de resultados (default: .result_cache)")
+    p_scan.add_argument("--no-cache", action="store_true", help="Ignorar la caché de resultados (recalcula todo)")
+    p_scan.add_argument("--save-appearances", action="store_true", help="Guardar PNG/TXT de las apariencias de firma en el lote")
+    p_scan.add_argument("--resume", action="store_true", help="Retomar el último lote interrumpido (omite PDFs ya registrados en su results.jsonl)")
+    p_scan.add_argument("--offline", action="store_true", help="Validar sin red: CRL/OCSP solo desde la caché (llenarla antes con 'prefetch')")
+
+    p_pre = sub.add_parser("prefetch", help="Descarga CRL/OCSP de los certificados de los PDFs a la caché de revocación")
+    p_pre.add_argument("--input", required=True, help="Carpeta o PDF de entrada")
+    p_pre.add_argument("--trust", default=None, help="Carpeta de certificados de confianza (emisores intermedios)")
+    p_pre.add_argument("--cache-dir", default=None, help="Carpeta de la caché (default: .result_cache)")
+    p_pre.add_argument("--timeout", type=int, default=10, help="Timeout por consulta HTTP en segundos")
 
     p_rep = sub.add_parser("report", help="Muestra resumen del último lote (o uno dado)")
     p_rep.add_argument("--out", required=True, help="Carpeta base de reportes")
@@ -197,14 +226,23 @@ def main():
 
         if args.refresh_trust and trust:
             print(f"[i] Actualizando TRUST desde {src} → {trust} ...")
-            refresh_trust_from_src(src, trust)  # usa lógica basada en tus scripts auxiliares :contentReference[oaicite:5]{index=5} :contentReference[oaicite:6]{index=6}
+            refresh_trust_from_src(src, trust, Path(args.cache_dir).resolve() if args.cache_dir else None)  # usa lógica basada en tus scripts auxiliares :contentReference[oaicite:5]{index=5} :contentReference[oaicite:6]{index=6}
             print("[i] TRUST actualizado.")
 
-        out_dir = run_scan(src, trust, outb)  # llama a tools/validate_signs_api.py (tu núcleo) :contentReference[oaicite:7]{index=7}
+        cache_dir = Path(args.cache_dir).resolve() if args.cache_dir else None
+        out_dir = run_scan(src, trust, outb, workers=args.workers, cache_dir=cache_dir, no_cache=args.no_cache,
+                           save_appearances=args.save_appearances, resume=args.resume, offline=args.offline)  # llama a tools/validate_signs_api.py (tu núcleo) :contentReference[oaicite:7]{index=7}
         print("✅ Escaneo completado")
         print(summarize_lote(out_dir))
         return
 
+    if args.cmd == "prefetch":
+        src = Path(args.input).resolve()
+        trust = Path(args.trust).resolve() if args.trust else None
+        cache_dir = Path(args.cache_dir).resolve() if args.cache_dir else None
+        print(prefetch_revinfo(src, trust, cache_dir, timeout=args.timeout))
+        return
+
     if args.cmd == "report":
         outb = Path(args.out).resolve()
         lote = Path(args.lote) if args.lote else latest_subdir(outb)
@@ -214,4 +252,6 @@ def main():
         return
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # requerido por el pool de --workers en el .exe (PyInstaller)
     main()
@@ -0,0 +1,74 @@
+import datetime as dt
+import threading
+
+from asn1crypto import x509 as a_x509
+from cryptography import x509 as cx509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import AuthorityInformationAccessOID, NameOID
+
+from app.core.aia import AiaResolver
+
+URL = "http://ca.example/raiz.cer"
+
+
+def _cert(cn, issuer_cn, key, aia=None):
+    now = dt.datetime.now(dt.timezone.utc)
+    b = (cx509.CertificateBuilder()
+         .subject_name(cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, cn)]))
+         .issuer_name(cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, issuer_cn)]))
+         .public_key(ec.generate_private_key(ec.SECP256R1()).public_key() if cn != issuer_cn else key.public_key())
+         .serial_number(cx509.random_serial_number())
+         .not_valid_before(now).not_valid_after(now + dt.timedelta(days=1)))
+    if aia:
+        b = b.add_extension(cx509.AuthorityInformationAccess(
+            [cx509.AccessDescription(AuthorityInformationAccessOID.CA_ISSUERS, cx509.UniformResourceIdentifier(aia))]),
+            critical=False)
+    return b.sign(key, hashes.SHA256()).public_bytes(serialization.Encoding.DER)
+
+
+class _Resp:
+    def __init__(self, status, content=b"", headers=None):
+        self.status_code, self.content, self.headers = status, content, headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class _Session:
+    def __init__(self, body):
+        self.body, self.calls, self.lock = body, [], threading.Lock()
+
+    def get(self, url, headers=None, **kw):
+        with self.lock:
+            self.calls.append(dict(headers or {}))
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            return _Resp(304)
+        return _Resp(200, self.body, {"ETag": '"v1"'})
+
+    def close(self):
+        pass
+
+
+def test_one_download_per_url_and_etag_revalidation(tmp_path):
+    key = ec.generate_private_key(ec.SECP256R1())
+    root = _cert("Raiz", "Raiz", key)
+    ees = [a_x509.Certificate.load(_cert(f"EE{i}", "Raiz", key, aia=URL)) for i in range(20)]
+
+    sess = _Session(root)
+    with AiaResolver(str(tmp_path), workers=4, session=sess) as res:
+        found = res.resolve(ees)
+    assert [c.dump() for c in found] == [root]
+    assert len(sess.calls) == 1 and res.stats["downloads"] == 1
+
+    # corrida siguiente dentro de max_age: sale del disco, sin red
+    with AiaResolver(str(tmp_path), session=sess) as res:
+        assert [c.dump() for c in res.issuers(ees[0])] == [root]
+    assert len(sess.calls) == 1
+
+    # vencida: GET condicional con ETag → 304 y se reusa el cuerpo guardado
+    with AiaResolver(str(tmp_path), session=sess, max_age_hours=0) as res:
+        assert [c.dump() for c in res.issuers(ees[0])] == [root]
+        assert res.stats["revalidated"] == 1
+    assert sess.calls[-1]["If-None-Match"] == '"v1"'
@@ -0,0 +1,35 @@
+import mmap
+
+import fitz
+
+from app.core import pdf_text
+from app.core.doc_session import DocSession, borrow
+from app.core.signatures_robust import extract_signatures
+
+
+def _pdf(tmp_path):
+    pdf = tmp_path / "sesion.pdf"
+    doc = fitz.open()
+    for i in range(3):
+        doc.new_page().insert_text((72, 72), "Pagina %d firmado por JUAN PEREZ" % (i + 1))
+    doc.save(str(pdf))
+    doc.close()
+    return str(pdf)
+
+
+def test_one_open_shared_by_text_and_signature_stages(tmp_path, monkeypatch):
+    pdf = _pdf(tmp_path)
+    opened = []
+    real_open = fitz.open
+    monkeypatch.setattr(fitz, "open", lambda *a, **k: opened.append(a or k) or real_open(*a, **k))
+    with DocSession(pdf) as sess:
+        res = pdf_text.extract(pdf, session=sess)
+        assert extract_signatures(pdf, session=sess) == []
+        with borrow(sess) as same:
+            assert same is sess and same.page_text(0) is sess.page_text(0)
+        assert sess.widgets(1) is sess.widgets(1)
+        assert isinstance(sess.buffer, mmap.mmap) and sess._data is None  # sin copia del archivo en memoria
+        assert sess._doc is not None  # borrow no cierra la sesión ajena
+    assert len(opened) == 1
+    assert sess._doc is None and sess._mm is None
+    assert res.pages[2].startswith("Pagina 3") and res.method == "native"
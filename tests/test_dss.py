@@ -0,0 +1,36 @@
+import io
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, StreamObject
+
+from app.core.dss import read_dss
+
+
+def _stream(w, data):
+    s = StreamObject()
+    s.set_data(data)
+    return w._add_object(s)
+
+
+def test_read_dss_global_and_vri_dedup():
+    w = PdfWriter()
+    w.add_blank_page(100, 100)
+    cert, crl, ocsp = _stream(w, b"CERT-DER"), _stream(w, b"CRL-DER"), _stream(w, b"OCSP-DER")
+    vri = DictionaryObject({NameObject("/Cert"): ArrayObject([cert]), NameObject("/OCSP"): ArrayObject([ocsp])})
+    w._root_object[NameObject("/DSS")] = DictionaryObject({
+        NameObject("/Certs"): ArrayObject([cert]),
+        NameObject("/CRLs"): ArrayObject([crl]),
+        NameObject("/VRI"): DictionaryObject({NameObject("/ABC"): vri}),
+    })
+    buf = io.BytesIO()
+    w.write(buf)
+
+    m = read_dss(PdfReader(io.BytesIO(buf.getvalue())))
+    assert (m.certs, m.crls, m.ocsps, m.vri) == ([b"CERT-DER"], [b"CRL-DER"], [b"OCSP-DER"], 1)
+    assert m.has_revinfo
+
+    w2 = PdfWriter()
+    w2.add_blank_page(100, 100)
+    buf = io.BytesIO()
+    w2.write(buf)
+    assert not read_dss(PdfReader(io.BytesIO(buf.getvalue())))
@@ -0,0 +1,23 @@
+import os
+
+from app.core import file_index
+from app.core.file_index import FileIndex
+from app.core.utils import file_sha256
+
+
+def test_rehash_only_on_stat_change(tmp_path, monkeypatch):
+    f = tmp_path / "a.pdf"
+    f.write_bytes(b"%PDF-1.4 uno")
+    os.utime(f, ns=(1_000_000_000, 1_000_000_000))
+    calls = []
+    monkeypatch.setattr(file_index, "file_sha256", lambda p: calls.append(p) or file_sha256(p))
+
+    with FileIndex(str(tmp_path / "cache")) as idx:
+        first = idx.sha256(str(f))
+        assert idx.sha256(str(f)) == first
+        assert len(calls) == 1
+
+        f.write_bytes(b"%PDF-1.4 dos, otro contenido")
+        os.utime(f, ns=(2_000_000_000, 2_000_000_000))
+        assert idx.sha256(str(f)) == file_sha256(str(f)) != first
+        assert len(calls) == 2
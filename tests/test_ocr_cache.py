@@ -0,0 +1,24 @@
+import os
+
+from app.core.ocr_cache import OcrCache, image_key, page_key
+
+
+def test_cached_and_keys(tmp_path):
+    c = OcrCache(str(tmp_path))
+    calls = []
+    k = image_key(b"\x00" * 12, 2, 2, "spa+eng", "tesseract")
+    assert c.cached(k, lambda: calls.append(1) or "hola") == "hola"
+    assert c.cached(k, lambda: calls.append(1) or "otro") == "hola"
+    assert calls == [1]
+    assert k != image_key(b"\x00" * 12, 2, 2, "eng", "tesseract")
+    assert page_key("abc", 0, 200, "spa", "t") != page_key("abc", 1, 200, "spa", "t")
+
+
+def test_eviction_by_size(tmp_path):
+    c = OcrCache(str(tmp_path), max_mb=3000 / (1024 * 1024))
+    for i in range(10):
+        c.put("k%d" % i, "x" * 1000)
+        os.utime(os.path.join(str(tmp_path), "k%d.txt" % i), (i, i))
+    assert c.get("k0") is None
+    assert c.get("k9") == "x" * 1000
+    assert sum(e.stat().st_size for e in os.scandir(str(tmp_path))) <= 3000
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+import fitz
+
+from app.core import ocr_engine
+from app.core.ocr_cache import OcrCache
+from app.core.ocr_engine import OcrConfig, extract_text_from_pdf_or_image
+
+
+def test_parallel_ocr_keeps_page_order(tmp_path, monkeypatch):
+    pdf = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    for i in range(7):
+        doc.new_page(width=100 + 20 * i, height=100)  # cada página se distingue por su ancho
+    doc.save(str(pdf))
+    doc.close()
+
+    def fake_ocr(img, langs):
+        time.sleep(random.random() / 50)
+        return "ancho %d" % img.width
+
+    monkeypatch.setattr(ocr_engine, "_ocr_image_pil", fake_ocr)
+    monkeypatch.setattr(ocr_engine, "default_cache", lambda: OcrCache(enabled=False))
+    cfg = OcrConfig.from_config({"ocr": {"max_workers": 3}})
+    res = extract_text_from_pdf_or_image(str(pdf), cfg)
+
+    with fitz.open(str(pdf)) as d:
+        widths = [p.get_pixmap(dpi=200).width for p in d]
+    assert res.is_scanned_hint
+    assert res.text.split("\n") == ["ancho %d" % w for w in widths]
+    assert res.ocr_text_lengths == [len("ancho %d" % w) for w in widths]
+
+
+def test_engine_registry_loads_once(monkeypatch):
+    loads = []
+    monkeypatch.setattr(ocr_engine, "_ENGINES", {})
+    monkeypatch.setattr(ocr_engine, "_load_engine", lambda name, langs: loads.append((name, langs)) or object())
+    a = ocr_engine.get_engine("easyocr", ["es", "en"])
+    assert ocr_engine.get_engine("easyocr", ("es", "en")) is a
+    ocr_engine.get_engine("easyocr", ["en"])
+    assert loads == [("easyocr", ("es", "en")), ("easyocr", ("en",))]
+
+
+def test_pixmap_views_match_samples():
+    doc = fitz.open()
+    page = doc.new_page(width=90, height=60)
+    page.draw_rect(fitz.Rect(10, 10, 40, 30), fill=(1, 0, 0))
+    pix = page.get_pixmap(clip=fitz.Rect(5, 5, 50, 40), alpha=False)
+    arr = ocr_engine.pixmap_to_array(pix)
+    assert arr.shape == (pix.height, pix.width, 3)
+    assert arr.tobytes() == pix.samples
+    assert ocr_engine.pixmap_to_pil(pix).tobytes() == pix.samples
+
+
+def _policy(**kw):
+    cfg = {"ocr": {"adaptive": True, "scale": 1, "scale_hi": 2, "scale_max": 3, "score_retry1": 50, "score_retry2": 80,
+                   "tile_grid": [2, 2], "rot_sweep": [-10, 10]},
+           "fast": {"stop_when_score_reaches": 100, "max_easyocr_calls_per_page": 14}}
+    cfg["fast"].update(kw)
+    return ocr_engine.AdaptivePolicy.from_config(cfg)
+
+
+def test_adaptive_stops_once_score_is_reached():
+    from PIL import Image
+
+    def render(scale):
+        return Image.new("RGB", (100 * int(scale), 100))
+
+    good = "palabra " * 20
+    calls = []
+    def fake(im):
+        calls.append(im.size)
+        return good if im.size[0] >= 200 else "x?"
+
+    text, stats = ocr_engine.ocr_image_adaptive(render(1), render, fake, _policy())
+    assert text.strip() == good.strip()
+    assert calls == [(100, 100), (200, 100)]
+    assert [p[0] for p in stats["passes"]] == ["base", "scale2"]
+
+
+def test_adaptive_respects_call_budget():
+    from PIL import Image
+
+    def render(scale):
+        return Image.new("RGB", (100 * int(scale), 100))
+
+    calls = []
+    text, stats = ocr_engine.ocr_image_adaptive(render(1), render, lambda im: calls.append(1) or "ab", _policy(max_easyocr_calls_per_page=5))
+    assert stats["calls"] == len(calls) == 5
+    assert not ocr_engine.AdaptivePolicy.from_config({"ocr": {}}).enabled
+    # la sección `fast` sola (como en el config de ejemplo) no lo activa: es opt-in
+    assert not ocr_engine.AdaptivePolicy.from_config({"ocr": {}, "fast": {"stop_when_score_reaches": 100}}).enabled
+
+
+def test_adaptive_gives_up_on_blank_page():
+    from PIL import Image
+
+    def render(scale):
+        return Image.new("RGB", (100 * int(scale), 100))
+
+    calls = []
+    text, stats = ocr_engine.ocr_image_adaptive(render(1), render, lambda im: calls.append(im.size) or "", _policy())
+    assert text == "" and calls == [(100, 100), (200, 100)]  # base + scale_hi, sin mosaico ni rotaciones
+
+
+class _GuardedDoc:
+    """Documento que falla si dos hilos lo tocan a la vez (carga de página o render)."""
+
+    def __init__(self, doc):
+        self.doc, self.busy, self.lock, self.overlaps = doc, 0, threading.Lock(), 0
+
+    def _enter(self):
+        with self.lock:
+            self.busy += 1
+            self.overlaps += self.busy > 1
+        time.sleep(0.002)
+
+    def _exit(self):
+        with self.lock:
+            self.busy -= 1
+
+    def load_page(self, i):
+        self._enter()
+        try:
+            return _GuardedPage(self, self.doc.load_page(i))
+        finally:
+            self._exit()
+
+    __getitem__ = load_page
+
+    def __len__(self):
+        return len(self.doc)
+
+
+class _GuardedPage:
+    def __init__(self, owner, page):
+        self.owner, self.page = owner, page
+
+    def get_pixmap(self, *a, **k):
+        self.owner._enter()
+        try:
+            return self.page.get_pixmap(*a, **k)
+        finally:
+            self.owner._exit()
+
+
+def test_adaptive_parallel_pages_never_share_the_document(monkeypatch):
+    doc = fitz.open()
+    for i in range(6):
+        doc.new_page(width=60 + 10 * i, height=60)
+    guarded = _GuardedDoc(doc)
+    monkeypatch.setattr(ocr_engine, "_ocr_image_cached", lambda img, langs: "")  # en blanco: fuerza re-render
+    cfg = OcrConfig.from_config({"ocr": {"adaptive": True, "max_workers": 3, "scale": 1, "scale_hi": 2, "scale_max": 3}, "fast": {}})
+    assert ocr_engine.ocr_pdf_pages(guarded, list(range(6)), cfg) == [""] * 6
+    assert guarded.overlaps == 0
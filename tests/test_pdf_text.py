@@ -0,0 +1,67 @@
+import fitz
+
+from app.core import pdf_text
+
+
+def test_extract_once_for_text_and_meta(tmp_path, monkeypatch):
+    pdf = tmp_path / "nativo.pdf"
+    doc = fitz.open()
+    for i in range(2):
+        doc.new_page().insert_text((72, 72), "Pagina %d con texto nativo suficiente para no usar OCR" % (i + 1))
+    doc.save(str(pdf))
+    doc.close()
+
+    opened = []
+    real_open = pdf_text.fitz.open
+    monkeypatch.setattr(pdf_text.fitz, "open", lambda *a, **k: opened.append(a) or real_open(*a, **k))
+    res = pdf_text.extract(str(pdf))
+    assert len(opened) == 1
+    assert res.method == "native" and not res.used_ocr
+    assert res.meta["pages"] == 2 and res.meta["ocr_pages"] == []
+    assert res.text == "\n\n".join(res.pages) and "Pagina 2" in res.pages[1]
+    assert pdf_text.extract_text(str(pdf)) == (res.text, res.pages)
+
+
+def test_page_mode_ocrs_only_pages_without_text(tmp_path, monkeypatch):
+    pdf = tmp_path / "mixto.pdf"
+    doc = fitz.open()
+    for i in range(4):
+        page = doc.new_page()
+        if i < 2:
+            page.insert_text((72, 72), "Pagina %d con texto nativo suficiente para no usar OCR" % (i + 1))
+    doc.save(str(pdf))
+    doc.close()
+
+    asked = []
+    def fake_ocr(path, page_ids, cfg, n_pages, session=None):
+        asked.append(list(page_ids))
+        return ["texto ocr de la pagina %d" % (i + 1) for i in page_ids], "tesseract"
+
+    monkeypatch.setattr(pdf_text, "_load_cfg", lambda: {"ocr": {"mode": "page"}})
+    monkeypatch.setattr(pdf_text, "_ocr_selected_pages", fake_ocr)
+    res = pdf_text.extract(str(pdf), min_chars_for_native=20)
+    assert asked == [[2, 3]]
+    assert res.meta["ocr_pages"] == [3, 4] and res.method == "tesseract"
+    assert res.pages[0].startswith("Pagina 1") and res.pages[3] == "texto ocr de la pagina 4"
+    assert [p["used_ocr"] for p in res.meta["per_page"]] == [False, False, True, True]
+
+
+def test_document_mode_ocr_runs_in_process(tmp_path, monkeypatch):
+    from app.core import ocr_engine
+    from app.core.ocr_cache import OcrCache
+
+    pdf = tmp_path / "escaneado.pdf"
+    doc = fitz.open()
+    doc.new_page()
+    doc.new_page()
+    doc.save(str(pdf))
+    doc.close()
+
+    cfg = {"ocr": {"mode": "document", "ocrmypdf": {"enable": True}}}
+    monkeypatch.setattr(pdf_text, "_load_cfg", lambda: cfg)
+    monkeypatch.setattr(pdf_text, "_run_ocrmypdf", lambda *a, **k: (_ for _ in ()).throw(AssertionError("subproceso")))
+    monkeypatch.setattr(ocr_engine, "default_cache", lambda: OcrCache(enabled=False))
+    monkeypatch.setattr(ocr_engine, "_ocr_image_pil", lambda img, langs: "texto reconocido")
+    res = pdf_text.extract(str(pdf))
+    assert res.method == "tesseract" and res.meta["ocr_pages"] == [1, 2]
+    assert res.pages == ["texto reconocido", "texto reconocido"]
@@ -0,0 +1,71 @@
+import json
+import random
+import threading
+import time
+
+from app.core.pipeline import Stage, StreamingJsonWriter, run_stages
+
+
+def test_stages_keep_order_and_bound_inflight():
+    lock = threading.Lock()
+    state = {"now": 0, "max": 0}
+
+    def slow(x):
+        with lock:
+            state["now"] += 1
+            state["max"] = max(state["max"], state["now"])
+        time.sleep(random.random() / 200)
+        with lock:
+            state["now"] -= 1
+        return x * 10
+
+    pulled = []
+    def source():
+        for i in range(50):
+            pulled.append(i)
+            yield i
+
+    out = []
+    for y in run_stages(source(), [Stage("a", slow, workers=3, window=4), Stage("b", lambda v: v + 1)]):
+        out.append(y)
+        assert len(pulled) - len(out) <= 5  # back-pressure: la fuente no se adelanta
+    assert out == [i * 10 + 1 for i in range(50)]
+    assert state["max"] <= 3
+
+
+def test_streaming_json_matches_json_dump(tmp_path):
+    results = [{"file": "a.pdf", "signatures": [{"index": 0, "errors": []}]}, {"file": "b.pdf", "signatures": []}]
+    apps = {"a.pdf": [{"page": 1, "ocr_txt": "ñandú"}], "b.pdf": []}
+    head = {"generated": "hoy", "src": "/x", "count": 2}
+    for res, ap in ((results, apps), ([], {})):
+        path = tmp_path / "out.json"
+        with StreamingJsonWriter(str(path), head, [("results", "list"), ("appearances", "dict")]) as w:
+            for r in res:
+                w.append("results", r)
+            for k, v in ap.items():
+                w.put("appearances", k, v)
+        expected = json.dumps(dict(head, results=res, appearances=ap), ensure_ascii=False, indent=2)
+        assert path.read_text(encoding="utf-8") == expected
+
+
+def test_jsonl_resume_drops_partial_tail(tmp_path):
+    from app.core.pipeline import JsonlWriter, iter_jsonl, repair_jsonl
+
+    path = str(tmp_path / "results.jsonl")
+    with JsonlWriter(path) as w:
+        w.write({"file": "a.pdf"})
+        w.write({"file": "b.pdf"})
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"file": "c.p')  # corte a mitad de escritura
+    assert repair_jsonl(path) > 0
+    with JsonlWriter(path, append=True) as w:
+        w.write({"file": "c.pdf"})
+    assert [r["file"] for r in iter_jsonl(path)] == ["a.pdf", "b.pdf", "c.pdf"]
+
+
+def test_lot_records_its_source(tmp_path):
+    from app.core.pipeline import lot_src, write_lot
+
+    assert lot_src(str(tmp_path)) is None  # lote sin lot.json: no se reanuda
+    write_lot(str(tmp_path), str(tmp_path / "pdfs"))
+    assert lot_src(str(tmp_path)) == str(tmp_path / "pdfs")
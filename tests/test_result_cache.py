@@ -0,0 +1,20 @@
+from app.core.result_cache import ResultCache
+
+
+def test_roundtrip_and_fingerprint(tmp_path):
+    with ResultCache(str(tmp_path)) as c:
+        c.put("abc", "signatures", {"ok": True}, fp="f1")
+        assert c.get("abc", "signatures", fp="f1") == {"ok": True}
+        assert c.get("abc", "signatures", fp="f2") is None
+        calls = []
+        assert c.get_or_compute("abc", "entities", lambda: calls.append(1) or [1, 2]) == [1, 2]
+        assert c.get_or_compute("abc", "entities", lambda: calls.append(1) or [3]) == [1, 2]
+        assert calls == [1]
+
+
+def test_lru_eviction(tmp_path):
+    with ResultCache(str(tmp_path), max_bytes=3000) as c:
+        for i in range(10):
+            c.put(f"sha{i}", "text", "x" * 1000)
+        assert c.get("sha0", "text") is None
+        assert c.get("sha9", "text") == "x" * 1000
@@ -0,0 +1,74 @@
+import asyncio
+import datetime as dt
+import time
+
+from asn1crypto import x509 as a_x509
+from cryptography import x509 as cx509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app.core.revinfo import RevocationCache, caching_fetcher_backend
+
+NAME = cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, "CA prueba")])
+KEY = ec.generate_private_key(ec.SECP256R1())
+
+
+def _crl(this_update, next_update):
+    b = cx509.CertificateRevocationListBuilder().issuer_name(NAME).last_update(this_update).next_update(next_update)
+    return b.sign(KEY, hashes.SHA256()).public_bytes(serialization.Encoding.DER)
+
+
+def _cert():
+    now = dt.datetime.now(dt.timezone.utc)
+    c = (cx509.CertificateBuilder().subject_name(NAME).issuer_name(NAME).public_key(KEY.public_key())
+         .serial_number(7).not_valid_before(now).not_valid_after(now + dt.timedelta(days=1)).sign(KEY, hashes.SHA256()))
+    return a_x509.Certificate.load(c.public_bytes(serialization.Encoding.DER))
+
+
+def test_crl_expiry_supersede_and_cached_fetch(tmp_path):
+    now = dt.datetime.now(dt.timezone.utc)
+    old, new = _crl(now - dt.timedelta(days=2), now + dt.timedelta(days=1)), _crl(now, now + dt.timedelta(days=2))
+    with RevocationCache(str(tmp_path)) as c:
+        assert c.put_crl(old) and c.put_crl(new)
+        assert c.crls() == [new]  # la más nueva del mismo emisor reemplaza a la anterior
+        assert c.crls(now=time.time() + 3 * 86400) == []  # vencida según nextUpdate
+        assert c.prune(now=time.time() + 3 * 86400) == 1 and c.stats() == {}
+
+        c.put_crl(new)
+        fetchers = caching_fetcher_backend(c).get_fetchers()
+        cert = _cert()
+        got = asyncio.run(fetchers.crl_fetcher.fetch(cert))  # sale de la caché, sin red
+        assert [x.dump() for x in got] == [new]
+        assert [x.dump() for x in fetchers.crl_fetcher.fetched_crls_for_cert(cert)] == [new]
+
+
+def _partition_crl(url, this_update, next_update):
+    idp = cx509.IssuingDistributionPoint(full_name=[cx509.UniformResourceIdentifier(url)], relative_name=None,
+                                         only_contains_user_certs=False, only_contains_ca_certs=False,
+                                         only_some_reasons=None, indirect_crl=False, only_contains_attribute_certs=False)
+    b = (cx509.CertificateRevocationListBuilder().issuer_name(NAME).last_update(this_update).next_update(next_update)
+         .add_extension(idp, critical=True))
+    return b.sign(KEY, hashes.SHA256()).public_bytes(serialization.Encoding.DER)
+
+
+def _cert_in(url):
+    now = dt.datetime.now(dt.timezone.utc)
+    dp = cx509.DistributionPoint(full_name=[cx509.UniformResourceIdentifier(url)], relative_name=None, reasons=None, crl_issuer=None)
+    c = (cx509.CertificateBuilder().subject_name(NAME).issuer_name(NAME).public_key(KEY.public_key())
+         .serial_number(8).not_valid_before(now).not_valid_after(now + dt.timedelta(days=1))
+         .add_extension(cx509.CRLDistributionPoints([dp]), critical=False).sign(KEY, hashes.SHA256()))
+    return a_x509.Certificate.load(c.public_bytes(serialization.Encoding.DER))
+
+
+def test_partitioned_crls_of_one_issuer_are_kept_apart(tmp_path):
+    now = dt.datetime.now(dt.timezone.utc)
+    a = _partition_crl("http://ca.test/a.crl", now - dt.timedelta(hours=1), now + dt.timedelta(days=1))
+    b = _partition_crl("http://ca.test/b.crl", now, now + dt.timedelta(days=1))
+    with RevocationCache(str(tmp_path)) as c:
+        assert c.put_crl(a) and c.put_crl(b)
+        assert sorted(c.crls()) == sorted([a, b])  # la partición B (más nueva) no borra la A
+        assert [x.dump() for x in c.crls_for(_cert_in("http://ca.test/a.crl"))] == [a]
+        assert c.crls_for(_cert_in("http://ca.test/z.crl")) == []  # partición sin caché: irá a la red
+    with RevocationCache(str(tmp_path)) as c:
+        assert sorted(c.crls()) == sorted([a, b])
@@ -0,0 +1,124 @@
+import datetime as dt
+import hashlib
+import os
+import sys
+import tempfile
+
+from cryptography import x509 as cx509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import pkcs7
+from cryptography.x509.oid import NameOID
+from pypdf import PdfWriter
+from pypdf.generic import ArrayObject, ByteStringObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+import pytest
+
+from app.core import signatures_robust
+from app.core.signatures_robust import byterange_digests, extract_signatures, extract_signatures_fast, parse_pkcs7_info
+
+
+def test_xref_pass_finds_orphan_sig_and_skips_streams(tmp_path):
+    w = PdfWriter()
+    w.add_blank_page(100, 100)
+    for sub in ("/adbe.pkcs7.detached", "/ETSI.CAdES.detached"):
+        sig = DictionaryObject({
+            NameObject("/Type"): NameObject("/Sig"),
+            NameObject("/SubFilter"): NameObject(sub),
+            NameObject("/ByteRange"): ArrayObject([NumberObject(0), NumberObject(1), NumberObject(2), NumberObject(3)]),
+            NameObject("/Contents"): ByteStringObject(b"\x00" * 8),
+        })
+        w._root_object[NameObject("/Sig" + sub[-8:-1])] = w._add_object(sig)  # referenciada fuera de AcroForm
+    decoy = StreamObject()
+    decoy.set_data(b"/Type /Sig /ByteRange [0 1 2 3]")  # marcas dentro de un stream: no es firma
+    w._root_object[NameObject("/Decoy")] = w._add_object(decoy)
+    path = tmp_path / "orphan.pdf"
+    with open(path, "wb") as fh:
+        w.write(fh)
+
+    recs = extract_signatures(str(path))
+    assert sorted(r["subfilter"] for r in recs) == ["/ETSI.CAdES.detached", "/adbe.pkcs7.detached"]
+    assert all(isinstance(r["xref"], int) for r in recs)
+    assert [r["xref"] for r in extract_signatures(str(path), deep=True)] == [r["xref"] for r in recs]
+
+
+def _fake_signed(prefix: bytes, der: bytes, width: int = 64) -> bytes:
+    # /Contents de ancho fijo (relleno con ceros) y /ByteRange calculado sobre el hueco
+    hexs = der.hex().ljust(width, "0").encode()
+    head = prefix + b"9 0 obj\n<< /Type /Sig /SubFilter /ETSI.RFC3161 /Reason (Prueba) /Contents "
+    gap_start = len(head)
+    gap_end = gap_start + len(hexs) + 2
+    tail = b" /ByteRange [0 %d %d %%s] >>\nendobj\n" % (gap_start, gap_end)
+    rest = len(tail % b"0000") - len(b"0000")
+    tail = tail % (b"%04d" % rest)
+    return head + b"<" + hexs + b">" + tail
+
+
+def test_fast_locator_reads_byterange_gap_across_revisions():
+    rev1 = _fake_signed(b"%PDF-1.7\n", b"\x30\x03\x02\x01\x01")
+    both = _fake_signed(rev1, b"\x30\x03\x02\x01\x02")  # actualización incremental
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(both + rev1[len(b"%PDF-1.7\n"):])  # misma firma reescrita: se cuenta una vez
+    try:
+        recs = extract_signatures_fast(path, parse_cms=False, keep_der=True)
+    finally:
+        os.remove(path)
+    assert len(recs) == 2
+    assert [r["pkcs7"][:5] for r in recs] == [b"\x30\x03\x02\x01\x01", b"\x30\x03\x02\x01\x02"]
+    assert all(r["subfilter"] == "/ETSI.RFC3161" and r["reason"] == "Prueba" for r in recs)
+    assert [r["covers_eof"] for r in recs] == [False, False]
+
+
+def test_byterange_digests_one_sweep_matches_hashlib(tmp_path):
+    data = bytes(range(256)) * 40
+    path = tmp_path / "blob.pdf"
+    path.write_bytes(data)
+    ranges = [[0, 100, 200, 3000], [0, 5000, 6000, 4240], [0, 10, 9000, 9999]]  # el último se sale del archivo
+    got = byterange_digests(str(path), ranges, ("sha256", "sha1", "nope"))
+    for br, d in zip(ranges[:2], got):
+        covered = data[br[0]:br[0] + br[1]] + data[br[2]:br[2] + br[3]]
+        assert d == {"sha256": hashlib.sha256(covered).digest(), "sha1": hashlib.sha1(covered).digest(),
+                     "total_len": len(covered)}
+    assert got[2] == {}
+
+
+def _cms(cn, issuer_cn):
+    key = ec.generate_private_key(ec.SECP256R1())
+    now = dt.datetime.now(dt.timezone.utc)
+    cert = (cx509.CertificateBuilder()
+            .subject_name(cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, cn)]))
+            .issuer_name(cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, issuer_cn)]))
+            .public_key(key.public_key()).serial_number(0xABC123)
+            .not_valid_before(now).not_valid_after(now + dt.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    return (pkcs7.PKCS7SignatureBuilder().set_data(b"contenido").add_signer(cert, key, hashes.SHA256())
+            .sign(serialization.Encoding.DER, [pkcs7.PKCS7Options.DetachedSignature]))
+
+
+def test_parse_pkcs7_info_finds_signer_and_memoizes():
+    der = _cms("FIRMANTE PRUEBA", "CA PRUEBA")
+    info = parse_pkcs7_info(der + b"\x00" * 64)  # relleno del /Contents
+    assert info["signer_cn"] == "FIRMANTE PRUEBA"
+    assert info["issuer_cn"] == "CA PRUEBA"
+    assert info["sid_serial_hex"] == "ABC123"
+    assert info["signing_time"]
+    n = len(signatures_robust._PKCS7_MEMO)
+    info["signer_cn"] = "otro"  # copia: no ensucia el memo
+    assert parse_pkcs7_info(der) == dict(info, signer_cn="FIRMANTE PRUEBA")
+    assert len(signatures_robust._PKCS7_MEMO) == n
+    assert parse_pkcs7_info(b"")["signer_cn"] is None
+
+
+@pytest.mark.parametrize("numpy_ok", [True, False])
+def test_widget_rects_resolved_in_one_pass(monkeypatch, numpy_ok):
+    if not numpy_ok:
+        monkeypatch.setitem(sys.modules, "numpy", None)  # respaldo sin NumPy
+    words = [  # (x0, y0, x1, y1, palabra, bloque, línea, nº)
+        (10, 10, 40, 20, "Firmado", 0, 0, 0), (42, 10, 60, 20, "por:", 0, 0, 1),
+        (10, 22, 50, 32, "JUAN", 0, 1, 0), (52, 22, 90, 32, "PEREZ", 0, 1, 1),
+        (200, 10, 260, 20, "Lectura", 1, 0, 0), (262, 10, 300, 20, "kWh", 1, 0, 1),
+    ]
+    rects = [(4, 4, 96, 38), (195, 4, 280, 26), (500, 500, 510, 510)]  # "kWh" queda casi toda afuera
+    got = signatures_robust._texts_in_rects(words, rects)
+    assert got == ["Firmado por:\nJUAN PEREZ", "Lectura", ""]
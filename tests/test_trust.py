@@ -0,0 +1,105 @@
+import datetime as dt
+
+from cryptography import x509 as cx509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app.core import trust
+
+
+def _self_signed(cn):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, cn)])
+    now = dt.datetime.now(dt.timezone.utc)
+    cert = (cx509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now).not_valid_after(now + dt.timedelta(days=1))
+            .add_extension(cx509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+            .sign(key, hashes.SHA256()))
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def test_bundle_cached_and_invalidated(tmp_path, monkeypatch):
+    tdir, cdir = tmp_path / "trust", tmp_path / "cache"
+    tdir.mkdir()
+    (tdir / "a.pem").write_bytes(_self_signed("A") + _self_signed("B"))
+    (tdir / "roto.cer").write_bytes(b"no es un cert")
+
+    b = trust.load_trust_bundle(str(tdir), str(cdir))
+    assert len(b) == 2 and len(b.errors) == 1
+    cert = b.certs()[0]
+    assert trust.load_trust_bundle(str(tdir), str(cdir)) is b
+    assert b.find_by_ski(cert.key_identifier)[0].dump() == cert.dump()
+    assert b.find_by_subject(cert.subject)[0].dump() == cert.dump()
+
+    # otro proceso: sale del pickle sin compilar
+    trust._BUNDLES.clear()
+    monkeypatch.setattr(trust, "compile_bundle", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    assert trust.load_trust_bundle(str(tdir), str(cdir)).ders == b.ders
+    monkeypatch.undo()
+
+    (tdir / "c.pem").write_bytes(_self_signed("C"))
+    assert len(trust.load_trust_bundle(str(tdir), str(cdir))) == 3
+    vc = trust.shared_validation_context(str(tdir), cache_dir=str(cdir))
+    assert vc is not None and trust.shared_validation_context(str(tdir), cache_dir=str(cdir)) is vc
+
+
+def test_trust_store_dedups_across_runs(tmp_path):
+    pem_a, pem_b = _self_signed("Mismo CN"), _self_signed("Mismo CN")
+    a, b = trust._read_ders_bytes(pem_a)[0], trust._read_ders_bytes(pem_b)[0]
+    with trust.TrustStore(str(tmp_path)) as st:
+        pa, new_a = st.add(a, "CA__Mismo CN")
+        pb, new_b = st.add(b, "CA__Mismo CN")
+        assert new_a and new_b and pa != pb  # mismo CN, distinta huella: no se pisan
+    with trust.TrustStore(str(tmp_path)) as st:
+        assert st.add(a, "otro nombre") == (pa, False)
+        assert len(st) == 2 and st.get(trust.hashlib.sha256(a).hexdigest()).dump() == a
+    # el índice no se confunde con un certificado al compilar el bundle
+    assert len(trust.compile_bundle(str(tmp_path))) == 2 and not trust.compile_bundle(str(tmp_path)).errors
+
+
+def test_dss_context_reuses_roots_and_scoped_revinfo(tmp_path):
+    from app.core.dss import DssMaterial
+    tdir = tmp_path / "trust"
+    tdir.mkdir()
+    (tdir / "a.pem").write_bytes(_self_signed("A"))
+    b = trust.load_trust_bundle(str(tdir), str(tmp_path / "cache"))
+    assert b.certs()[0] is b.certs()[0]  # parseadas una sola vez
+    assert "_parsed" not in b.__getstate__()
+
+    class _Rev:
+        asked = []
+        def put_crl(self, d): pass
+        def put_ocsp(self, d): pass
+        def crls(self): raise AssertionError("no se carga toda la caché")
+        def ocsps(self): raise AssertionError("no se carga toda la caché")
+        def crls_for(self, c): self.asked.append(c.subject.native["common_name"]); return []
+        def ocsp_for(self, c): return None
+
+    dss = DssMaterial(certs=[trust._read_ders_bytes(_self_signed("Hoja"))[0]], crls=[])
+    assert trust.document_validation_context(dss, b, _Rev(), offline=True) is not None
+    assert _Rev.asked == ["Hoja"]
+
+
+def test_trust_store_indexes_every_cert_of_a_pem(tmp_path):
+    pem_a, pem_b = _self_signed("A"), _self_signed("B")
+    (tmp_path / "cadena.pem").write_bytes(pem_a + pem_b)
+    b = trust._read_ders_bytes(pem_b)[0]
+    with trust.TrustStore(str(tmp_path)) as st:
+        assert len(st) == 2
+        path, new = st.add(b, "B")
+        assert not new and path.endswith("cadena.pem")  # no escribe un .cer duplicado
+        assert st.get(trust.hashlib.sha256(b).hexdigest()).dump() == b
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cadena.pem", "index.json"]
+
+
+def test_shared_context_memo_tells_revinfo_apart(tmp_path):
+    from app.core.revinfo import RevocationCache
+    tdir = tmp_path / "trust"
+    tdir.mkdir()
+    (tdir / "a.pem").write_bytes(_self_signed("A"))
+    b = trust.load_trust_bundle(str(tdir), str(tmp_path / "cache"))
+    with RevocationCache(str(tmp_path / "rev")) as rev:
+        plain = trust.shared_validation_context(bundle=b)
+        cached = trust.shared_validation_context(bundle=b, revinfo=rev)
+        assert plain is not cached and trust.shared_validation_context(bundle=b, revinfo=rev) is cached
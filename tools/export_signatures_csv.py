@@ -1,10 +1,10 @@
 from __future__ import annotations
 import os, csv, argparse
 from typing import List, Dict, Any
-from app.core.signatures_robust import extract_signatures
+from app.core.signatures_robust import extract_signatures, extract_signatures_fast
 
-def rows_for_file(path: str) -> List[Dict[str, Any]]:
-    sigs = extract_signatures(path)
+def rows_for_file(path: str, fast: bool = False) -> List[Dict[str, Any]]:
+    sigs = extract_signatures_fast(path, integrity=True) if fast else extract_signatures(path)
     rows = []
     for s in sigs:
         rows.append({
@@ -20,12 +20,16 @@ def rows_for_file(path: str) -> List[Dict[str, Any]]:
             "reason": s.get("reason") or "",
             "location": s.get("location") or "",
         })
+        if fast:
+            ok = s.get("integrity_ok")
+            rows[-1]["integrity_ok"] = "" if ok is None else ("OK" if ok else "FALLA")
     return rows
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True, help="PDF o carpeta")
     ap.add_argument("--out", default="signatures.csv", help="Ruta CSV de salida")
+    ap.add_argument("--fast", action="store_true", help="Firmas por /ByteRange (mmap) sin parsear el PDF, con integrity_ok")
     args = ap.parse_args()
 
     targets = []
@@ -42,10 +46,10 @@ def main():
         writer = csv.DictWriter(fh, fieldnames=[
             "file","status","subfilter","signer_display","signer_cn","issuer_cn",
             "signing_time_iso","sid_serial_hex","sid_issuer_dn","reason","location"
-        ])
+        ] + (["integrity_ok"] if args.fast else []))
         writer.writeheader()
         for p in targets:
-            for row in rows_for_file(p):
+            for row in rows_for_file(p, args.fast):
                 writer.writerow(row)
 
 if __name__ == "__main__":
@@ -1,10 +1,12 @@
 from __future__ import annotations
 import os, argparse, json, unicodedata
-from typing import List, Dict, Any, Tuple
-from app.core.pdf_text import extract_text_with_meta
+from typing import List, Dict, Any, Tuple, Callable, Optional, Iterator
+from app.core.pdf_text import TextExtraction, extract
 from app.core.director import find_director_mentions
 from app.core.signatures_robust import extract_signatures
 from app.core.extractors import extract_entities
+from app.core.file_index import FileIndex, indexed_sha256
+from app.core.result_cache import ResultCache, DEFAULT_DIR as CACHE_DIR, config_fingerprint, fingerprint
 
 SEP = "=" * 78
 SUB = "-" * 78
@@ -63,21 +65,34 @@ def _best_sig_brief(sigs: List[Dict[str,Any]]) -> Tuple[str, str]:
     fecha = s.get("signing_time_iso") or s.get("signing_time") or ""
     return (quien, fecha)
 
+# -------- Cache por sha256 ----------
+def _cached(cache: Optional[ResultCache], path: str, kind: str, fn: Callable[[], Any],
+            index: Optional[FileIndex] = None) -> Any:
+    if cache is None:
+        return fn()
+    try:
+        sha = indexed_sha256(path, index)
+    except Exception:
+        return fn()
+    return cache.get_or_compute(sha, kind, fn, fp=fingerprint(kind, config_fingerprint()))
+
 # -------- Secciones ----------
 def _section(title: str, body: str, ascii_mode: bool) -> str:
     t = _out(title, ascii_mode)
     b = _out(body, ascii_mode)
     return f"{t}\n{SUB}\n{b}\n"
 
-def _report_for_file(path: str, min_dir_score: float, ascii_mode: bool) -> str:
+def _report_for_file(path: str, min_dir_score: float, ascii_mode: bool, cache: Optional[ResultCache] = None,
+                     index: Optional[FileIndex] = None) -> str:
     try:
-        full, pages, meta = extract_text_with_meta(path, min_chars_for_native=40)
+        ext = _cached(cache, path, "text", lambda: extract(path, min_chars_for_native=40), index)
     except Exception:
-        full, pages, meta = "", [], {"pages_total": 0, "ocr_pages": [], "native_pages": []}
+        ext = TextExtraction(meta={"pages": 0, "ocr_pages": []})
+    full, meta = ext.text, ext.meta
 
     director = find_director_mentions(full or "", min_score=min_dir_score)
     sigs_all = [s for s in extract_signatures(path) if s.get("status") != "dss-present"]
-    ents = extract_entities(full or "")
+    ents = _cached(cache, path, "entities", lambda: extract_entities(full or ""), index)
 
     # Resumen corto por archivo
     quien_firma, fecha_firma = _best_sig_brief(sigs_all)
@@ -94,7 +109,7 @@ def _report_for_file(path: str, min_dir_score: float, ascii_mode: bool) -> str:
         f"Fecha de firma: {fecha_firma}",
         f"Director detectado: {'SI' if director.get('found') else 'NO'} (score {director.get('score')})",
         f"Cedulas: {len(cedulas)} | RUC: {len(rucs)} | Fechas: {len(fechas)}",
-        f"OCR: {len(meta.get('ocr_pages',[]))} / {meta.get('pages_total',0)} pagina(s)",
+        f"OCR: {len(meta.get('ocr_pages',[]))} / {meta.get('pages',0)} pagina(s)",
     ]
     resumen = _out("\n".join(resumen_lines), ascii_mode)
 
@@ -123,7 +138,7 @@ def _report_for_file(path: str, min_dir_score: float, ascii_mode: bool) -> str:
     ruc_s    = _join(rucs, 7)
     nombres  = _join(ents.get("nombres_probables", []), 8)
 
-    ocr_info = f"{len(meta.get('ocr_pages',[]))} de {meta.get('pages_total',0)} pagina(s) pasaron por OCR."
+    ocr_info = f"{len(meta.get('ocr_pages',[]))} de {meta.get('pages',0)} pagina(s) pasaron por OCR."
 
     sections = [
         SEP,
@@ -141,7 +156,11 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True, help="PDF o carpeta")
     ap.add_argument("--out", required=True, help="Ruta del TXT de salida")
+    ap.add_argument("--cache-dir", default=CACHE_DIR, help="Cache de resultados por sha256")
+    ap.add_argument("--no-cache", action="store_true", help="No usar la cache de resultados")
     args = ap.parse_args()
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    index = None if args.no_cache else FileIndex(args.cache_dir)
 
     cfg = _load_cfg()
     min_dir_score = float(cfg.get("director", {}).get("min_score", 63.0))
@@ -159,30 +178,35 @@ def main():
         targets.append(args.input)
     targets = sorted(targets)
 
-    chunks: List[str] = []
-    lote = len(targets) > 1
-
-    # Resumen lote (si aplica)
-    if lote:
-        head = [
-            SEP,
-            "RESUMEN LOTE",
-            SEP,
-            f"Total de archivos: {len(targets)}",
-            ""
-        ]
-        chunks.append("\n".join(head))
-
-    # Procesa uno a uno
-    for p in targets:
-        try:
-            chunks.append(_report_for_file(p, min_dir_score, ascii_mode))
-        except Exception as e:
-            err = f"{SEP}\nARCHIVO: {p}\n{SEP}\nERROR: {e}\n"
-            chunks.append(_to_ascii(err) if ascii_mode else err)
-
+    def _chunks() -> Iterator[str]:
+        # Resumen lote (si aplica)
+        if len(targets) > 1:
+            head = [
+                SEP,
+                "RESUMEN LOTE",
+                SEP,
+                f"Total de archivos: {len(targets)}",
+                ""
+            ]
+            yield "\n".join(head)
+
+        # Procesa uno a uno
+        for p in targets:
+            try:
+                yield _report_for_file(p, min_dir_score, ascii_mode, cache, index)
+            except Exception as e:
+                err = f"{SEP}\nARCHIVO: {p}\n{SEP}\nERROR: {e}\n"
+                yield _to_ascii(err) if ascii_mode else err
+
+    # Se escribe cada archivo al terminarlo (mismo texto que "\n\n".join(chunks).rstrip() + "\n");
+    # sólo el último bloque se retiene para recortar el final.
     with open(args.out, "w", encoding=encoding, errors="ignore") as fh:
-        fh.write("\n\n".join(chunks).rstrip() + "\n")
+        prev: Optional[str] = None
+        for chunk in _chunks():
+            if prev is not None:
+                fh.write(prev + "\n\n"); fh.flush()
+            prev = chunk
+        fh.write((prev or "").rstrip() + "\n")
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,11 @@
 ﻿from __future__ import annotations
 import sys, os, json, time
 import fitz  # PyMuPDF
-from PIL import Image
-import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+from app.core.ocr_cache import default_cache, image_key
+from app.core.ocr_engine import configure_tesseract, ocr_image_any, pixmap_to_pil
 
 def guess_tesseract_cmd():
     try:
@@ -17,22 +20,10 @@ def guess_tesseract_cmd():
     return None
 
 def ocr_image(img):
-    # 1) pytesseract
-    try:
-        import pytesseract
-        tcmd = guess_tesseract_cmd()
-        if tcmd:
-            pytesseract.pytesseract.tesseract_cmd = tcmd
-        return pytesseract.image_to_string(img, lang="spa+eng")
-    except Exception:
-        pass
-    # 2) easyocr (fallback)
+    # pytesseract y, si falla, easyocr; ambos salen del registro por proceso
+    # (el Reader de easyocr se carga una sola vez para todo el lote)
     try:
-        import easyocr
-        reader = easyocr.Reader(["es","en"], gpu=False, verbose=False)
-        arr = np.array(img.convert("RGB"))
-        lines = reader.readtext(arr, detail=False, paragraph=True)
-        return "\n".join(lines)
+        return ocr_image_any(img, ["es", "en"], prefer=("tesseract", "easyocr"))[0]
     except Exception as e:
         return f"[OCR error] {e}"
 
@@ -73,8 +64,13 @@ def process_file(path, outdir):
             clip = fitz.Rect(rect).inflate(10)
             mat = fitz.Matrix(2, 2)
             pix = page.get_pixmap(matrix=mat, clip=clip, alpha=False)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            txt = ocr_image(img)
+            img = pixmap_to_pil(pix)
+            key = image_key(pix.samples_mv, pix.width, pix.height, "spa+eng", "tesseract|easyocr")
+            txt = default_cache().get(key)
+            if txt is None:
+                txt = ocr_image(img)
+                if not txt.startswith("[OCR error]"):
+                    default_cache().put(key, txt)
             base = os.path.splitext(os.path.basename(path))[0]
             name = f"{base}_p{pno+1}_sig{idx}.txt"
             with open(os.path.join(outdir, name), "w", encoding="utf-8") as f:
@@ -87,6 +83,7 @@ def main():
         print("Uso: python -m tools.ocr_firmas <archivo.pdf | carpeta>")
         sys.exit(1)
     target = sys.argv[1]
+    configure_tesseract(guess_tesseract_cmd())
     stamp = time.strftime("%Y%m%d_%H%M%S")
     outdir = os.path.join("_sig_ocr", stamp)
     os.makedirs(outdir, exist_ok=True)
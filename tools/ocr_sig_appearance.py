@@ -6,6 +6,11 @@ import fitz
 from PIL import Image
 import pytesseract
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+from app.core.ocr_cache import default_cache, image_key
+from app.core.ocr_engine import pixmap_to_pil
+
 def collect_pdfs(src: str) -> List[str]:
     if os.path.isfile(src) and src.lower().endswith(".pdf"):
         return [src]
@@ -60,8 +65,12 @@ def process_file(pdf_path: str) -> Dict[str, Any]:
                 rect = getattr(w, "rect", None)
                 if rect is None: continue
                 pix = page.get_pixmap(clip=rect, dpi=300)
-                pil = Image.open(io.BytesIO(pix.tobytes("png")))
-                text = ocr_pil(pil).strip()
+                key = image_key(pix.samples_mv, pix.width, pix.height, "spa+eng", "tesseract")
+                text = default_cache().get(key)
+                if text is None:
+                    text = ocr_pil(pixmap_to_pil(pix)).strip()
+                    if not text.startswith("[OCR_ERROR]"):
+                        default_cache().put(key, text)
                 out["appearances"].append({
                     "page": pno + 1,
                     "field_name": getattr(w, "field_name", None),
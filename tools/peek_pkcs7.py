@@ -3,6 +3,7 @@ import sys, binascii, json
 from pypdf import PdfReader
 from pypdf.generic import DictionaryObject, ArrayObject, IndirectObject, NameObject, ByteStringObject, DecodedStreamObject, StreamObject
 import re
+from app.core.signatures_robust import extract_signatures_fast, parse_pkcs7_info
 
 HEX_RE = re.compile(r"^[0-9A-Fa-f\s><]+$")
 
@@ -29,10 +30,17 @@ def maybe_bytes(v):
     return None
 
 def main():
-    if len(sys.argv) < 2:
-        print("Uso: python -m tools.peek_pkcs7 <archivo.pdf>")
+    args = [a for a in sys.argv[1:] if a != "--fast"]
+    if not args:
+        print("Uso: python -m tools.peek_pkcs7 [--fast] <archivo.pdf>")
         sys.exit(1)
-    r = PdfReader(sys.argv[1])
+    if "--fast" in sys.argv[1:]:
+        # /Contents directo del hueco del /ByteRange, sin parsear objetos
+        sigs = extract_signatures_fast(args[0], parse_cms=False, keep_der=True)
+        if not sigs:
+            print("[]"); return
+        return _print_blob(sigs[0].get("pkcs7"))
+    r = PdfReader(args[0])
     found = []
     seen = set()
 
@@ -55,12 +63,14 @@ def main():
     rec(r.trailer)
     if not found:
         print("[]"); return
-    sig = found[0]
-    raw = maybe_bytes(sig.get("/Contents"))
+    _print_blob(maybe_bytes(found[0].get("/Contents")))
+
+def _print_blob(raw):
     if not raw:
         print(json.dumps({"len": 0, "der_like": False, "head": ""}, indent=2, ensure_ascii=False)); return
     head = binascii.hexlify(raw[:32]).decode()
     out = {"len": len(raw), "der_like": raw[:1] == b"\x30", "head": head}
+    out.update(parse_pkcs7_info(raw))  # mismo parser memoizado que signatures_robust
     print(json.dumps(out, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
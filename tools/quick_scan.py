@@ -1,21 +1,25 @@
 from __future__ import annotations
 import argparse, json, os
-from app.core.pdf_text import extract_text
+from app.core.doc_session import DocSession
+from app.core.pdf_text import extract
 from app.core.director import find_director_mentions
-from app.core.signatures_robust import extract_signatures
+from app.core.signatures_robust import extract_signatures, extract_signatures_fast
 
-def scan_file(path: str):
-    try:
-        full, _ = extract_text(path, min_chars_for_native=40)
-    except Exception:
-        full = ""
-    director = find_director_mentions(full)
-    sigs = extract_signatures(path)
+def scan_file(path: str, fast: bool = False):
+    # un solo documento abierto para texto, apariencias y adivinanza de nombres
+    with DocSession(path) as sess:
+        try:
+            full = extract(path, min_chars_for_native=40, session=sess).text
+        except Exception:
+            full = ""
+        director = find_director_mentions(full)
+        sigs = extract_signatures_fast(path, integrity=True) if fast else extract_signatures(path, session=sess)
     return {"file": path, "director": director, "signatures": sigs}
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True, help="PDF o carpeta")
+    ap.add_argument("--fast", action="store_true", help="Firmas por /ByteRange (mmap) sin parsear el PDF, con integrity_ok")
     args = ap.parse_args()
     target = args.input
     items = []
@@ -23,9 +27,9 @@ def main():
         for root, _, files in os.walk(target):
             for fn in files:
                 if fn.lower().endswith(".pdf"):
-                    items.append(scan_file(os.path.join(root, fn)))
+                    items.append(scan_file(os.path.join(root, fn), args.fast))
     else:
-        items.append(scan_file(target))
+        items.append(scan_file(target, args.fast))
     print(json.dumps(items, ensure_ascii=False, indent=2))
 
 if __name__ == "__main__":
@@ -2,7 +2,8 @@
 import os, sys, re, json
 from datetime import datetime
 from typing import Dict, Any, List, Tuple
-from app.core.pdf_text import extract_text_with_meta, extract_text
+from app.core.pdf_text import extract
+from app.core.pipeline import Stage, run_stages
 try:
     from tools.test_firmas import list_signatures
 except Exception:
@@ -92,13 +93,22 @@ def run(folder: str):
     print(SEP)
     print(f"Total de archivos: {len(files)}\n")
 
-    for path in files:
-        # Meta de OCR / texto
-        meta = extract_text_with_meta(path, min_chars_for_native=int((cfg.get("ocr") or {}).get("min_chars_for_native", 80)))
-        full_text, _ = extract_text(path, min_chars_for_native=int((cfg.get("ocr") or {}).get("min_chars_for_native", 80)))
+    min_chars = int((cfg.get("ocr") or {}).get("min_chars_for_native", 80))
+    def st_text(path):
+        # Meta de OCR / texto (una sola extracción por archivo)
+        return path, extract(path, min_chars_for_native=min_chars)
+    def st_firmas(item):
+        return item + (list_signatures(item[0]),)
+    stages = [
+        Stage("text", st_text),
+        Stage("firmas", st_firmas, workers=int((cfg.get("pipeline") or {}).get("signature_workers", 2))),
+    ]
+
+    # Cada archivo se imprime apenas termina su última etapa (orden de entrada)
+    for path, ext, firmas in run_stages(files, stages):
+        meta, full_text = ext.meta, ext.text
 
         # Firmas
-        firmas = list_signatures(path)
         firmante_principal = (firmas[0].get("subject") or firmas[0].get("name")) if firmas else "(sin firmas)"
         fecha_firma = (firmas[0].get("time") or "(sin fecha)") if firmas else ""
 
@@ -1,8 +1,13 @@
 # tools/sig_ocr.py
 from __future__ import annotations
-import sys, os, json, tempfile
+import sys, os, json
 import fitz  # PyMuPDF
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+from app.core.ocr_cache import default_cache, image_key
+from app.core.ocr_engine import get_engine, pixmap_to_array, pixmap_to_pil
+
 def _load_cfg():
     try:
         with open(os.path.join("config", "config.json"), "r", encoding="utf-8") as f:
@@ -11,41 +16,26 @@ def _load_cfg():
         return {}
 
 def _make_reader(langs):
-    # Preferimos EasyOCR si está instalado; si no, caemos a Tesseract (opcional)
+    # Preferimos EasyOCR si está instalado; si no, caemos a Tesseract (opcional).
+    # Los motores salen del registro de ocr_engine: se cargan una vez por proceso.
     try:
-        import easyocr
-        return ("easyocr", easyocr.Reader(langs, gpu=False))
+        return ("easyocr", get_engine("easyocr", langs))
     except Exception:
         try:
-            import pytesseract
             from PIL import Image
-            return ("tesseract", (pytesseract, Image))
+            return ("tesseract", (get_engine("tesseract", langs), Image))
         except Exception:
             return (None, None)
 
-def _ocr_image_bytes(engine, obj, png_bytes, lang):
+def _ocr_pixmap(engine, obj, pix, lang):
+    # Sin PNG ni archivos temporales: el motor recibe el buffer del pixmap
     if engine == "easyocr":
         reader = obj
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-            tmp.write(png_bytes)
-            tmp_path = tmp.name
-        try:
-            lines = reader.readtext(tmp_path, detail=0, paragraph=True)
-            return "\n".join(lines).strip()
-        finally:
-            try: os.unlink(tmp_path)
-            except: pass
+        lines = reader.readtext(pixmap_to_array(pix), detail=0, paragraph=True)
+        return "\n".join(lines).strip()
     elif engine == "tesseract":
-        pytesseract, Image = obj
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-            tmp.write(png_bytes)
-            tmp_path = tmp.name
-        try:
-            im = Image.open(tmp_path)
-            return pytesseract.image_to_string(im, lang=lang).strip()
-        finally:
-            try: os.unlink(tmp_path)
-            except: pass
+        pytesseract, _ = obj
+        return pytesseract.image_to_string(pixmap_to_pil(pix), lang=lang).strip()
     else:
         return ""
 
@@ -54,7 +44,7 @@ def _iter_signature_widgets(page):
     out = []
     # PyMuPDF nuevo: page.widgets; fallback via anotaciones si hiciera falta
     try:
-        widgets = page.widgets or []
+        widgets = page.widgets() or []
         for w in widgets:
             ft = getattr(w, "field_type", None)
             fts = getattr(w, "field_type_string", "") or ""
@@ -91,8 +81,12 @@ def ocr_signatures(pdf_path: str, dpi=300, margin=2):
                 r = fitz.Rect(r.x0 - margin, r.y0 - margin, r.x1 + margin, r.y1 + margin)
                 mat = fitz.Matrix(dpi/72, dpi/72)
                 pix = page.get_pixmap(matrix=mat, clip=r, alpha=False)
-                png = pix.tobytes("png")
-                txt = _ocr_image_bytes(engine, obj, png, lang_str)
+                key = image_key(pix.samples_mv, pix.width, pix.height, lang_str, engine or "none")
+                txt = default_cache().get(key) if engine else None
+                if txt is None:
+                    txt = _ocr_pixmap(engine, obj, pix, lang_str)
+                    if engine:
+                        default_cache().put(key, txt)
                 results["signatures"].append({
                     "page": pno,
                     "field_name": fname,
@@ -3,11 +3,9 @@ import sys, os, json, binascii
 from typing import List, Dict, Any
 import pikepdf
 
-try:
-    from cryptography import x509
-    from cryptography.hazmat.primitives.serialization.pkcs7 import load_der_pkcs7_certificates
-except Exception:
-    load_der_pkcs7_certificates = None
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+from app.core.signatures_robust import parse_pkcs7_info
 
 def _bytes_from(obj):
     try:
@@ -20,14 +18,6 @@ def _bytes_from(obj):
                 return obj.encode("latin-1", "ignore")
         return b""
 
-def _cn_only(name):
-    try:
-        # CN OID = 2.5.4.3
-        parts = [a.value for a in name if getattr(a, "oid", None) and a.oid.dotted_string == "2.5.4.3"]
-        return parts[0] if parts else name.rfc4514_string()
-    except Exception:
-        return str(name)
-
 def list_signatures(pdf_path: str) -> List[Dict[str, Any]]:
     sig_dicts = []
     with pikepdf.open(pdf_path) as pdf:
@@ -74,27 +64,13 @@ def list_signatures(pdf_path: str) -> List[Dict[str, Any]]:
             "has_bytes":   bool(s.get("/Contents", None)),
             "has_byterange": bool(s.get("/ByteRange", None)),
         }
-        if load_der_pkcs7_certificates and s.get("/Contents", None) is not None:
-            try:
-                contents = _bytes_from(s.get("/Contents"))
-                certs = load_der_pkcs7_certificates(contents)
-                chosen = None
-                for c in certs:
-                    try:
-                        bc = c.extensions.get_extension_for_class(x509.BasicConstraints).value
-                        if not bc.ca:
-                            chosen = c
-                            break
-                    except Exception:
-                        pass
-                if chosen is None and certs:
-                    chosen = certs[0]
-                if chosen:
-                    item["issuer"]  = _cn_only(chosen.issuer)
-                    item["subject"] = _cn_only(chosen.subject)
-                    item["serial"]  = format(chosen.serial_number, "X")
-            except Exception:
-                pass
+        if s.get("/Contents", None) is not None:
+            # firmante según el SID del SignerInfo (no "el primer cert no-CA");
+            # memoizado: el mismo /Contents llega por AcroForm y por el escáner de objetos
+            info = parse_pkcs7_info(_bytes_from(s.get("/Contents")))
+            item["issuer"]  = info["issuer_cn"] or info["sid_issuer_dn"]
+            item["subject"] = info["signer_cn"]
+            item["serial"]  = info["sid_serial_hex"]
         out.append(item)
     return out
 
@@ -1,20 +1,30 @@
 ﻿# validate_signs_api.py
 from __future__ import annotations
-import os, re, json, glob, enum, argparse, datetime as dt
+import os, re, sys, json, glob, enum, time, argparse, datetime as dt
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-
-print(">> validate_signs_api.py arrancó OK")
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import fitz
-from PIL import Image
 import pytesseract
 from pyhanko.pdf_utils.reader import PdfFileReader
 from pyhanko.sign.validation import validate_pdf_signature   # <<-- API correcta en 0.31
 from pyhanko_certvalidator import ValidationContext
-from asn1crypto import pem, x509
+from asn1crypto import x509
 import logging
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+from app.core.file_index import FileIndex, indexed_sha256
+from app.core.ocr_cache import default_cache, image_key
+from app.core.ocr_engine import init_ocr_worker, ocr_pixmap
+from app.core.pipeline import JsonlWriter, LineWriter, StreamingJsonWriter, bounded_map, iter_jsonl, lot_src, repair_jsonl, write_lot
+from app.core.result_cache import ResultCache, DEFAULT_DIR as CACHE_DIR, config_fingerprint, dir_fingerprint, fingerprint
+from app.core.revinfo import DEFAULT_TTL_HOURS, RevocationCache
+from app.core.doc_session import DocSession, borrow
+from app.core.dss import read_dss
+from app.core.signatures_robust import byterange_digests
+from app.core.trust import TrustBundle, document_validation_context, load_trust_bundle, load_trust_roots, shared_validation_context
+
 
 def J(v):
     if isinstance(v, (dt.datetime, dt.date)): return v.isoformat()
@@ -38,58 +48,43 @@ def list_pdfs(src):
                 pass
     return sorted(seen)
 def load_certificates_from_dir(trust_dir: Optional[str]) -> List[x509.Certificate]:
-    certs=[]
-    if not trust_dir or not os.path.isdir(trust_dir): return certs
-    for fname in os.listdir(trust_dir):
-        fpath=os.path.join(trust_dir,fname)
-        if not os.path.isfile(fpath): continue
-        try:
-            data=open(fpath,'rb').read()
-            if pem.detect(data):
-                for _t,_h,der in pem.unarmor(data, multiple=True):
-                    certs.append(x509.Certificate.load(der))
-            else:
-                certs.append(x509.Certificate.load(data))
-        except Exception as e:
-            print(f"ADVERTENCIA: no se pudo cargar cert {fname}: {e}")
-    return certs
+    # vía bundle compilado (app/core/trust): la carpeta solo se relee si cambió
+    return load_trust_roots(trust_dir) if trust_dir else []
 
-def make_validation_context(trust_dir: Optional[str]) -> Optional[ValidationContext]:
+def make_validation_context(trust_dir: Optional[str], bundle: Optional[TrustBundle] = None,
+                            revinfo: Optional[RevocationCache] = None, offline: bool = False) -> Optional[ValidationContext]:
     try:
-        roots = load_certificates_from_dir(trust_dir)
-        if not roots:
-            return None
-        return ValidationContext(
-            trust_roots=roots,
-            other_certs=roots,
-            allow_fetching=True,
-            revocation_mode='soft-fail',
-        )
+        return shared_validation_context(trust_dir, bundle=bundle, revinfo=revinfo, offline=offline)
     except Exception as e:
         print(f"ADVERTENCIA: no se pudo construir ValidationContext: {e}")
         return None
 
-def _ocr_image(png_path: str) -> str:
+def _ocr_image(pix: fitz.Pixmap) -> str:
     tess = os.environ.get('TESSERACT_CMD')
     if tess: pytesseract.pytesseract.tesseract_cmd = tess
     try:
-        text = pytesseract.image_to_string(Image.open(png_path), lang='spa+eng')
+        text = ocr_pixmap(pix, "tesseract", ["es", "en"])
         return re.sub(r"\s+"," ", text).strip()
     except Exception as e:
         return f"<OCR_ERROR: {e}>"
 
-def extract_signature_appearances(pdf_path: str, out_dir: str) -> List[Dict[str, Any]]:
-    ensure_dir(out_dir)
-    doc = fitz.open(pdf_path)
+def extract_signature_appearances(pdf_path: str, out_dir: Optional[str] = None,
+                                  session: Optional[DocSession] = None) -> List[Dict[str, Any]]:
+    """OCR en memoria de cada apariencia de firma; PNG/TXT sólo si se pasa out_dir (--save-appearances)."""
+    with borrow(session or pdf_path) as sess:
+        return _signature_appearances(sess, pdf_path, out_dir)
+
+def _signature_appearances(sess: DocSession, pdf_path: str, out_dir: Optional[str]) -> List[Dict[str, Any]]:
+    if out_dir: ensure_dir(out_dir)
     res=[]
     base=os.path.splitext(os.path.basename(pdf_path))[0]
-    for pno in range(doc.page_count):
-        page=doc.load_page(pno)
+    for pno in range(sess.page_count):
+        page=sess.page(pno)
         rects=[]
         try:
-            for w in (list(page.widgets()) or []):
-                ftype=str(getattr(w,'field_type','') or getattr(w,'ft','')).lower()
-                if 'sig' in ftype: rects.append(fitz.Rect(w.rect))
+            for w in sess.widgets(pno):
+                ftype=str(getattr(w,'field_type_string','') or getattr(w,'ft','')).lower()
+                if w.field_type == fitz.PDF_WIDGET_TYPE_SIGNATURE or 'sig' in ftype: rects.append(fitz.Rect(w.rect))
         except Exception: pass
         if not rects:
             try:
@@ -107,230 +102,481 @@ def extract_signature_appearances(pdf_path: str, out_dir: str) -> List[Dict[str,
             except Exception: pass
         for idx, r in enumerate(rects):
             pix = page.get_pixmap(matrix=fitz.Matrix(2,2), clip=r*1.1)
-            out_png=os.path.join(out_dir, f"{base}_p{pno+1}_sig{idx+1}.png"); pix.save(out_png)
-            ocr=_ocr_image(out_png)
-            with open(out_png.replace('.png','.txt'),'w',encoding='utf-8') as fh: fh.write(ocr)
+            key=image_key(pix.samples_mv, pix.width, pix.height, 'spa+eng', 'tesseract')
+            ocr=default_cache().get(key)
+            if ocr is None:
+                ocr=_ocr_image(pix)
+                if not ocr.startswith('<OCR_ERROR'): default_cache().put(key, ocr)
+            out_png=None
+            if out_dir:
+                out_png=os.path.join(out_dir, f"{base}_p{pno+1}_sig{idx+1}.png"); pix.save(out_png)
+                with open(out_png.replace('.png','.txt'),'w',encoding='utf-8') as fh: fh.write(ocr)
             res.append({"page":pno+1,"rect":[r.x0,r.y0,r.x1,r.y1],"image":out_png,"ocr_txt":ocr})
-    doc.close(); return res
-
-def validate_file_signatures(pdf_path: str, vc: Optional[ValidationContext]) -> Dict[str, Any]:
-    out={"file": pdf_path, "signatures": [], "errors": []}
+    return res
+
+def _signature_entry(idx: int, emb_sig: Any, st: Any) -> Dict[str, Any]:
+    entry = {
+        "index": idx,
+        # intact = digest del /ByteRange == messageDigest; valid solo cubre la firma del CMS
+        "integrity_ok": getattr(st, 'intact', None) if getattr(st, 'intact', None) is not None else getattr(st, 'valid', None),
+        "trusted": getattr(st, 'trust_status', None) in (True, 'TRUSTED') or getattr(st,'trusted',None),
+        "signing_time": getattr(st, 'signing_time', None),
+        "errors": [], "warnings": []
+    }
     try:
-        with open(pdf_path,'rb') as fh:
-            reader = PdfFileReader(fh, strict=False)
-            for idx, emb_sig in enumerate(reader.embedded_signatures, start=1):
-                st = validate_pdf_signature(emb_sig, vc)
-                entry = {
-                    "index": idx,
-                    "integrity_ok": getattr(st, 'intact', None) or getattr(st, 'valid', None),
-                    "trusted": getattr(st, 'trust_status', None) in (True, 'TRUSTED') or getattr(st,'trusted',None),
-                    "signing_time": getattr(st, 'signing_time', None),
-                    "errors": [], "warnings": []
-                }
-                try:
-                    scert = getattr(st, 'signer_cert', None)
-                    if scert is not None:
-                        try:
-                            subj = scert.subject.native
-                            entry["signer_name"] = subj.get('common_name') or subj.get('organization_name')
-                            entry["signer_cert_subject"] = subj
-                        except Exception:
-                            entry["signer_cert_subject"] = str(scert)
-                        try:
-                            entry["signer_cert_serial"] = getattr(scert,'serial_number',None) or getattr(scert,'serial',None)
-                        except Exception: pass
-                except Exception as e:
-                    entry["errors"].append(f"signer_cert parse error: {e}")
-                for attr in ("validation_errors","reporting_errors","failure_reasons"):
-                    v = getattr(st, attr, None)
-                    if v: entry["errors"].append(str(v))
-                for attr in ("validation_warnings","warnings"):
-                    v = getattr(st, attr, None)
-                    if v: entry["warnings"].append(str(v))
-                # --- Fallback signing_time cuando PyHanko no lo expone directamente ---
+        scert = getattr(st, 'signer_cert', None)
+        if scert is not None:
+            try:
+                subj = scert.subject.native
+                entry["signer_name"] = subj.get('common_name') or subj.get('organization_name')
+                entry["signer_cert_subject"] = subj
+            except Exception:
+                entry["signer_cert_subject"] = str(scert)
+            try:
+                entry["signer_cert_serial"] = getattr(scert,'serial_number',None) or getattr(scert,'serial',None)
+            except Exception: pass
+    except Exception as e:
+        entry["errors"].append(f"signer_cert parse error: {e}")
+    for attr in ("validation_errors","reporting_errors","failure_reasons"):
+        v = getattr(st, attr, None)
+        if v: entry["errors"].append(str(v))
+    for attr in ("validation_warnings","warnings"):
+        v = getattr(st, attr, None)
+        if v: entry["warnings"].append(str(v))
+    # --- Fallback signing_time cuando PyHanko no lo expone directamente ---
 
-                try:
+    try:
 
-                    if not entry.get("signing_time"):
+        if not entry.get("signing_time"):
 
-                        # a) Intento desde atributos firmados CMS (OID 1.2.840.113549.1.9.5)
+            # a) Intento desde atributos firmados CMS (OID 1.2.840.113549.1.9.5)
 
-                        si = getattr(emb_sig, 'signer_info', None)
+            si = getattr(emb_sig, 'signer_info', None)
 
-                        if si is not None:
+            if si is not None:
 
-                            try:
+                try:
 
-                                # asn1crypto.cms.SignerInfo['signed_attrs'] → lista de atributos
+                    # asn1crypto.cms.SignerInfo['signed_attrs'] → lista de atributos
 
-                                attrs = None
+                    attrs = None
 
-                                try:
+                    try:
 
-                                    attrs = si['signed_attrs']
+                        attrs = si['signed_attrs']
 
-                                except Exception:
+                    except Exception:
 
-                                    attrs = getattr(si, 'signed_attrs', None) or getattr(si, 'signed_attributes', None)
+                        attrs = getattr(si, 'signed_attrs', None) or getattr(si, 'signed_attributes', None)
 
-                                if attrs:
+                    if attrs:
 
-                                    for a in (list(attrs) if hasattr(attrs, '__iter__') else []):
+                        for a in (list(attrs) if hasattr(attrs, '__iter__') else []):
 
-                                        try:
+                            try:
 
-                                            t = None
+                                t = None
 
-                                            # distintos sabores: a['type'] puede tener .dotted o .native
+                                # distintos sabores: a['type'] puede tener .dotted o .native
 
-                                            if hasattr(a, 'native'):
+                                if hasattr(a, 'native'):
 
-                                                t = a.native.get('type')
+                                    t = a.native.get('type')
 
-                                            elif hasattr(a, 'dump'):
+                                elif hasattr(a, 'dump'):
 
-                                                t = str(a['type'])
+                                    t = str(a['type'])
 
-                                            # aceptar por nombre o por OID exacta
+                                # aceptar por nombre o por OID exacta
 
-                                            if (t and 'signing_time' in str(t)) or str(getattr(a['type'],'dotted', '')) == '1.2.840.113549.1.9.5':
+                                if (t and 'signing_time' in str(t)) or str(getattr(a['type'],'dotted', '')) == '1.2.840.113549.1.9.5':
 
-                                                # valor puede venir en 'values'[0] o 'value'
+                                    # valor puede venir en 'values'[0] o 'value'
 
-                                                val = None
+                                    val = None
 
-                                                try:
+                                    try:
 
-                                                    vals = a.get('values', None)
+                                        vals = a.get('values', None)
 
-                                                    if vals: val = vals[0]
+                                        if vals: val = vals[0]
 
-                                                except Exception:
+                                    except Exception:
 
-                                                    pass
+                                        pass
 
-                                                if val is None:
+                                    if val is None:
 
-                                                    try: val = a.get('value', None)
+                                        try: val = a.get('value', None)
 
-                                                    except Exception: pass
+                                        except Exception: pass
 
-                                                if val is not None:
+                                    if val is not None:
 
-                                                    try:
+                                        try:
 
-                                                        entry['signing_time'] = getattr(val, 'native', val)
+                                            entry['signing_time'] = getattr(val, 'native', val)
 
-                                                        break
+                                            break
 
-                                                    except Exception:
+                                        except Exception:
 
-                                                        entry['signing_time'] = str(val)
+                                            entry['signing_time'] = str(val)
 
-                                                        break
+                                            break
 
-                                        except Exception:
+                            except Exception:
 
-                                            pass
+                                pass
 
-                        # b) Intento desde diccionario PDF (/M)
+                except Exception:
 
-                        if not entry.get("signing_time"):
+                    pass
 
-                            try:
+            # b) Intento desde diccionario PDF (/M)
 
-                                sdict = getattr(emb_sig, 'sig_object', None) or getattr(emb_sig, 'sig_dict', None) or {}
+            if not entry.get("signing_time"):
 
-                                m = None
+                try:
 
-                                if hasattr(sdict, 'get'):
+                    sdict = getattr(emb_sig, 'sig_object', None) or getattr(emb_sig, 'sig_dict', None) or {}
 
-                                    m = sdict.get('/M') or sdict.get('M')
+                    m = None
 
-                                if m:
+                    if hasattr(sdict, 'get'):
 
-                                    entry['signing_time'] = str(m)
+                        m = sdict.get('/M') or sdict.get('M')
 
-                            except Exception:
+                    if m:
 
-                                pass
+                        entry['signing_time'] = str(m)
 
                 except Exception:
 
                     pass
 
-                
+    except Exception:
+
+        pass
 
-                out["signatures"].append(entry)
+    return entry
+
+def _prefill_digests(pdf_path: str, sigs: List[Any], session: Optional[DocSession] = None) -> None:
+    # Un solo recorrido mmap para todos los /ByteRange del PDF (en vez de que
+    # pyHanko relea cada rango por el file object); pyHanko compara contra el
+    # messageDigest igual que siempre. Si algo no cuadra, lo calcula él.
+    try:
+        ranges = [list(s.byte_range) for s in sigs]
+        digests = byterange_digests(session or pdf_path, ranges, [s.external_md_algorithm for s in sigs])
+    except Exception:
+        return
+    for s, d in zip(sigs, digests):
+        alg = s.external_md_algorithm
+        if alg in d and s.external_digest is None:
+            s.total_len, s.external_digest = d["total_len"], d[alg]
+
+def validate_file_signatures_both(pdf_path: str, vc: Optional[ValidationContext],
+                                  doc_vc: Optional[Callable[[Any], Optional[ValidationContext]]] = None,
+                                  session: Optional[DocSession] = None
+                                  ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Una sola apertura/parseo del PDF y un solo hash por firma; devuelve
+    (untrusted, trusted). trusted es None si no hay ValidationContext.
+    `doc_vc(reader)` puede devolver un VC propio del documento (material /DSS).
+    Con `session` el digest de los /ByteRange reusa su mmap; pyHanko lee del archivo.
+    """
+    untrusted={"file": pdf_path, "signatures": [], "errors": []}
+    trusted={"file": pdf_path, "signatures": [], "errors": []} if vc is not None else None
+    try:
+        with open(pdf_path,'rb') as fh:
+            reader = PdfFileReader(fh, strict=False)
+            if trusted is not None and doc_vc is not None:
+                try: vc = doc_vc(reader) or vc
+                except Exception: pass
+            sigs = list(reader.embedded_signatures)
+            _prefill_digests(pdf_path, sigs, session)
+            for idx, emb_sig in enumerate(sigs, start=1):
+                # cada pasada se corta en su primer error, como en validate_file_signatures
+                diffed = False
+                if not untrusted["errors"]:
+                    try:
+                        st = validate_pdf_signature(emb_sig, None); diffed = True
+                        untrusted["signatures"].append(_signature_entry(idx, emb_sig, st))
+                    except Exception as e:
+                        untrusted["errors"].append(f"validate_pdf_signature failed: {e}")
+                if trusted is not None and not trusted["errors"]:
+                    try:
+                        # el digest ya quedó en external_digest y el diff de la primera
+                        # pasada sigue en diff_result: solo cambia la validación de la cadena
+                        st = validate_pdf_signature(emb_sig, vc, skip_diff=diffed)
+                        trusted["signatures"].append(_signature_entry(idx, emb_sig, st))
+                    except Exception as e:
+                        trusted["errors"].append(f"validate_pdf_signature failed: {e}")
+    except Exception as e:
+        for out in (untrusted, trusted):
+            if out is not None and not out["errors"]:
+                out["errors"].append(f"validate_pdf_signature failed: {e}")
+    return untrusted, trusted
+
+def validate_file_signatures(pdf_path: str, vc: Optional[ValidationContext]) -> Dict[str, Any]:
+    out={"file": pdf_path, "signatures": [], "errors": []}
+    try:
+        with open(pdf_path,'rb') as fh:
+            reader = PdfFileReader(fh, strict=False)
+            sigs = list(reader.embedded_signatures)
+            _prefill_digests(pdf_path, sigs)
+            for idx, emb_sig in enumerate(sigs, start=1):
+                st = validate_pdf_signature(emb_sig, vc)
+                out["signatures"].append(_signature_entry(idx, emb_sig, st))
     except Exception as e:
         out["errors"].append(f"validate_pdf_signature failed: {e}")
     return out
 
+
 def write_json(path: str, obj: Any) -> None:
     with open(path,'w',encoding='utf-8') as fh:
         json.dump(obj, fh, ensure_ascii=False, indent=2, default=J)
 
+def _report_header() -> List[str]:
+    return ["REPORTE DE VALIDACIÓN DE FIRMAS — CNEL_Verificador_CLI", f"Generado: {dt.datetime.now().isoformat()}\n"]
+
+def _report_lines(item: Dict[str, Any]) -> List[str]:
+    lines=[]
+    f=item.get('file'); lines.append(f"Archivo: {f}")
+    sigs=item.get('signatures') or []
+    if not sigs:
+        errs=item.get('errors') or []
+        lines.append(f"  - Sin firmas detectadas o error de validación. Errores: {', '.join(map(str, errs)) if errs else 'N/A'}\n")
+        return lines
+    for s in sigs:
+        lines.append(f"  - Firma #{s.get('index')} | Integridad: {'OK' if s.get('integrity_ok') else 'FALLA'} | Confiable: {'SÍ' if s.get('trusted') else 'NO'}")
+        lines.append(f"    Firmante: {s.get('signer_name','N/D')} | Serie: {s.get('signer_cert_serial')}")
+        lines.append(f"    Fecha firma: {s.get('signing_time','N/D')}")
+        warn=s.get('warnings') or []; err=s.get('errors') or []
+        if warn: lines.append(f"    Avisos: {'; '.join(map(str,warn))}")
+        if err:  lines.append(f"    Errores: {'; '.join(map(str,err))}")
+    lines.append("")
+    return lines
+
 def build_text_report(batch: List[Dict[str, Any]], out_txt: str) -> None:
-    lines=["REPORTE DE VALIDACIÓN DE FIRMAS — CNEL_Verificador_CLI", f"Generado: {dt.datetime.now().isoformat()}\n"]
-    for item in batch:
-        f=item.get('file'); lines.append(f"Archivo: {f}")
-        sigs=item.get('signatures') or []
-        if not sigs:
-            errs=item.get('errors') or []
-            lines.append(f"  - Sin firmas detectadas o error de validación. Errores: {', '.join(map(str, errs)) if errs else 'N/A'}\n")
-            continue
-        for s in sigs:
-            lines.append(f"  - Firma #{s.get('index')} | Integridad: {'OK' if s.get('integrity_ok') else 'FALLA'} | Confiable: {'SÍ' if s.get('trusted') else 'NO'}")
-            lines.append(f"    Firmante: {s.get('signer_name','N/D')} | Serie: {s.get('signer_cert_serial')}")
-            lines.append(f"    Fecha firma: {s.get('signing_time','N/D')}")
-            warn=s.get('warnings') or []; err=s.get('errors') or []
-            if warn: lines.append(f"    Avisos: {'; '.join(map(str,warn))}")
-            if err:  lines.append(f"    Errores: {'; '.join(map(str,err))}")
-        lines.append("")
-    with open(out_txt,'w',encoding='utf-8') as fh: fh.write("\n".join(lines))
+    with LineWriter(out_txt) as w:
+        w.write_block(_report_header())
+        for item in batch: w.write_block(_report_lines(item))
+
+# ---------- Trabajo por archivo (secuencial o en pool de procesos) ----------
+# Estado por proceso: en modo pool lo llena _init_worker una vez por worker,
+# así el ValidationContext no viaja serializado con cada tarea.
+_WORKER: Dict[str, Any] = {}
+
+def _init_worker(trust_dir: Optional[str], out_imgs: Optional[str], vc: Optional[ValidationContext] = None, build_vc: bool = True,
+                 cache_dir: Optional[str] = None, bundle: Optional[TrustBundle] = None,
+                 revinfo_dir: Optional[str] = None, offline: bool = False) -> None:
+    logging.getLogger("pyhanko").setLevel(logging.ERROR)
+    logging.getLogger("pyhanko_certvalidator").setLevel(logging.ERROR)
+    _WORKER["out_imgs"] = out_imgs
+    init_ocr_worker(("tesseract",), ["es", "en"], os.environ.get('TESSERACT_CMD'))
+    # en el pool llega el bundle ya compilado por el padre: el VC se arma una vez por proceso
+    revinfo = _open_revinfo(revinfo_dir) if (vc is not None or build_vc) else None
+    if vc is None and build_vc:
+        vc = make_validation_context(trust_dir, bundle, revinfo, offline)
+    _WORKER["vc"] = vc
+    # PDFs LTV: su /DSS alimenta un VC propio (certs + CRL/OCSP embebidos, sin red)
+    _WORKER["doc_vc"] = None
+    if vc is not None:
+        b = bundle or load_trust_bundle(trust_dir)
+        _WORKER["doc_vc"] = lambda reader: document_validation_context(read_dss(reader), b, revinfo, offline)
+    _WORKER["cache"] = _WORKER["index"] = None
+    if cache_dir:
+        try:
+            _WORKER["cache"] = ResultCache(cache_dir)
+            _WORKER["index"] = FileIndex(cache_dir)
+        except Exception as e:
+            print(f"ADVERTENCIA: caché deshabilitada ({cache_dir}): {e}")
+        cfg_fp = config_fingerprint()
+        _WORKER["fp_apps"] = fingerprint("appearances", cfg_fp, os.environ.get('TESSERACT_CMD', ''))
+        # offline puede dar otro veredicto de revocación: no comparte entradas con el modo en línea;
+        # "intact" invalida entradas viejas donde integrity_ok caía a `valid`.
+        # El veredicto trusted depende del tiempo (revocación, vencimiento): con VC
+        # la entrada vale solo dentro de una ventana del TTL de revocación.
+        bucket = int(time.time() // (DEFAULT_TTL_HOURS * 3600)) if _WORKER["vc"] is not None else ""
+        _WORKER["fp_sigs"] = fingerprint("signatures", cfg_fp, dir_fingerprint(trust_dir) if _WORKER["vc"] is not None else "",
+                                         "offline" if offline else "", "intact", bucket)
+
+def _open_revinfo(cache_dir: Optional[str]) -> Optional[RevocationCache]:
+    if not cache_dir: return None
+    try: return RevocationCache(cache_dir)
+    except Exception as e:
+        print(f"ADVERTENCIA: caché de revocación deshabilitada ({cache_dir}): {e}")
+        return None
+
+def _relocate_appearances(cached: Optional[Dict[str, Any]], pdf: str, out_dir: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """Copia los PNG/TXT de un lote anterior al lote actual; None si ya no existen."""
+    if not cached: return None
+    if not out_dir: return [dict(a, image=None) for a in cached.get("apps", [])]
+    import shutil
+    old_base = cached.get("base", ""); new_base = os.path.splitext(os.path.basename(pdf))[0]
+    apps = []
+    for a in cached.get("apps", []):
+        src_png = a.get("image")
+        if not src_png or not os.path.exists(src_png): return None
+        dst_png = os.path.join(out_dir, new_base + os.path.basename(src_png)[len(old_base):])
+        if os.path.abspath(src_png) != os.path.abspath(dst_png):
+            shutil.copyfile(src_png, dst_png)
+            with open(dst_png.replace('.png','.txt'),'w',encoding='utf-8') as fh: fh.write(a.get("ocr_txt") or "")
+        apps.append(dict(a, image=dst_png))
+    return apps
+
+def scan_pdf(pdf: str) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Apariencias + validación untrusted + trusted de un PDF → (pdf, apps, untrusted, trusted|None)."""
+    cache = _WORKER.get("cache"); sha = None
+    if cache is not None:
+        try: sha = indexed_sha256(pdf, _WORKER.get("index"))
+        except Exception: cache = None
+
+    # una sola apertura para OCR de apariencias y validación; perezosa: con
+    # ambas etapas en caché no se lee el archivo
+    with DocSession(pdf) as sess:
+        apps, sigs = _scan_stages(pdf, sess, cache, sha)
+    # la caché es por contenido: el mismo PDF puede estar en otra ruta
+    untrusted, trusted = (dict(o, file=pdf) if o is not None else None for o in sigs)
+    return pdf, apps, untrusted, trusted
+
+def _scan_stages(pdf: str, sess: DocSession, cache: Optional[ResultCache], sha: Optional[str]) -> Tuple[List[Dict[str, Any]], Any]:
+    apps = _relocate_appearances(cache.get(sha, "appearances", _WORKER["fp_apps"]), pdf, _WORKER["out_imgs"]) if cache else None
+    if apps is None:
+        try:
+            apps = extract_signature_appearances(pdf, _WORKER["out_imgs"], sess)
+            # no se cachean fallos de OCR (p. ej. Tesseract ausente): se reintentan en la próxima corrida
+            if cache and not any(str(a.get("ocr_txt", "")).startswith("<OCR_ERROR") for a in apps):
+                cache.put(sha, "appearances", {"base": os.path.splitext(os.path.basename(pdf))[0], "apps": apps}, _WORKER["fp_apps"])
+        except Exception as e:
+            print(f"[OCR] {os.path.basename(pdf)} → ERROR: {e}")
+            apps = []
+
+    sigs = cache.get(sha, "signatures", _WORKER["fp_sigs"]) if cache else None
+    if sigs is None:
+        sigs = validate_file_signatures_both(pdf, _WORKER.get("vc"), _WORKER.get("doc_vc"), sess)
+        if cache and not any(o and o["errors"] for o in sigs):
+            cache.put(sha, "signatures", sigs, _WORKER["fp_sigs"])
+    return apps, sigs
+
+JSONL_NAME = 'results.jsonl'
+
+def _revive(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Registro leído de JSONL: signing_time vuelve a datetime para que el TXT salga igual."""
+    for o in (rec.get("untrusted"), rec.get("trusted")):
+        for s in (o or {}).get("signatures") or []:
+            v = s.get("signing_time")
+            if isinstance(v, str):
+                try: s["signing_time"] = dt.datetime.fromisoformat(v)
+                except ValueError: pass
+    return rec
+
+def _worker_module():
+    # Ejecutado como script (o vía runpy desde main.py) este archivo es __main__;
+    # los procesos hijos necesitan importarlo por nombre para resolver scan_pdf.
+    if __name__ != "__main__":
+        return sys.modules[__name__]
+    import importlib
+    return importlib.import_module("tools.validate_signs_api")
+
+def iter_scan(pdfs: List[str], trust_dir: Optional[str], out_imgs: Optional[str], vc: Optional[ValidationContext], workers: int = 1,
+              cache_dir: Optional[str] = None, revinfo_dir: Optional[str] = None, offline: bool = False) -> Iterator[Tuple[str, List[Dict[str, Any]], Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """Produce los resultados de scan_pdf en el mismo orden de `pdfs`."""
+    if workers <= 1 or len(pdfs) <= 1:
+        _init_worker(trust_dir, out_imgs, vc=vc, build_vc=False, cache_dir=cache_dir, revinfo_dir=revinfo_dir, offline=offline)
+        for pdf in pdfs:
+            yield scan_pdf(pdf)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    mod = _worker_module()
+    with ProcessPoolExecutor(max_workers=workers, initializer=mod._init_worker,
+                             initargs=(trust_dir if vc is not None else None, out_imgs, None, vc is not None, cache_dir,
+                                       load_trust_bundle(trust_dir) if vc is not None else None, revinfo_dir, offline)) as pool:
+        # ventana acotada: a lo sumo 2*workers PDFs en vuelo, no todo el lote
+        yield from bounded_map(mod.scan_pdf, pdfs, workers, executor=pool)
 
 def main():
+    print(">> validate_signs_api.py arrancó OK")
     ap=argparse.ArgumentParser(description="Valida firmas (untrusted+trusted) y extrae OCR de apariencias.")
-    ap.add_argument('src'); ap.add_argument('--trust', default=None); ap.add_argument('--out', default=None); args=ap.parse_args()
+    ap.add_argument('src'); ap.add_argument('--trust', default=None); ap.add_argument('--out', default=None)
+    ap.add_argument('--workers', type=int, default=1, help="Procesos en paralelo (1 = secuencial, 0 = todos los núcleos)")
+    ap.add_argument('--cache-dir', default=CACHE_DIR, help="Caché de resultados por sha256 (default: .result_cache)")
+    ap.add_argument('--no-cache', action='store_true', help="No leer ni escribir la caché de resultados")
+    ap.add_argument('--save-appearances', action='store_true', help="Guardar PNG/TXT de cada apariencia en <out>/apariencias")
+    ap.add_argument('--jsonl', action='store_true', help=f"Escribir además {JSONL_NAME} (un registro por PDF, volcado al producirse)")
+    ap.add_argument('--offline', action='store_true', help="Sin red: CRL/OCSP solo desde la caché de revocación (ver main.py prefetch)")
+    ap.add_argument('--resume', default=None, help=f"Carpeta de un lote interrumpido: omite los PDFs ya presentes en su {JSONL_NAME}")
+    args=ap.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
 
     src=os.path.abspath(args.src)
     if not os.path.isdir(src): raise SystemExit(f"SRC inválido: {src}")
 
     out_root=os.path.abspath(args.out or os.path.join(os.getcwd(),'reports'))
-    out_dir=ensure_dir(os.path.join(out_root, now_stamp()))
-    out_imgs=ensure_dir(os.path.join(out_dir,'apariencias'))
+    out_dir=ensure_dir(os.path.abspath(args.resume) if args.resume else os.path.join(out_root, now_stamp()))
+    out_imgs=ensure_dir(os.path.join(out_dir,'apariencias')) if args.save_appearances else None
 
     print(f"SRC   : {src}"); print(f"TRUST : {args.trust or '<none>'}"); print(f"OUT   : {out_dir}")
+    if workers > 1: print(f"WORKERS: {workers}")
 
     pdfs=list_pdfs(src)
     if not pdfs: raise SystemExit("No se encontraron PDFs en SRC.")
 
-    all_apps={}
-    for pdf in pdfs:
-        try:
-            apps=extract_signature_appearances(pdf, out_imgs)
-            all_apps[pdf]=apps
-        except Exception as e:
-            print(f"[OCR] {os.path.basename(pdf)} → ERROR: {e}")
-            all_apps[pdf]=[]
-
-    batch_untrusted=[validate_file_signatures(pdf, vc=None) for pdf in pdfs]
-    vc=make_validation_context(args.trust)
-    batch_trusted=[validate_file_signatures(pdf, vc=vc) for pdf in pdfs] if vc is not None else []
-
-    write_json(os.path.join(out_dir,'sig_untrusted.json'),
-               {"generated": dt.datetime.now(), "src": src, "count": len(batch_untrusted), "results": batch_untrusted, "appearances": all_apps})
-    if vc is not None:
-        write_json(os.path.join(out_dir,'sig_trusted.json'),
-                   {"generated": dt.datetime.now(), "src": src, "count": len(batch_trusted), "results": batch_trusted, "appearances": all_apps})
-
-    build_text_report(batch_trusted if batch_trusted else batch_untrusted, os.path.join(out_dir,'reporte_lote.txt'))
+    # Reanudar: lo ya registrado en el JSONL del lote no se vuelve a procesar. Solo
+    # se retoma un lote de la misma SRC, y de él solo los PDFs que siguen en SRC.
+    jsonl_path=os.path.join(out_dir, JSONL_NAME)
+    done=set(); wanted=set(pdfs)
+    if args.resume:
+        prev=lot_src(out_dir)
+        if prev != src: raise SystemExit(f"[resume] {out_dir} no es un lote de {src} (SRC del lote: {prev or 'desconocida'})")
+        cut=repair_jsonl(jsonl_path)
+        if cut: print(f"[resume] línea incompleta descartada ({cut} bytes)")
+        done={rec.get("file") for rec in iter_jsonl(jsonl_path)} & wanted
+        print(f"[resume] {len(done)} PDF(s) ya procesados en {jsonl_path}")
+    else:
+        write_lot(out_dir, src)
+    todo=[p for p in pdfs if p not in done]
+
+    revinfo_dir=os.path.abspath(args.cache_dir)
+    revinfo=_open_revinfo(revinfo_dir)
+    if args.offline and revinfo is not None:
+        st=revinfo.stats(); print(f"[offline] revocación desde caché: {st.get('crl',0)} CRL, {st.get('ocsp',0)} OCSP vigentes")
+    vc=make_validation_context(args.trust, revinfo=revinfo, offline=args.offline)
+    # Sinks en streaming: cada PDF se escribe al terminar (mismo formato que write_json /
+    # build_text_report), así un corte a mitad de lote no pierde lo ya procesado.
+    def _json_sink(name):
+        head={"generated": dt.datetime.now(), "src": src, "count": len(done) + len(todo)}
+        return StreamingJsonWriter(os.path.join(out_dir,name), head, [("results","list"),("appearances","dict")], default=J)
+    sink_u=_json_sink('sig_untrusted.json'); sink_t=_json_sink('sig_trusted.json') if vc is not None else None
+    report=LineWriter(os.path.join(out_dir,'reporte_lote.txt')); report.write_block(_report_header())
+    jsonl=JsonlWriter(jsonl_path, append=bool(args.resume), default=J) if (args.jsonl or args.resume) else None
+    def emit(pdf, apps, untrusted, trusted):
+        for sink, res in ((sink_u, untrusted), (sink_t, trusted)):
+            if sink is None or res is None: continue
+            sink.append("results", res); sink.put("appearances", pdf, apps)
+        report.write_block(_report_lines(trusted if trusted is not None else untrusted))
+    try:
+        if done:
+            for rec in iter_jsonl(jsonl_path):
+                if rec.get("file") not in wanted: continue
+                rec=_revive(rec); emit(rec.get("file"), rec.get("appearances") or [], rec.get("untrusted"), rec.get("trusted"))
+        for pdf, apps, untrusted, trusted in iter_scan(todo, args.trust, out_imgs, vc, workers, cache_dir=None if args.no_cache else args.cache_dir,
+                                                         revinfo_dir=revinfo_dir, offline=args.offline):
+            if jsonl is not None:
+                jsonl.write({"file": pdf, "untrusted": untrusted, "trusted": trusted, "appearances": apps})
+            emit(pdf, apps, untrusted, trusted)
+    finally:
+        sink_u.close(); report.close()
+        if sink_t is not None: sink_t.close()
+        if jsonl is not None: jsonl.close()
 
     print("\nListo ✅")
     print(f"- sig_untrusted.json → {os.path.join(out_dir,'sig_untrusted.json')}")
     if vc is not None: print(f"- sig_trusted.json   → {os.path.join(out_dir,'sig_trusted.json')}")
     print(f"- reporte_lote.txt   → {os.path.join(out_dir,'reporte_lote.txt')}")
-    print(f"- apariencias PNG/TXT→ {out_imgs}")
+    if jsonl is not None: print(f"- {JSONL_NAME}      → {jsonl_path}")
+    if out_imgs: print(f"- apariencias PNG/TXT→ {out_imgs}")
 
 
 if __name__ == '__main__':